@@ -0,0 +1,181 @@
+"""
+analitica.py  —  LuxOMeter PRO / RETILAP 2024
+Dataset analítico consolidado: una tabla columnar (pandas) con todas las
+mediciones de todos los archivos de dispositivo, refrescada por archivo según
+su mtime, y agregaciones vectorizadas para el tablero.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from catalogo import listar_archivos_dispositivos
+
+CACHE_SUBDIR = ".analitica"
+
+# Dimensiones por las que se puede agrupar en el tablero
+DIMENSIONES = {
+    "ARL":          "arl",
+    "Ciudad":       "ciudad",
+    "Tipo de área": "tipo_area",
+    "Tipo lámpara": "tipo_lampara",
+    "Mes":          "mes",
+    "Proyecto":     "proyecto",
+    "Dispositivo":  "dispositivo",
+}
+_CATEGORICAS = ["dispositivo", "proyecto", "plano", "arl", "ciudad",
+                "tipo_area", "tipo_lampara", "tipo_iluminacion", "mes"]
+_NUMERICAS = ["em_req", "uo_min", "promedio", "uo_calc"]
+
+
+# ── Tabla de mediciones ───────────────────────────────────────────────────────
+
+def _num(v):
+    try: return float(v)
+    except (TypeError, ValueError): return np.nan
+
+
+def tabla_mediciones(data, dispositivo=""):
+    """Tabla columnar de las mediciones de un dict de proyectos (crudo o cargado)."""
+    cols = {c: [] for c in ["dispositivo", "proyecto", "plano", "arl", "ciudad", "fecha",
+                            "numero", "tipo_area", "tipo_lampara", "tipo_iluminacion",
+                            "em_req", "uo_min", "promedio", "uo_calc", "conforme"]}
+    for pnombre, p in data.items():
+        g = p.get("general", {})
+        arl, ciudad, fecha = g.get("arl", ""), g.get("sede", ""), g.get("fecha", "")
+        for pln, pi in p.get("planos", {}).items():
+            for r in pi.get("data", []):
+                cols["dispositivo"].append(dispositivo); cols["proyecto"].append(pnombre)
+                cols["plano"].append(pln); cols["arl"].append(arl)
+                cols["ciudad"].append(ciudad.strip().title()); cols["fecha"].append(fecha)
+                cols["numero"].append(r.get("Número", 0))
+                cols["tipo_area"].append(r.get("TipoArea", ""))
+                cols["tipo_lampara"].append(r.get("TipoLampara", ""))
+                cols["tipo_iluminacion"].append(r.get("TipoIluminacion", ""))
+                cols["em_req"].append(_num(r.get("Em_req")))
+                cols["uo_min"].append(_num(r.get("Uo_min")))
+                cols["promedio"].append(_num(r.get("Promedio")))
+                cols["uo_calc"].append(_num(r.get("Uo_calc")))
+                cols["conforme"].append("✅" in str(r.get("Resultado", "")))
+    return _tipar(pd.DataFrame(cols))
+
+
+def _tipar(df):
+    df["fecha"] = pd.to_datetime(df["fecha"], format="%d/%m/%Y", errors="coerce")
+    df["mes"] = df["fecha"].dt.strftime("%Y-%m").fillna("Sin fecha")
+    for c in _NUMERICAS: df[c] = df[c].astype("float64")
+    df["numero"] = pd.to_numeric(df["numero"], errors="coerce").fillna(0).astype("int32")
+    df["conforme"] = df["conforme"].astype(bool)
+    df["deficit"] = (df["em_req"] - df["promedio"]).clip(lower=0).where(~df["conforme"], 0.0)
+    df["uo_cumple"] = df["uo_calc"] >= df["uo_min"]
+    for c in _CATEGORICAS: df[c] = df[c].astype("category")
+    return df
+
+
+# ── Dataset incremental ───────────────────────────────────────────────────────
+
+class DatasetAnalitico:
+    """Mantiene una tabla por dispositivo y solo re-lee los archivos cuyo mtime cambió.
+    Las tablas se guardan también en disco (Parquet, conserva los tipos categóricos
+    y, a diferencia de pickle, leerlo no ejecuta código) para no re-parsear los JSON
+    tras reiniciar el servidor."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.cache_dir = os.path.join(directorio, CACHE_SUBDIR)
+        self._tablas = {}          # device_id -> (mtime, DataFrame)
+        self._df = None
+        self._lock = threading.Lock()   # compartido entre sesiones de Streamlit
+
+    def _ruta_cache(self, device_id):
+        return os.path.join(self.cache_dir, f"{device_id}.parquet")
+
+    def _leer_cache(self, device_id, mtime):
+        ruta = self._ruta_cache(device_id)
+        try:
+            if os.path.getmtime(ruta) >= mtime: return pd.read_parquet(ruta)
+        except Exception: pass
+        return None
+
+    def _escribir_cache(self, device_id, df):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(self._ruta_cache(device_id), index=False)
+        except Exception: pass
+
+    def _cargar(self, device_id, ruta, mtime):
+        df = self._leer_cache(device_id, mtime)
+        if df is None:
+            with open(ruta, "r", encoding="utf-8") as f: data = json.load(f)
+            df = tabla_mediciones(data, device_id)
+            self._escribir_cache(device_id, df)
+        return df
+
+    def refrescar(self):
+        """Sincroniza con el directorio; devuelve True si algo cambió."""
+        archivos = listar_archivos_dispositivos(self.directorio)
+        cambio = False
+        with self._lock:
+            for device_id in list(self._tablas):
+                if device_id not in archivos:
+                    del self._tablas[device_id]; cambio = True
+            for device_id, (ruta, mtime) in archivos.items():
+                previo = self._tablas.get(device_id)
+                if previo and previo[0] == mtime: continue
+                try: self._tablas[device_id] = (mtime, self._cargar(device_id, ruta, mtime))
+                except Exception: continue
+                cambio = True
+            if cambio: self._df = None
+        return cambio
+
+    @property
+    def df(self):
+        with self._lock: return self._consolidar()
+
+    def _consolidar(self):
+        if self._df is None:
+            tablas = [t for _, t in self._tablas.values() if len(t)]
+            if tablas:
+                # concat de categóricas distintas da object: se re-categoriza una vez
+                df = pd.concat(tablas, ignore_index=True)
+                for c in _CATEGORICAS: df[c] = df[c].astype("category")
+            else:
+                df = _tipar(tabla_mediciones({}))
+            self._df = df
+        return self._df
+
+
+# ── Agregaciones ──────────────────────────────────────────────────────────────
+
+def filtrar(df, desde=None, hasta=None, arls=None, ciudades=None):
+    m = np.ones(len(df), dtype=bool)
+    if desde is not None: m &= (df["fecha"] >= pd.Timestamp(desde)).to_numpy()
+    if hasta is not None: m &= (df["fecha"] <= pd.Timestamp(hasta)).to_numpy()
+    if arls:     m &= df["arl"].isin(arls).to_numpy()
+    if ciudades: m &= df["ciudad"].isin(ciudades).to_numpy()
+    return df[m]
+
+
+def agregar(df, por):
+    """Indicadores por dimensión: puntos, % deficientes, promedio, déficit medio, % Uo."""
+    columnas = [por] if isinstance(por, str) else list(por)
+    if df.empty:
+        return pd.DataFrame(columns=columnas + ["Puntos", "Deficientes", "% Deficientes",
+                                                "Promedio (lx)", "Déficit medio (lx)", "% Uo cumple"])
+    tmp = df.assign(_def=~df["conforme"],
+                    _deficit=df["deficit"].where(~df["conforme"]))
+    g = tmp.groupby(columnas, observed=True, sort=False)
+    res = g.agg(Puntos=("conforme", "size"),
+                Deficientes=("_def", "sum"),
+                prom=("promedio", "mean"),
+                deficit=("_deficit", "mean"),
+                uo=("uo_cumple", "mean"))
+    res["% Deficientes"] = (res["Deficientes"] / res["Puntos"] * 100).round(1)
+    res["Promedio (lx)"] = res.pop("prom").round(1)
+    res["Déficit medio (lx)"] = res.pop("deficit").fillna(0).round(1)
+    res["% Uo cumple"] = (res.pop("uo") * 100).round(1)
+    res = res.reset_index().sort_values(["% Deficientes", "Puntos"], ascending=False)
+    return res[columnas + ["Puntos", "Deficientes", "% Deficientes",
+                           "Promedio (lx)", "Déficit medio (lx)", "% Uo cumple"]]
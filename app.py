@@ -1,16 +1,38 @@
 import streamlit as st
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import os
 import base64
 import json
-from pdf2image import convert_from_bytes
-from generar_word import generar_informe_word
-from streamlit_image_coordinates import streamlit_image_coordinates
+from exportar import csv_bytes, exportar_csv, exportar_xlsx, contar_filas, UMBRAL_FILAS_ARCHIVO
+from catalogo import CatalogoProyectos
+from busqueda import IndiceBusqueda
+from retilap import REFERENCIA as RETILAP_REFERENCIA, INDICE as INDICE_RETILAP
+from mediciones import (calcular_medicion, calcular_mediciones, estado_punto,
+                         ILUM, LAMP, UBIC, CONTROL_LUZ, DETALLE_DEFECTO)
+from campo import crear_paquete, leer_paquete, proyecto_desde_paquete, fusionar, id_punto
+from sincronizacion import ServidorLocal, sincronizar
+from respaldo import exportar_proyecto, leer_manifiesto, importar_en_dispositivo, nombre_libre
+from imagenes_informe import dibujar_puntos, firma_puntos, PreparadorPlanos
+from modelo_informe import construir_modelo
+from estadisticas import estadisticas_planos, CU, MANTENIMIENTO
+from geometria import CAMPOS_PLANO, calibracion, metros_por_px, resumen as resumen_geometria, malla_plano
+from diagnostico import (etapa, medido, iniciar as iniciar_diagnostico, terminar as terminar_diagnostico,
+                         filas as filas_diagnostico, GLOBAL as DIAGNOSTICO_GLOBAL)
+# pandas, generar_word (python-docx), pdf2image, streamlit_image_coordinates, analitica e
+# importar_lecturas se importan donde se usan: la página de inicio no los necesita y
+# precargar() los deja cargados en segundo plano después del primer render.
+from precarga import precargar
+from recursos import inventario as inventario_recursos, total_bytes as bytes_recursos, memoria_proceso, tamano
+from trabajos import GestorTrabajos, SUBDIR as SUBDIR_TRABAJOS, ACTIVOS as TRABAJOS_ACTIVOS, LISTO, ERROR
+from memoria_sesion import AlmacenBlobs, MemoriaSesion, Blob, ImagenPlano, pil, SUBDIR as SUBDIR_BLOBS
 import io
+import copy
+import tempfile
 from datetime import datetime
 
 PROYECTOS_DIR = "dispositivos"
+# Carpeta del servidor central de sincronización (vacío = deshabilitado)
+SERVIDOR_SYNC = os.environ.get("LUXOMETER_SERVIDOR_SYNC", "")
 
 def get_device_id():
     params = st.query_params
@@ -22,108 +44,8 @@ def get_proyectos_file():
     os.makedirs(PROYECTOS_DIR, exist_ok=True)
     return os.path.join(PROYECTOS_DIR, f"proyectos_{get_device_id()}.json")
 
-RETILAP_REFERENCIA = {
-    "Imprentas – Corte, estampado, grabado, máquinas de impresión": {"Em": 500, "Uo": 0.6},
-    "Imprentas – Clasificación de papel e impresión a mano": {"Em": 500, "Uo": 0.6},
-    "Oficinas – Escritura, mecanografía, lectura, procesamiento de datos": {"Em": 500, "Uo": 0.6},
-    "Oficinas – Oficinas de tipo general, mecanografía y computación": {"Em": 300, "Uo": 0.19},
-    "Oficinas – Oficinas abiertas": {"Em": 500, "Uo": 0.19},
-    "Oficinas – Oficinas de dibujo": {"Em": 500, "Uo": 0.16},
-    "Oficinas – Salas de conferencia": {"Em": 300, "Uo": 0.19},
-    "Procesos químicos – Procesos automáticos": {"Em": 50, "Uo": 0.0},
-    "Procesos químicos – Intervención ocasional": {"Em": 100, "Uo": 0.28},
-    "Procesos químicos – Áreas generales en interior de fábricas": {"Em": 200, "Uo": 0.25},
-    "Procesos químicos – Cuartos de control, laboratorios": {"Em": 300, "Uo": 0.19},
-    "Procesos químicos – Industria farmacéutica": {"Em": 300, "Uo": 0.22},
-    "Procesos químicos – Inspección": {"Em": 500, "Uo": 0.19},
-    "Procesos químicos – Balanceo de colores": {"Em": 750, "Uo": 0.16},
-    "Procesos químicos – Fabricación de llantas de caucho": {"Em": 300, "Uo": 0.22},
-    "Confecciones – Costura": {"Em": 500, "Uo": 0.22},
-    "Confecciones – Inspección": {"Em": 750, "Uo": 0.16},
-    "Confecciones – Prensado": {"Em": 300, "Uo": 0.22},
-    "Industria eléctrica – Fabricación de cables": {"Em": 200, "Uo": 0.25},
-    "Industria eléctrica – Ensamble de aparatos telefónicos": {"Em": 300, "Uo": 0.19},
-    "Industria eléctrica – Ensamble de devanados": {"Em": 500, "Uo": 0.19},
-    "Industria eléctrica – Ensamble aparatos de radio y TV": {"Em": 750, "Uo": 0.19},
-    "Industria eléctrica – Ensamble componentes electrónicos ultra precisión": {"Em": 1000, "Uo": 0.16},
-    "Industria alimenticia – Áreas generales de trabajo": {"Em": 200, "Uo": 0.25},
-    "Industria alimenticia – Procesos automáticos": {"Em": 150, "Uo": 0.0},
-    "Industria alimenticia – Decoración manual, inspección": {"Em": 300, "Uo": 0.16},
-    "Fundición – Pozos de fundición": {"Em": 150, "Uo": 0.25},
-    "Fundición – Moldeado basto, elaboración de machos": {"Em": 200, "Uo": 0.25},
-    "Fundición – Moldeo fino, inspección": {"Em": 300, "Uo": 0.22},
-    "Vidrio y cerámica – Zona de hornos": {"Em": 100, "Uo": 0.25},
-    "Vidrio y cerámica – Mezcla, moldeo, conformado y estufas": {"Em": 200, "Uo": 0.25},
-    "Vidrio y cerámica – Terminado, esmaltado, envidriado": {"Em": 300, "Uo": 0.19},
-    "Vidrio y cerámica – Pintura y decoración": {"Em": 500, "Uo": 0.16},
-    "Vidrio y cerámica – Afilado, lentes y cristalería, trabajo fino": {"Em": 750, "Uo": 0.19},
-    "Hierro y acero – Sin intervención manual": {"Em": 50, "Uo": 0.0},
-    "Hierro y acero – Intervención ocasional": {"Em": 100, "Uo": 0.28},
-    "Hierro y acero – Puestos permanentes en plantas de producción": {"Em": 200, "Uo": 0.25},
-    "Hierro y acero – Plataformas de control e inspección": {"Em": 300, "Uo": 0.22},
-    "Industria del cuero – Áreas generales de trabajo": {"Em": 200, "Uo": 0.25},
-    "Industria del cuero – Prensado, corte, costura, producción de calzado": {"Em": 500, "Uo": 0.22},
-    "Industria del cuero – Clasificación, adaptación y control de calidad": {"Em": 750, "Uo": 0.19},
-    "Taller mecánica – Trabajo ocasional": {"Em": 150, "Uo": 0.25},
-    "Taller mecánica – Trabajo basto en banca y maquinado, soldadura": {"Em": 200, "Uo": 0.22},
-    "Taller mecánica – Maquinado y trabajo de media precisión": {"Em": 300, "Uo": 0.22},
-    "Taller mecánica – Maquinado fino, inspección y ensayos": {"Em": 500, "Uo": 0.19},
-    "Taller mecánica – Trabajo muy fino, calibración partes pequeñas": {"Em": 1000, "Uo": 0.09},
-    "Pintura – Inmersión, rociado basto": {"Em": 200, "Uo": 0.25},
-    "Pintura – Pintura ordinaria, rociado y terminado": {"Em": 300, "Uo": 0.22},
-    "Pintura – Pintura fina, rociado y terminado": {"Em": 500, "Uo": 0.19},
-    "Pintura – Retoque y balanceo de colores": {"Em": 750, "Uo": 0.16},
-    "Fábricas de papel – Elaboración de papel y cartón": {"Em": 200, "Uo": 0.25},
-    "Fábricas de papel – Procesos automáticos": {"Em": 150, "Uo": 0.0},
-    "Fábricas de papel – Inspección y clasificación": {"Em": 300, "Uo": 0.22},
-    "Impresión – Recintos con máquinas de impresión": {"Em": 300, "Uo": 0.19},
-    "Impresión – Cuartos de composición y lecturas de prueba": {"Em": 500, "Uo": 0.19},
-    "Impresión – Pruebas de precisión, retoque y grabado": {"Em": 750, "Uo": 0.16},
-    "Impresión – Reproducción del color e impresión": {"Em": 1000, "Uo": 0.19},
-    "Impresión – Grabado con acero y cobre": {"Em": 1500, "Uo": 0.16},
-    "Impresión – Encuadernación": {"Em": 300, "Uo": 0.22},
-    "Impresión – Decoración y estampado": {"Em": 500, "Uo": 0.19},
-    "Industria textil – Rompimiento de paca, cardado, hilado": {"Em": 200, "Uo": 0.25},
-    "Industria textil – Giro, embobinado, peinado, tintura": {"Em": 300, "Uo": 0.22},
-    "Industria textil – Balanceo, rotación, entretejido, tejido": {"Em": 500, "Uo": 0.22},
-    "Industria textil – Costura, desmonte e inspección": {"Em": 750, "Uo": 0.19},
-    "Madera y muebles – Aserraderos": {"Em": 150, "Uo": 0.25},
-    "Madera y muebles – Trabajo en banco y montaje": {"Em": 200, "Uo": 0.25},
-    "Madera y muebles – Maquinado de madera": {"Em": 300, "Uo": 0.19},
-    "Madera y muebles – Terminado e inspección final": {"Em": 500, "Uo": 0.19},
-    "Salas hospitalarias – Iluminación general": {"Em": 50, "Uo": 0.22},
-    "Salas hospitalarias – Examen": {"Em": 200, "Uo": 0.19},
-    "Salas hospitalarias – Lectura": {"Em": 150, "Uo": 0.16},
-    "Salas hospitalarias – Circulación nocturna": {"Em": 3, "Uo": 0.22},
-    "Salas de examen – Iluminación general": {"Em": 300, "Uo": 0.19},
-    "Salas de examen – Inspección local": {"Em": 750, "Uo": 0.19},
-    "Terapia intensiva – Cabecera de la cama": {"Em": 30, "Uo": 0.19},
-    "Terapia intensiva – Observación": {"Em": 200, "Uo": 0.19},
-    "Terapia intensiva – Estación de enfermería": {"Em": 200, "Uo": 0.19},
-    "Salas de operación – Iluminación general": {"Em": 500, "Uo": 0.19},
-    "Salas de operación – Iluminación local": {"Em": 10000, "Uo": 0.19},
-    "Salas de autopsia – Iluminación general": {"Em": 500, "Uo": 0.19},
-    "Salas de autopsia – Iluminación local": {"Em": 5000, "Uo": 0.0},
-    "Consultorios – Iluminación general": {"Em": 300, "Uo": 0.19},
-    "Consultorios – Iluminación local": {"Em": 500, "Uo": 0.19},
-    "Farmacia y laboratorios – Iluminación general": {"Em": 300, "Uo": 0.19},
-    "Farmacia y laboratorios – Iluminación local": {"Em": 500, "Uo": 0.19},
-    "Comercio – Grandes centros comerciales": {"Em": 500, "Uo": 0.19},
-    "Comercio – Locales en cualquier parte": {"Em": 300, "Uo": 0.22},
-    "Comercio – Supermercados": {"Em": 500, "Uo": 0.19},
-    "Educación – Salones de clase (iluminación general)": {"Em": 300, "Uo": 0.19},
-    "Educación – Tableros": {"Em": 300, "Uo": 0.19},
-    "Educación – Elaboración de planos": {"Em": 500, "Uo": 0.16},
-    "Educación – Salas de conferencias (iluminación general)": {"Em": 300, "Uo": 0.22},
-    "Educación – Tableros en salas de conferencias": {"Em": 500, "Uo": 0.19},
-    "Educación – Bancos de demostración": {"Em": 500, "Uo": 0.19},
-    "Educación – Laboratorios": {"Em": 300, "Uo": 0.19},
-    "Educación – Salas de arte": {"Em": 300, "Uo": 0.19},
-    "Educación – Talleres": {"Em": 300, "Uo": 0.19},
-    "Educación – Salas de asamblea": {"Em": 150, "Uo": 0.22},
-}
-
-CONTROL_LUZ = ["N/A","Persiana","Cortina","Black Out","Solar Screen","Polarizado"]
+# Tipos de área de la tabla RETILAP (retilap_referencia.csv), en el orden del archivo
+TIPOS_AREA = INDICE_RETILAP.tipos
 
 ARLS = ["Positiva","Colmena","Bolívar","AXA Colpatria","Sura"]
 PLANTILLAS_ARL = {
@@ -134,6 +56,15 @@ PLANTILLAS_ARL = {
     "Sura":          "INFORME_SURA.docx",
 }
 
+@st.cache_resource
+def indice_busqueda():
+    # Índice de texto único por proceso; se mantiene al guardar y se comparte entre sesiones
+    return IndiceBusqueda()
+
+@st.cache_resource
+def servidor_sync():
+    return ServidorLocal(SERVIDOR_SYNC)
+
 # ============================================================================
 def aplicar_estilos():
     st.markdown("""
@@ -155,452 +86,361 @@ def aplicar_estilos():
     </style>""", unsafe_allow_html=True)
 
 # ============================================================================
+@medido("cargar_proyectos")
 def cargar_proyectos():
     if not os.path.exists(get_proyectos_file()):
         return {}
     try:
         with open(get_proyectos_file(),"r",encoding="utf-8") as f:
             data = json.load(f)
-        proyectos = {}
-        for p_name,p_data in data.items():
-            proyectos[p_name]={"general":p_data["general"],"planos":{}}
-            for pl_name,pl_info in p_data["planos"].items():
-                pd_={"puntos":pl_info["puntos"],"data":pl_info["data"],"fotos":pl_info.get("fotos",{})}
-                if "img_base64" in pl_info:
-                    try:
-                        img_b=base64.b64decode(pl_info["img_base64"])
-                        img=Image.open(io.BytesIO(img_b))
-                        if img.mode!='RGB': img=img.convert('RGB')
-                        pd_["img"]=img
-                    except: pd_["img"]=None
-                else: pd_["img"]=None
-                proyectos[p_name]["planos"][pl_name]=pd_
-        return proyectos
+        return {p_name:decodificar_proyecto(p_data) for p_name,p_data in data.items()}
     except Exception as e:
         st.error(f"Error al cargar: {e}"); return {}
 
+@st.cache_resource
+def almacen_blobs():
+    # Imágenes de plano y fotos por contenido; derivado de los JSON de proyecto
+    return AlmacenBlobs(os.path.join(PROYECTOS_DIR,SUBDIR_BLOBS))
+
+def memoria_sesion():
+    """LRU de imágenes y fotos decodificadas de esta sesión (presupuesto LUXOMETER_MEMORIA_SESION_MB)."""
+    if "_memoria_sesion" not in st.session_state:
+        st.session_state["_memoria_sesion"]=MemoriaSesion(almacen_blobs())
+    return st.session_state["_memoria_sesion"]
+
+def decodificar_proyecto(p_data):
+    """Proyecto crudo del JSON -> proyecto en memoria. Planos (ImagenPlano) y fotos (Blob)
+    quedan como referencias al almacén; se decodifican al usarse."""
+    mem=memoria_sesion()
+    proyecto={"general":p_data["general"],"planos":{}}
+    for k in ("campo","sync"):
+        if p_data.get(k): proyecto[k]=p_data[k]
+    for pl_name,pl_info in p_data["planos"].items():
+        fotos={}
+        for k,v in pl_info.get("fotos",{}).items():
+            try: fotos[k]=mem.foto(base64.b64decode(v)) if isinstance(v,str) else v
+            except: pass
+        pd_={"puntos":pl_info["puntos"],"data":pl_info["data"],"fotos":fotos}
+        for k in CAMPOS_PLANO:
+            if pl_info.get(k): pd_[k]=pl_info[k]
+        if "img_base64" in pl_info:
+            try: pd_["img"]=mem.imagen_png(base64.b64decode(pl_info["img_base64"]))
+            except: pd_["img"]=None
+        else: pd_["img"]=None
+        proyecto["planos"][pl_name]=pd_
+    return proyecto
+
+def serializar_proyecto(p_name,p_data):
+    """Proyecto en memoria -> proyecto crudo del JSON (imágenes y fotos en base64)."""
+    serial={"general":p_data["general"].copy(),"planos":{}}
+    for k in ("campo","sync"):
+        if p_data.get(k): serial[k]=p_data[k]
+    for pl_name,pl_info in p_data["planos"].items():
+        pd_={"puntos":pl_info["puntos"].copy() if isinstance(pl_info["puntos"],list) else [],
+             "data":[r.copy() for r in pl_info["data"]] if isinstance(pl_info["data"],list) else [],
+             "fotos":{}}
+        for k in CAMPOS_PLANO:
+            if pl_info.get(k): pd_[k]=copy.deepcopy(pl_info[k])
+        for k,v in pl_info.get("fotos",{}).items():
+            if isinstance(v,Blob): v=v.datos()
+            pd_["fotos"][str(k)]=(base64.b64encode(v).decode() if isinstance(v,bytes) else v)
+        if pl_info.get("img"):
+            try:
+                img=pl_info["img"]
+                if isinstance(img,ImagenPlano): png=img.datos()     # el PNG del almacén, sin recodificar
+                else: buf=io.BytesIO(); img.save(buf,format="PNG"); png=buf.getvalue()
+                pd_["img_base64"]=base64.b64encode(png).decode()
+            except Exception as e: st.warning(f"⚠️ No se guardó imagen '{pl_name}': {e}")
+        serial["planos"][pl_name]=pd_
+    return serial
+
+@medido("guardar_proyectos")
 def guardar_proyectos(proyectos):
     try:
-        serial={}
-        for p_name,p_data in proyectos.items():
-            serial[p_name]={"general":p_data["general"].copy(),"planos":{}}
-            for pl_name,pl_info in p_data["planos"].items():
-                pd_={"puntos":pl_info["puntos"].copy() if isinstance(pl_info["puntos"],list) else [],
-                     "data":[r.copy() for r in pl_info["data"]] if isinstance(pl_info["data"],list) else [],
-                     "fotos":{}}
-                for k,v in pl_info.get("fotos",{}).items():
-                    pd_["fotos"][str(k)]=(base64.b64encode(v).decode() if isinstance(v,bytes) else v)
-                if pl_info.get("img"):
-                    try:
-                        buf=io.BytesIO(); pl_info["img"].save(buf,format="PNG")
-                        pd_["img_base64"]=base64.b64encode(buf.getvalue()).decode()
-                    except Exception as e: st.warning(f"⚠️ No se guardó imagen '{pl_name}': {e}")
-                serial[p_name]["planos"][pl_name]=pd_
+        serial={p_name:serializar_proyecto(p_name,p_data) for p_name,p_data in proyectos.items()}
         with open(get_proyectos_file(),"w",encoding="utf-8") as f:
             json.dump(serial,f,ensure_ascii=False,indent=4)
+        indice_busqueda().actualizar_dispositivo(get_device_id(),proyectos,
+                                                 os.path.getmtime(get_proyectos_file()))
     except Exception as e: st.error(f"Error al guardar: {e}")
 
 def cargar_foto_punto(plano_info,num):
     v=plano_info.get("fotos",{}).get(str(num)) or plano_info.get("fotos",{}).get(num)
+    if isinstance(v,Blob): return v.datos()
     if isinstance(v,str):
         try: return base64.b64decode(v)
         except: return None
     return v if isinstance(v,bytes) else None
 
-def dibujar_puntos(img,data_rows):
-    draw_img=img.copy()
-    if not data_rows: return draw_img
-    draw=ImageDraw.Draw(draw_img)
-    lado=min(draw_img.width,draw_img.height)
-    radio=max(10,min(22,int(lado*0.012)))
-    fsize=max(9,min(16,radio-1))
-    try: font=ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",fsize)
-    except: font=ImageFont.load_default()
-    for row in data_rows:
-        try:
-            raw=str(row["Coordenadas"]).strip("()").split(", ")
-            cx,cy=float(raw[0]),float(raw[1])
-            x=int(cx*draw_img.width) if cx<=1.0 else int(cx)
-            y=int(cy*draw_img.height) if cy<=1.0 else int(cy)
-            clr=row.get("Color","gray")
-            draw.ellipse((x-radio-1,y-radio-1,x+radio+1,y+radio+1),fill="white")
-            draw.ellipse((x-radio,y-radio,x+radio,y+radio),fill=clr)
-            txt=str(row["Número"])
-            bb=font.getbbox(txt); tw,th=bb[2]-bb[0],bb[3]-bb[1]
-            tx,ty=x-tw//2,y-th//2-1
-            for dx,dy in[(-1,-1),(1,-1),(-1,1),(1,1)]: draw.text((tx+dx,ty+dy),txt,fill="black",font=font)
-            draw.text((tx,ty),txt,fill="white",font=font)
-        except: pass
-    return draw_img
+def tiene_foto_punto(plano_info,num):
+    """Si el punto tiene foto, sin leerla del almacén."""
+    fotos=plano_info.get("fotos",{})
+    return bool(fotos.get(str(num)) or fotos.get(num))
+
+def preparador_planos():
+    """Planos anotados a resolución de impresión, compartidos por el PDF y el Word de la sesión."""
+    if "_preparador_planos" not in st.session_state:
+        st.session_state["_preparador_planos"]=PreparadorPlanos(memoria_sesion())
+    return st.session_state["_preparador_planos"]
 
+@medido("grafica_conformidad")
 def grafica_conformidad(data_rows, titulo=""):
+    total     = len(data_rows)
+    conformes = sum(1 for r in data_rows if "✅" in str(r.get("Resultado", "")))
+    if total == 0:
+        return None
     try:
-        import matplotlib
-        matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-        import matplotlib.patches as mpatches
-
-        total      = len(data_rows)
-        conformes  = sum(1 for r in data_rows if "✅" in str(r.get("Resultado", "")))
-        deficientes = total - conformes
-        if total == 0:
-            return None
-
-        pct_conf = round(conformes / total * 100, 1)
-        pct_def  = round(deficientes / total * 100, 1)
-
-        fig, ax = plt.subplots(figsize=(5.5, 2.8), facecolor='#f8fafc')
-        ax.set_facecolor('#f8fafc')
-
-        categorias = ['Adecuados', 'Deficientes']
-        valores    = [pct_conf, pct_def]
-        colores    = ['#22c55e', '#ef4444']
-        y_pos      = [1, 0]
-
-        bars = ax.barh(y_pos, valores, color=colores, height=0.5,
-                       edgecolor='white', linewidth=1.5)
-
-        # Etiquetas dentro de las barras
-        for bar, val, n in zip(bars, valores, [conformes, deficientes]):
-            ax.text(val/2, bar.get_y() + bar.get_height()/2,
-                    f"{val}%  ({n} pts)",
-                    ha='center', va='center',
-                    fontsize=10, fontweight='bold', color='white')
-
-        ax.set_yticks(y_pos)
-        ax.set_yticklabels(categorias, fontsize=11, fontweight='bold',
-                           color='#1a3a5c')
-        ax.set_xlim(0, 110)
-        ax.set_xlabel('Porcentaje (%)', fontsize=9, color='#475569')
-        ax.set_title(titulo or f'Conformidad RETILAP  —  {total} puntos',
-                     fontsize=11, fontweight='bold', color='#1a3a5c', pad=10)
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        ax.tick_params(axis='x', colors='#94a3b8')
-        ax.tick_params(axis='y', left=False)
-        ax.xaxis.grid(True, linestyle='--', alpha=0.4, color='#cbd5e1')
-        ax.set_axisbelow(True)
-
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='PNG', bbox_inches='tight', dpi=140,
-                    facecolor='#f8fafc')
-        plt.close(fig)
-        buf.seek(0)
-        return buf.getvalue()
+        return _grafica_barras(conformes, total, titulo)
     except Exception as e:
         st.warning(f"No se pudo generar la gráfica: {e}")
         return None
 
-def generar_reporte_csv(proyecto_data, proyecto_nombre):
-    rows = []
-    for pln, pi in proyecto_data["planos"].items():
-        for r in pi.get("data", []):
-            conforme = "ADECUADO" if "✅" in str(r.get("Resultado","")) else "DEFICIENTE"
-            # Limpiar strings: quitar saltos de línea y comas internas
-            def _clean(v):
-                return str(v).replace("\n","  ").replace("\r","").replace(";","").strip() if v else ""
-            rows.append({
-                "Proyecto":                        _clean(proyecto_nombre),
-                "Plano":                           _clean(pln),
-                "N Med":                           r.get("Número",""),
-                "Puesto de trabajo / Area evaluada": _clean(r.get("PuestoEvaluado","")),
-                "Tipo Area RETILAP":               _clean(r.get("TipoArea","")),
-                "Ubicacion":                       _clean(r.get("UbicacionLuminaria","")),
-                "Tipo Iluminacion":                _clean(r.get("TipoIluminacion","")),
-                "Tipo Lampara":                    _clean(r.get("TipoLampara","")),
-                "Control Luz Natural":             _clean(r.get("ControlLuzNatural","")),
-                "Altura Luminaria (m)":            _clean(r.get("AlturaLuminaria","")),
-                "Lux 1":                           r.get("Med1",""),
-                "Lux 2":                           r.get("Med2",""),
-                "Lux 3":                           r.get("Med3",""),
-                "Lux 4":                           r.get("Med4",""),
-                "E Min (lx)":                      r.get("EMin",""),
-                "E Max (lx)":                      r.get("EMax",""),
-                "E Medio (lx)":                    r.get("EMedio",""),
-                "Promedio (lx)":                   r.get("Promedio",""),
-                "Uo Calculado":                    r.get("Uo_calc",""),
-                "Interpretacion Uo":               _clean(r.get("InterpretacionUo","")),
-                "Em Requerida (lx)":               r.get("Em_req",""),
-                "Resultado":                       conforme,
-                "Observaciones":                   _clean(r.get("Nota","")),
-                "Recomendaciones":                 _clean(r.get("Recomendacion","")),
-            })
-    if rows:
-        df = pd.DataFrame(rows)
-        # UTF-8 con BOM para que Excel lo abra correctamente con tildes y ñ
-        return df.to_csv(index=False, encoding='utf-8-sig', sep=';').encode('utf-8-sig')
-    return None
+@st.cache_data(max_entries=512, show_spinner=False)
+def _grafica_barras(conformes, total, titulo):
+    # La gráfica solo depende de los conteos: se reutiliza mientras no cambien
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    deficientes = total - conformes
+    pct_conf = round(conformes / total * 100, 1)
+    pct_def  = round(deficientes / total * 100, 1)
+
+    fig, ax = plt.subplots(figsize=(5.5, 2.8), facecolor='#f8fafc')
+    ax.set_facecolor('#f8fafc')
+
+    categorias = ['Adecuados', 'Deficientes']
+    valores    = [pct_conf, pct_def]
+    colores    = ['#22c55e', '#ef4444']
+    y_pos      = [1, 0]
+
+    bars = ax.barh(y_pos, valores, color=colores, height=0.5,
+                   edgecolor='white', linewidth=1.5)
+
+    # Etiquetas dentro de las barras
+    for bar, val, n in zip(bars, valores, [conformes, deficientes]):
+        ax.text(val/2, bar.get_y() + bar.get_height()/2,
+                f"{val}%  ({n} pts)",
+                ha='center', va='center',
+                fontsize=10, fontweight='bold', color='white')
+
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(categorias, fontsize=11, fontweight='bold',
+                       color='#1a3a5c')
+    ax.set_xlim(0, 110)
+    ax.set_xlabel('Porcentaje (%)', fontsize=9, color='#475569')
+    ax.set_title(titulo or f'Conformidad RETILAP  —  {total} puntos',
+                 fontsize=11, fontweight='bold', color='#1a3a5c', pad=10)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_visible(False)
+    ax.tick_params(axis='x', colors='#94a3b8')
+    ax.tick_params(axis='y', left=False)
+    ax.xaxis.grid(True, linestyle='--', alpha=0.4, color='#cbd5e1')
+    ax.set_axisbelow(True)
+
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf, format='PNG', bbox_inches='tight', dpi=140,
+                facecolor='#f8fafc')
+    plt.close(fig)
+    buf.seek(0)
+    return buf.getvalue()
+
+@medido("generar_reporte_csv")
+def generar_reporte_csv(proyecto_data, proyecto_nombre, columnas=None):
+    if not any(pi.get("data") for pi in proyecto_data["planos"].values()):
+        return None
+    # UTF-8 con BOM para que Excel lo abra correctamente con tildes y ñ
+    return csv_bytes(proyecto_data, proyecto_nombre, columnas)
+
+def sincronizar_paquete(archivo):
+    """Fusiona un paquete de campo con el proyecto del dispositivo (o lo crea)."""
+    man=leer_paquete(archivo); nombre=man["proyecto"]; proyectos=st.session_state.proyectos
+    if nombre in proyectos:
+        crudo,informe=fusionar(serializar_proyecto(nombre,proyectos[nombre]),man)
+    else:
+        crudo=proyecto_desde_paquete(man)
+        informe={"aplicados":sum(len(e["puntos"]) for e in man["planos"].values()),"conflictos":[],"sin_cambios":0}
+    proyectos[nombre]=decodificar_proyecto(crudo)
+    guardar_proyectos(proyectos)
+    return nombre,informe
+
+def descarga_diferida(exportador, proyectos, columnas=None):
+    """Callable para st.download_button: exporta a un temporal solo al hacer clic.
+    Streamlit lee todo lo que devuelve el callable y no cierra archivos, así que se
+    devuelven los bytes y el temporal se cierra y se borra aquí."""
+    @medido(exportador.__name__)
+    def _generar():
+        ruta=exportador(proyectos,columnas)
+        try:
+            with open(ruta,"rb") as f: return f.read()
+        finally: os.remove(ruta)
+    return _generar
 
 # ============================================================================
-# PDF — TABLA RETILAP COMPLETA (orientación landscape)
+# TRABAJOS EN SEGUNDO PLANO — exportaciones y rasterizado de planos en PDF
 # ============================================================================
-def generar_reporte_pdf(proyecto_data,proyecto_nombre):
-    try:
-        from reportlab.lib.pagesizes import landscape,letter
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch,cm
-        from reportlab.lib.styles import getSampleStyleSheet,ParagraphStyle
-        from reportlab.lib.enums import TA_CENTER,TA_LEFT
-        from reportlab.platypus import (SimpleDocTemplate,Paragraph,Spacer,
-                                        Table,TableStyle,PageBreak,
-                                        Image as RLImage,HRFlowable)
-
-        buf=io.BytesIO()
-        doc=SimpleDocTemplate(buf,pagesize=landscape(letter),
-                              rightMargin=1.2*cm,leftMargin=1.2*cm,
-                              topMargin=1.2*cm,bottomMargin=1.2*cm)
-        S=getSampleStyleSheet()
-        eTi=ParagraphStyle('T',parent=S['Title'],fontSize=14,
-                            textColor=colors.HexColor('#1a3a5c'),alignment=TA_CENTER)
-        eSu=ParagraphStyle('S',parent=S['Normal'],fontSize=9,
-                            textColor=colors.HexColor('#2c6fad'),alignment=TA_CENTER)
-        eSe=ParagraphStyle('H',parent=S['Heading2'],fontSize=10,
-                            textColor=colors.HexColor('#1a3a5c'),spaceBefore=6,spaceAfter=3)
-        eNo=ParagraphStyle('N',parent=S['Normal'],fontSize=8,spaceAfter=3)
-        ePi=ParagraphStyle('P',parent=S['Normal'],fontSize=7,
-                            textColor=colors.grey,alignment=TA_CENTER)
-        eCe=ParagraphStyle('C',parent=S['Normal'],fontSize=6,alignment=TA_CENTER,leading=7.5)
-        eIz=ParagraphStyle('I',parent=S['Normal'],fontSize=6,alignment=TA_LEFT,leading=7.5)
-
-        AZ_OSC=colors.HexColor('#1a3a5c')
-        AZ_CLA=colors.HexColor('#d6e4f0')
-        GR_CLA=colors.HexColor('#f0f4f8')
-        VERDE =colors.HexColor('#27ae60')
-        ROJO  =colors.HexColor('#e74c3c')
-        BLANCO=colors.white
-
-        g=proyecto_data.get("general",{})
-        pw=landscape(letter)[0]-2.4*cm  # ancho útil
-
-        story=[
-            Paragraph("ESTUDIO DE LUXOMETRÍA – RETILAP 2024",eTi),
-            Paragraph("Auditoría de Iluminación en el Lugar de Trabajo",eSu),
-            Spacer(1,0.1*inch),
-            HRFlowable(width="100%",thickness=2,color=AZ_OSC),
-            Spacer(1,0.07*inch),
-        ]
-
-        # Ficha empresa
-        info=[
-            [Paragraph("<b>Empresa:</b>",eIz),Paragraph(g.get("nombre_empresa",""),eIz),
-             Paragraph("<b>NIT:</b>",eIz),Paragraph(g.get("nit",""),eIz),
-             Paragraph("<b>N° Orden:</b>",eIz),Paragraph(g.get("numero_orden",""),eIz)],
-            [Paragraph("<b>Dirección:</b>",eIz),Paragraph(g.get("direccion",""),eIz),
-             Paragraph("<b>Ciudad:</b>",eIz),Paragraph(g.get("sede",""),eIz),
-             Paragraph("<b>Fecha:</b>",eIz),Paragraph(g.get("fecha",""),eIz)],
-            [Paragraph("<b>Higienista:</b>",eIz),Paragraph(g.get("responsable_higienista",""),eIz),
-             Paragraph("<b>Lic. SST:</b>",eIz),Paragraph(g.get("resolucion",""),eIz),
-             Paragraph("<b>Responsable:</b>",eIz),Paragraph(g.get("responsable_empresa",""),eIz)],
-        ]
-        cw6=[2.2*cm,5.8*cm,2.2*cm,5.8*cm,2.2*cm,5.8*cm]
-        tI=Table(info,colWidths=cw6)
-        tI.setStyle(TableStyle([
-            ('FONTSIZE',(0,0),(-1,-1),8),
-            ('ROWBACKGROUNDS',(0,0),(-1,-1),[GR_CLA,BLANCO]),
-            ('GRID',(0,0),(-1,-1),0.3,AZ_CLA),
-            ('TOPPADDING',(0,0),(-1,-1),3),('BOTTOMPADDING',(0,0),(-1,-1),3),
-            ('LEFTPADDING',(0,0),(-1,-1),4),
-        ]))
-        story.append(tI); story.append(Spacer(1,0.08*inch))
-
-        # ── RESUMEN EJECUTIVO ──────────────────────────────────────────────
-        all_data=[r for pi in proyecto_data["planos"].values() for r in pi.get("data",[])]
-        tot=len(all_data); conf=sum(1 for r in all_data if "✅" in str(r.get("Resultado","")))
-        defic_list=[r for r in all_data if "❌" in str(r.get("Resultado",""))]
-
-        if tot>0:
-            pct=round(conf/tot*100,1)
-
-            # Título resumen ejecutivo
-            story.append(Paragraph("RESUMEN EJECUTIVO",
-                ParagraphStyle('RE',parent=S['Heading1'],fontSize=12,
-                    textColor=AZ_OSC,spaceBefore=6,spaceAfter=4,alignment=1)))
-            story.append(HRFlowable(width="100%",thickness=1.5,color=AZ_OSC))
-            story.append(Spacer(1,0.06*inch))
-
-            # Tabla de totales
-            rD=[[Paragraph("<b>Total puntos</b>",eCe),Paragraph("<b>Adecuados</b>",eCe),
-                 Paragraph("<b>Deficientes</b>",eCe),Paragraph("<b>% Adecuados</b>",eCe)],
-                [str(tot),str(conf),str(tot-conf),f"{pct}%"]]
-            tR=Table(rD,colWidths=[pw/4]*4)
-            tR.setStyle(TableStyle([
-                ('BACKGROUND',(0,0),(-1,0),AZ_OSC),('TEXTCOLOR',(0,0),(-1,0),BLANCO),
-                ('FONTNAME',(0,0),(-1,-1),'Helvetica-Bold'),('FONTSIZE',(0,0),(-1,-1),10),
-                ('ALIGN',(0,0),(-1,-1),'CENTER'),('GRID',(0,0),(-1,-1),0.4,AZ_CLA),
-                ('BACKGROUND',(0,1),(-1,1),GR_CLA),
-                ('TEXTCOLOR',(3,1),(3,1),VERDE if pct>=80 else ROJO),
-                ('TOPPADDING',(0,0),(-1,-1),5),('BOTTOMPADDING',(0,0),(-1,-1),5),
-            ]))
-            story.append(tR); story.append(Spacer(1,0.1*inch))
-
-            # Gráfica de barras en el PDF
+@st.cache_resource
+def gestor_trabajos():
+    # Una cola por proceso; el estado de cada trabajo queda en disco
+    return GestorTrabajos(os.path.join(PROYECTOS_DIR,SUBDIR_TRABAJOS))
+
+INTERVALO_TRABAJOS=1.5   # segundos entre refrescos del panel mientras hay trabajos en curso
+# tipo -> (etiqueta, sufijo del archivo, mime)
+EXPORTACIONES={
+    "pdf":      ("📄 PDF",".pdf","application/pdf"),
+    "word":     ("📝 Word",".docx","application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "informe":  ("📚 PDF + Word","_informe.zip","application/zip"),
+    "respaldo": ("💾 Respaldo","_respaldo.zip","application/zip"),
+    "campo":    ("🧳 Paquete de campo","_campo.zip","application/zip"),
+}
+
+def instantanea_proyecto(pdata):
+    """Copia de la estructura del proyecto (las imágenes se comparten) para que un
+    trabajo en segundo plano no vea ediciones hechas mientras corre."""
+    snap={**pdata,"general":copy.deepcopy(pdata["general"]),"planos":{}}
+    for pln,pi in pdata["planos"].items():
+        snap["planos"][pln]={**pi,"puntos":list(pi.get("puntos",[])),"fotos":dict(pi.get("fotos",{})),
+                             "data":[dict(d) for d in pi.get("data",[])]}
+    return snap
+
+def encolar_exportacion(tipo,pnombre,pdata):
+    """Encola la exportación 'tipo' del proyecto; devuelve el id del trabajo."""
+    snap=instantanea_proyecto(pdata); prep=preparador_planos(); dispositivo=get_device_id()
+    def _trabajo(avance):
+        if tipo=="pdf":
+            # Directo a disco: el gestor mueve el archivo y la descarga lo lee por ruta
+            fd,ruta=tempfile.mkstemp(prefix="pdf_",suffix=".pdf"); os.close(fd)
+            try: return construir_reporte_pdf(snap,pnombre,prep,avance,destino=ruta)
+            except Exception: os.remove(ruta); raise
+        if tipo=="word":
+            from generar_word import informe_word
+            avance(0.1,"Preparando planos"); modelo=construir_modelo(snap,prep); modelo.imagenes()
+            avance(0.5,"Generando Word")
+            return informe_word(modelo,PLANTILLAS_ARL)
+        if tipo=="informe":
+            # Un solo modelo para los dos formatos: filas, gráfica y planos se preparan una vez
+            from generar_word import informe_word
+            from informe_pdf import escribir_pdf
+            import zipfile
+            avance(0.05,"Preparando planos"); modelo=construir_modelo(snap,prep); modelo.imagenes()
+            base=f"Informe_RETILAP_{snap['general'].get('nombre_empresa','').replace(' ','_')}"
+            fd,ruta=tempfile.mkstemp(prefix="informe_",suffix=".zip"); os.close(fd)
             try:
-                graf_bytes=grafica_conformidad(all_data,"Distribución de Conformidad")
-                if graf_bytes:
-                    story.append(RLImage(io.BytesIO(graf_bytes),width=pw*0.55,height=pw*0.28))
-                    story.append(Spacer(1,0.1*inch))
-            except: pass
+                with zipfile.ZipFile(ruta,"w",zipfile.ZIP_STORED) as z:
+                    with z.open(f"{base}.pdf","w") as f:
+                        escribir_pdf(modelo,f,lambda fr=None,etapa=None:avance(fr and 0.1+0.6*fr,etapa))
+                    avance(0.75,"Generando Word"); z.writestr(f"{base}.docx",informe_word(modelo,PLANTILLAS_ARL))
+            except Exception: os.remove(ruta); raise
+            return ruta
+        fd,ruta=tempfile.mkstemp(prefix=f"{tipo}_",suffix=".zip"); os.close(fd)
+        try:
+            # El respaldo lee imágenes y fotos del almacén de blobs por bloques, sin base64
+            if tipo=="respaldo": avance(0.1,"Escribiendo ZIP"); exportar_proyecto(pnombre,snap,ruta,dispositivo)
+            else:
+                avance(0.1,"Serializando proyecto"); crudo=serializar_proyecto(pnombre,snap)
+                avance(0.5,"Escribiendo ZIP")
+                crear_paquete(pnombre,crudo,dispositivo,ruta,base=crudo.get("campo",{}).get("base"))
+        except Exception: os.remove(ruta); raise
+        return ruta
+    etiqueta,sufijo,mime=EXPORTACIONES[tipo]
+    if tipo=="word":
+        nombre=(f"Informe_RETILAP_{pdata['general'].get('nombre_empresa','').replace(' ','_')}"
+                f"_{datetime.now().strftime('%Y%m%d')}.docx")
+    else: nombre=f"RETILAP_{pnombre[:18].replace(' ','_')}{sufijo}"
+    if tipo=="campo" and pdata.get("campo"): etiqueta="📤 Devolver cambios"
+    return gestor_trabajos().enviar(_trabajo,f"{etiqueta} · {pnombre}",tipo,dispositivo,nombre,mime)
+
+def encolar_rasterizado(pnombre,plano_nombre,pdf):
+    """Convierte la primera página de un plano en PDF a imagen en segundo plano;
+    aplicar_trabajos() la agrega al proyecto cuando termina."""
+    def _rasterizar(avance):
+        from pdf2image import convert_from_bytes
+        avance(0.1,"Rasterizando PDF")
+        img=convert_from_bytes(pdf,first_page=1,last_page=1)[0]
+        avance(0.7,"Ajustando imagen")
+        if img.mode!="RGB": img=img.convert("RGB")
+        if img.width>1920: r=1920/img.width; img=img.resize((1920,int(img.height*r)),Image.LANCZOS)
+        buf=io.BytesIO(); img.save(buf,format="PNG"); return buf.getvalue()
+    return gestor_trabajos().enviar(_rasterizar,f"🗺️ Plano · {plano_nombre}","plano",get_device_id(),
+                                    f"{plano_nombre}.png","image/png",{"proyecto":pnombre,"plano":plano_nombre})
+
+def aplicar_trabajos():
+    """Agrega al proyecto los planos rasterizados que terminaron desde el último rerun."""
+    gestor=gestor_trabajos(); proyectos=st.session_state.proyectos; cambios=False
+    for t in gestor.listar(get_device_id()):
+        if t["tipo"]!="plano" or t["estado"]!=LISTO or t["datos"].get("aplicado"): continue
+        pdata=proyectos.get(t["datos"]["proyecto"])
+        if pdata is not None:
+            with open(gestor.ruta_resultado(t["id"]),"rb") as f: img=memoria_sesion().imagen_png(f.read())
+            nombre=nombre_libre(t["datos"]["plano"],pdata["planos"])
+            pdata["planos"][nombre]={"img":img,"puntos":[],"data":[],"fotos":{},"sin_plano":False}
+            st.session_state["_msg_trabajos"]=f"✅ '{nombre}' agregado"; cambios=True
+        gestor.marcar(t["id"],aplicado=True)
+    if cambios: guardar_proyectos(proyectos)
+
+def descarga_resultado(ruta):
+    """Callable para st.download_button con el resultado de un trabajo: lee los bytes y
+    cierra el archivo. Si el trabajo se purgó o eliminó después de pintar el botón, falla
+    con un mensaje en vez de un FileNotFoundError."""
+    def _leer():
+        try:
+            with open(ruta,"rb") as f: return f.read()
+        except FileNotFoundError:
+            raise FileNotFoundError("El resultado ya no está disponible; vuelve a generarlo") from None
+    return _leer
+
+def _panel_trabajos(con_sondeo):
+    gestor=gestor_trabajos(); trabajos=gestor.listar(get_device_id())
+    activos=[t for t in trabajos if t["estado"] in TRABAJOS_ACTIVOS]
+    if con_sondeo and not activos: st.rerun()     # terminó el último: rerun completo sin sondeo
+    with st.expander(f"⏳ Trabajos en segundo plano ({len(activos)} en curso)" if activos
+                     else "📦 Trabajos en segundo plano",expanded=bool(activos)):
+        for t in trabajos:
+            c1,c2,c3=st.columns([4,2,1])
+            with c1:
+                st.markdown(f"**{t['titulo']}**")
+                if t["estado"] in TRABAJOS_ACTIVOS: st.progress(t["progreso"],text=t["etapa"])
+                elif t["estado"]==ERROR: st.caption(f"❌ {t['error']}")
+                elif t["estado"]==LISTO:
+                    st.caption(f"✅ {datetime.fromtimestamp(t['terminado']).strftime('%H:%M')} · {t['bytes']/1024:,.0f} KB")
+                else: st.caption("⏹️ Cancelado")
+            with c2:
+                if t["estado"]==LISTO and t["tipo"]!="plano":
+                    ruta=gestor.ruta_resultado(t["id"])
+                    if ruta and os.path.exists(ruta):
+                        st.download_button("⬇️ Descargar",data=descarga_resultado(ruta),file_name=t["nombre_archivo"],
+                                           mime=t["mime"],key=f"tr_dl_{t['id']}",use_container_width=True)
+                    else: st.caption("Ya no disponible")
+                elif t["estado"] in TRABAJOS_ACTIVOS:
+                    if st.button("⏹️ Cancelar",key=f"tr_can_{t['id']}",use_container_width=True):
+                        gestor.cancelar(t["id"]); st.rerun(scope="fragment")
+            with c3:
+                if t["estado"] not in TRABAJOS_ACTIVOS and st.button("🗑️",key=f"tr_del_{t['id']}"):
+                    gestor.eliminar(t["id"]); st.rerun(scope="fragment")
+
+def panel_trabajos():
+    """Lista de trabajos del dispositivo; mientras haya alguno en curso se refresca sola."""
+    msg=st.session_state.pop("_msg_trabajos",None)
+    if msg: st.success(msg)
+    trabajos=gestor_trabajos().listar(get_device_id())
+    if not trabajos: return
+    sondeo=any(t["estado"] in TRABAJOS_ACTIVOS for t in trabajos)
+    st.fragment(_panel_trabajos,run_every=INTERVALO_TRABAJOS if sondeo else None)(sondeo)
 
-            # Áreas con más deficiencias
-            if defic_list:
-                story.append(Paragraph("<b>Puntos deficientes detectados:</b>",eNo))
-                story.append(Spacer(1,0.04*inch))
-                defic_rows=[[
-                    Paragraph("<b>N°</b>",eCe),
-                    Paragraph("<b>Puesto / Área</b>",eCe),
-                    Paragraph("<b>Promedio medido</b>",eCe),
-                    Paragraph("<b>Em requerida</b>",eCe),
-                    Paragraph("<b>Déficit</b>",eCe),
-                ]]
-                for r in defic_list:
-                    prom=r.get("Promedio",0) or 0
-                    em=r.get("Em_req",0) or 0
-                    deficit=round(em-prom,1) if em>prom else 0
-                    defic_rows.append([
-                        Paragraph(str(r.get("Número","")),eCe),
-                        Paragraph(str(r.get("PuestoEvaluado","") or r.get("TipoArea","")),eIz),
-                        Paragraph(f"{prom} lx",eCe),
-                        Paragraph(f"{em} lx",eCe),
-                        Paragraph(f"-{deficit} lx",eCe),
-                    ])
-                tD=Table(defic_rows,colWidths=[1.2*cm,pw*0.35,pw*0.18,pw*0.18,pw*0.15])
-                tD.setStyle(TableStyle([
-                    ('BACKGROUND',(0,0),(-1,0),ROJO),('TEXTCOLOR',(0,0),(-1,0),BLANCO),
-                    ('FONTNAME',(0,0),(-1,0),'Helvetica-Bold'),
-                    ('FONTSIZE',(0,0),(-1,-1),7.5),
-                    ('ALIGN',(0,0),(-1,-1),'CENTER'),('GRID',(0,0),(-1,-1),0.3,AZ_CLA),
-                    ('ROWBACKGROUNDS',(0,1),(-1,-1),[colors.HexColor('#fff5f5'),BLANCO]),
-                    ('TOPPADDING',(0,0),(-1,-1),3),('BOTTOMPADDING',(0,0),(-1,-1),3),
-                    ('ALIGN',(1,1),(1,-1),'LEFT'),
-                ]))
-                story.append(tD)
-                story.append(Spacer(1,0.06*inch))
-
-            # Conclusión
-            estado="SATISFACTORIO" if pct>=80 else "REQUIERE MEJORAS"
-            color_est=VERDE if pct>=80 else ROJO
-            concl=Paragraph(
-                f"<b>Conclusión general:</b> El {pct}% de los puntos evaluados cumple con los "
-                f"niveles mínimos de iluminancia exigidos por la norma RETILAP 2024. "
-                f"Estado general: <b>{estado}</b>.",
-                ParagraphStyle('CL',parent=S['Normal'],fontSize=8.5,
-                    textColor=color_est,spaceBefore=4,spaceAfter=4))
-            story.append(concl)
-
-        story.append(PageBreak())
-
-        # ── Tabla por plano ────────────────────────────────────────────────
-        for pln,pi in proyecto_data["planos"].items():
-            drows=pi.get("data",[]); pimg=pi.get("img")
-            story.append(Paragraph(f"Plano: {pln}",eSe))
-            story.append(HRFlowable(width="100%",thickness=1,color=AZ_CLA))
-            story.append(Spacer(1,0.05*inch))
-
-            if pimg and drows:
-                try:
-                    an=dibujar_puntos(pimg,drows)
-                    if an.width>1800:
-                        r=1800/an.width; an=an.resize((1800,int(an.height*r)),Image.LANCZOS)
-                    b=io.BytesIO(); an.save(b,format="PNG"); b.seek(0)
-                    ph=min(pw*an.height/an.width,4*inch)
-                    story+=[RLImage(b,width=pw,height=ph),Spacer(1,0.08*inch)]
-                except Exception as e:
-                    story.append(Paragraph(f"(Error imagen: {e})",eNo))
-
-            if not drows:
-                story.append(Paragraph("Sin mediciones.",eNo))
-                story.append(PageBreak()); continue
-
-            # Encabezado tabla — igual a la imagen
-            enc=[
-                Paragraph("<b>N°\nMed</b>",eCe),
-                Paragraph("<b>Puesto de trabajo\no Área evaluada</b>",eCe),
-                Paragraph("<b>Descripción</b>",eCe),
-                Paragraph("<b>E\nMIN\n(lx)</b>",eCe),
-                Paragraph("<b>E\nMAX\n(lx)</b>",eCe),
-                Paragraph("<b>Promedio\nmedido\n(lx)</b>",eCe),
-                Paragraph("<b>Valor\nUo</b>",eCe),
-                Paragraph("<b>Interp.\nUo</b>",eCe),
-                Paragraph("<b>Tipo de Área\nRETILAP</b>",eCe),
-                Paragraph("<b>Em\nrec.\n(lx)</b>",eCe),
-                Paragraph("<b>Interpretación\nNivel de\nIluminancia</b>",eCe),
-                Paragraph("<b>Observaciones /\nRecomendaciones</b>",eCe),
-            ]
-            cw=[0.9*cm,3.2*cm,2.5*cm,1.1*cm,1.1*cm,1.3*cm,
-                1.1*cm,1.1*cm,3.2*cm,1.1*cm,2.0*cm,3.5*cm]
-
-            tabla=[enc]
-            for r in drows:
-                conforme="✅" in str(r.get("Resultado",""))
-                m1=r.get("Med1",0) or 0; m2=r.get("Med2",0) or 0
-                m3=r.get("Med3",0) or 0; m4=r.get("Med4",0) or 0
-                vals=[v for v in[m1,m2,m3,m4] if v>0]
-                e_min=round(min(vals),1) if vals else ""
-                e_max=round(max(vals),1) if vals else ""
-                e_med=round(sum(vals)/len(vals),1) if vals else ""
-                desc=Paragraph(
-                    f"Tipo Ilum.: <b>{r.get('TipoIluminacion','')}</b><br/>"
-                    f"Lámpara: <b>{r.get('TipoLampara','')}</b><br/>"
-                    f"Ubic.: <b>{r.get('UbicacionLuminaria','')}</b><br/>"
-                    f"Ctrl. Luz Nat.: <b>{r.get('ControlLuzNatural','')}</b><br/>"
-                    f"Altura (m): <b>{r.get('AlturaLuminaria','')}</b>",eIz)
-                obs=Paragraph(
-                    f"<b>Obs.:</b> {r.get('Nota','')}<br/>"
-                    f"<b>Rec.:</b> {r.get('Recomendacion','')}",eIz)
-                fila=[
-                    Paragraph(str(r.get("Número","")),eCe),
-                    Paragraph(str(r.get("PuestoEvaluado","")) or str(r.get("TipoArea","")),eIz),
-                    desc,
-                    Paragraph(str(e_min),eCe),
-                    Paragraph(str(e_max),eCe),
-                    Paragraph(str(r.get("Promedio","")),eCe),
-                    Paragraph(str(r.get("Uo_calc","")),eCe),
-                    Paragraph(str(r.get("InterpretacionUo","")),eCe),
-                    Paragraph(str(r.get("TipoArea","")),eIz),
-                    Paragraph(str(r.get("Em_req","")),eCe),
-                    Paragraph("ADECUADO" if conforme else "DEFICIENTE",eCe),
-                    obs,
-                ]
-                tabla.append(fila)
-
-            tab=Table(tabla,colWidths=cw,repeatRows=1)
-            ts=[
-                ('BACKGROUND',(0,0),(-1,0),AZ_OSC),('TEXTCOLOR',(0,0),(-1,0),BLANCO),
-                ('FONTNAME',(0,0),(-1,0),'Helvetica-Bold'),
-                ('FONTSIZE',(0,0),(-1,-1),6),
-                ('ALIGN',(0,0),(-1,-1),'CENTER'),('VALIGN',(0,0),(-1,-1),'MIDDLE'),
-                ('GRID',(0,0),(-1,-1),0.3,AZ_CLA),
-                ('TOPPADDING',(0,0),(-1,-1),2),('BOTTOMPADDING',(0,0),(-1,-1),2),
-                ('LEFTPADDING',(0,0),(-1,-1),2),('RIGHTPADDING',(0,0),(-1,-1),2),
-                ('ALIGN',(2,1),(2,-1),'LEFT'),('ALIGN',(11,1),(11,-1),'LEFT'),
-                ('ALIGN',(1,1),(1,-1),'LEFT'),('ALIGN',(8,1),(8,-1),'LEFT'),
-            ]
-            for idx,r in enumerate(drows,1):
-                conf_r="✅" in str(r.get("Resultado",""))
-                # Fondo alterno por fila (todas las columnas menos la de interpretación)
-                bg_fila=BLANCO if idx%2==1 else GR_CLA
-                ts+=[
-                    ('BACKGROUND',(0,idx),(9,idx),bg_fila),   # cols 0-9
-                    ('BACKGROUND',(11,idx),(11,idx),bg_fila), # col 11 obs
-                    # Columna 10 = Interpretación: siempre verde o rojo
-                    ('BACKGROUND',(10,idx),(10,idx),VERDE if conf_r else ROJO),
-                    ('TEXTCOLOR',(10,idx),(10,idx),BLANCO),
-                    ('FONTNAME',(10,idx),(10,idx),'Helvetica-Bold'),
-                ]
-            tab.setStyle(TableStyle(ts))
-            story.append(tab)
-            story+=[Spacer(1,0.1*inch),PageBreak()]
-
-        story+=[HRFlowable(width="100%",thickness=1,color=colors.grey),
-                Spacer(1,0.05*inch),
-                Paragraph(f"RETILAP 2024 · Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}",ePi)]
-        doc.build(story); buf.seek(0); return buf.getvalue()
-    except ImportError:
-        st.error("❌ Instala reportlab en requirements.txt"); return None
-    except Exception as e:
-        st.error(f"❌ Error PDF: {e}"); return None
+
+# ============================================================================
+# PDF — TABLA RETILAP COMPLETA (orientación landscape)
+# ============================================================================
+@medido("generar_reporte_pdf")
+def construir_reporte_pdf(proyecto_data,proyecto_nombre,preparador=None,avance=None,destino=None):
+    """Informe PDF. La interfaz lo genera siempre como trabajo con destino (ruta): lo
+    escribe en ese archivo y devuelve la ruta. Sin destino devuelve los bytes (lo usan
+    los benchmarks para comparar). Lanza la excepción si falla; avance(fracción,etapa)
+    recibe el progreso."""
+    from informe_pdf import escribir_pdf
+    return escribir_pdf(construir_modelo(proyecto_data,preparador or preparador_planos()),destino,avance)
 
 # ============================================================================
 def inicializar_session_state():
@@ -620,13 +460,84 @@ def pagina_inicio():
     st.markdown("""<div class="main-header"><span style="font-size:2.2rem">💡</span>
       <div><h1>LuxOMeter PRO</h1><p>Auditoría de Iluminación · Norma RETILAP 2024</p></div>
     </div>""",unsafe_allow_html=True)
-    c1,c2=st.columns([3,1])
+    c1,c2,c3,c4=st.columns([2,1,1,1])
     with c1: st.subheader("📋 Proyectos")
     with c2:
+        if st.button("🗂️ Catálogo",use_container_width=True,key="btn_cat"):
+            st.session_state.pagina="catalogo"; st.rerun()
+    with c3:
+        if st.button("📈 Analítica",use_container_width=True,key="btn_an"):
+            st.session_state.pagina="analitica"; st.rerun()
+    with c4:
         if st.button("➕ Nuevo Proyecto",use_container_width=True,key="btn_np"):
             st.session_state.pagina="nuevo_proyecto"; st.rerun()
+    panel_trabajos()
+    with st.expander("🧳 Paquetes de campo (trabajo sin conexión)"):
+        st.caption("Descarga el paquete de un proyecto, ábrelo en el equipo de campo y devuelve aquí "
+                   "el paquete de cambios: solo viajan los puntos modificados y las fotos nuevas.")
+        paq=st.file_uploader("Paquete (.zip)",type=["zip"],key="paq_campo")
+        if paq and st.button("🔄 Sincronizar paquete",key="btn_sync",type="primary"):
+            try:
+                nombre,inf=sincronizar_paquete(paq)
+                st.success(f"✅ {nombre}: {inf['aplicados']} cambio(s) aplicados")
+                for c in inf["conflictos"]:
+                    donde=f"{c['plano']} · Punto {c['punto']}" if "plano" in c else c["general"]
+                    st.warning(f"⚠️ Conflicto en {donde}: se conservó la versión de{'l campo' if c['ganador']=='campo' else 'l servidor'}")
+            except Exception as e: st.error(f"❌ Paquete inválido: {e}")
+    with st.expander("💾 Restaurar respaldo de proyecto"):
+        resp=st.file_uploader("Respaldo (.zip)",type=["zip"],key="resp_zip")
+        if resp:
+            try:
+                man=leer_manifiesto(resp)
+                st.caption(f"📋 {man['proyecto']} · 📱 origen: {man['dispositivo_origen'] or 'N/A'} · "
+                           f"📅 {man['creado']} · {len(man['planos'])} plano(s) · {len(man['archivos'])} archivo(s)")
+                cr1,cr2=st.columns([2,1])
+                with cr1: destino=st.text_input("Dispositivo destino",value=get_device_id(),key="resp_dest")
+                with cr2: reemplazar=st.checkbox("Reemplazar si existe",key="resp_reemp")
+                destino="".join(c for c in destino if c.isalnum() or c in "-_") or "default"
+                if st.button("📥 Importar respaldo",key="btn_resp",type="primary"):
+                    with st.spinner("Verificando e importando..."):
+                        nombre=importar_en_dispositivo(resp,PROYECTOS_DIR,destino,reemplazar)
+                    if destino==get_device_id(): st.session_state.proyectos=cargar_proyectos()
+                    st.success(f"✅ '{nombre}' importado en el dispositivo {destino}")
+            except Exception as e: st.error(f"❌ Respaldo inválido: {e}")
+    # la búsqueda cubre los proyectos de todos los dispositivos, así que va antes del
+    # corte por no tener proyectos propios
+    consulta=st.text_input("🔍 Buscar en todas las auditorías",key="busq_global",
+        placeholder="Empresa, NIT, OT, sede, puesto, observaciones... (admite errores de tipeo)")
+    if consulta.strip():
+        ix=indice_busqueda(); ix.refrescar(PROYECTOS_DIR)
+        resultados=ix.buscar(consulta)
+        if not resultados: st.caption("Sin resultados.")
+        for j,res in enumerate(resultados[:20]):
+            with st.container(border=True):
+                cr,co=st.columns([4,1])
+                with cr:
+                    st.markdown(f"**{res['empresa'] or res['proyecto']}** · {res['proyecto']}  ·  📱 {res['dispositivo']}")
+                    for m in res["coincidencias"][:3]:
+                        donde=f"{m['plano']} · Punto {m['numero']} · " if m["numero"] else (f"{m['plano']} · " if m["plano"] else "")
+                        st.caption(f"{donde}{m['campo']}: {m['texto'][:120]}")
+                with co:
+                    if st.button("Abrir",key=f"busq_abrir_{j}",use_container_width=True):
+                        abrir_proyecto(res["dispositivo"],res["proyecto"])
+        st.divider()
     if not st.session_state.proyectos:
         st.info("ℹ️ No hay proyectos. Crea uno nuevo para comenzar."); return
+    n_filas=contar_filas(st.session_state.proyectos)
+    if n_filas:
+        with st.expander(f"📦 Exportar consolidado ({n_filas} mediciones)",expanded=False):
+            cx1,cx2=st.columns(2)
+            with cx1:
+                st.download_button("📊 CSV consolidado",
+                    data=descarga_diferida(exportar_csv,st.session_state.proyectos),
+                    file_name=f"RETILAP_consolidado_{datetime.now().strftime('%Y%m%d')}.csv",
+                    mime="text/csv;charset=utf-8",key="csv_todos",use_container_width=True)
+            with cx2:
+                st.download_button("📗 Excel consolidado",
+                    data=descarga_diferida(exportar_xlsx,st.session_state.proyectos),
+                    file_name=f"RETILAP_consolidado_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="xlsx_todos",use_container_width=True)
     for idx,(pnombre,pdata) in enumerate(st.session_state.proyectos.items()):
         g=pdata["general"]; tot=conf=0; all_data=[]
         for pi in pdata["planos"].values():
@@ -649,59 +560,38 @@ def pagina_inicio():
             with cb:
                 if st.button("✏️ Editar",key=f"ed_{idx}",use_container_width=True):
                     st.session_state.proyecto_actual=pnombre; st.session_state.pagina="editar_proyecto"; st.rerun()
-                csv_d=generar_reporte_csv(pdata,pnombre)
+                base=f"RETILAP_{pnombre[:18].replace(' ','_')}"
+                if tot>=UMBRAL_FILAS_ARCHIVO:
+                    # Proyecto grande: se genera en flujo a disco solo al descargar
+                    csv_d=descarga_diferida(exportar_csv,{pnombre:pdata})
+                else:
+                    csv_d=generar_reporte_csv(pdata,pnombre)
                 if csv_d:
-                    st.download_button("📊 CSV",data=csv_d,
-                        file_name=f"RETILAP_{pnombre[:18].replace(' ','_')}.csv",
+                    st.download_button("📊 CSV",data=csv_d,file_name=f"{base}.csv",
                         mime="text/csv;charset=utf-8",key=f"csv_{idx}",use_container_width=True)
-                pdf_d=generar_reporte_pdf(pdata,pnombre)
-                if pdf_d:
-                    st.download_button("📄 PDF",data=pdf_d,
-                        file_name=f"RETILAP_{pnombre[:18].replace(' ','_')}.pdf",
-                        mime="application/pdf",key=f"pdf_{idx}",use_container_width=True)
-                if st.button("📝 Word",key=f"word_{idx}",use_container_width=True):
-                    with st.spinner("Generando Word..."):
-                        try:
-                            todas_med=[]
-                            for pln,pi in pdata.get("planos",{}).items():
-                                for d in pi.get("data",[]):
-                                    todas_med.append({
-                                        "num":d.get("Número",0),"area":d.get("TipoArea",""),
-                                        "puesto_evaluado":d.get("PuestoEvaluado",""),"ubicacion":d.get("UbicacionLuminaria",""),
-                                        "tipo_iluminacion":d.get("TipoIluminacion",""),
-                                        "tipo_lampara":d.get("TipoLampara",""),
-                                        "ubicacion_luminaria":d.get("UbicacionLuminaria",""),
-                                        "control_luz_natural":d.get("ControlLuzNatural",""),
-                                        "altura_luminaria":d.get("AlturaLuminaria",""),
-                                        "med1":d.get("Med1",0),"med2":d.get("Med2",0),
-                                        "med3":d.get("Med3",0),"med4":d.get("Med4",0),
-                                        "e_min":d.get("EMin",""),"e_max":d.get("EMax",""),
-                                        "e_medio":d.get("EMedio",""),
-                                        "promedio":d.get("Promedio",0),
-                                        "uo_calc":d.get("Uo_calc",""),
-                                        "interpretacion_uo":d.get("InterpretacionUo",""),
-                                        "em_req":d.get("Em_req",0),
-                                        "resultado":d.get("Resultado",""),
-                                        "nota":d.get("Nota",""),
-                                        "recomendacion":d.get("Recomendacion",""),
-                                    })
-                            plano_imgs={pln:dibujar_puntos(pi["img"],pi["data"])
-                                        for pln,pi in pdata.get("planos",{}).items()
-                                        if pi.get("img") and pi.get("data")}
-                            word_buf=generar_informe_word(g,todas_med,plano_imgs,
-                                arl=g.get("arl","Positiva"),
-                                plantillas_arl=PLANTILLAS_ARL)
-                            fname=(f"Informe_RETILAP_{g.get('nombre_empresa','').replace(' ','_')}"
-                                   f"_{datetime.now().strftime('%Y%m%d')}.docx")
-                            st.download_button("⬇️ Descargar Word",data=word_buf,file_name=fname,
-                                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                                key=f"dlw_{idx}")
-                            st.success("✅ Listo.")
-                        except Exception as e: st.error(f"Error Word: {e}")
+                if tot>0:
+                    st.download_button("📗 Excel",data=descarga_diferida(exportar_xlsx,{pnombre:pdata}),
+                        file_name=f"{base}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key=f"xlsx_{idx}",use_container_width=True)
+                for tipo,(etiqueta,_,_) in EXPORTACIONES.items():
+                    if tipo in ("pdf","word","informe") and not tot: continue
+                    if tipo=="campo" and pdata.get("campo"): etiqueta="📤 Devolver cambios"
+                    if st.button(etiqueta,key=f"{tipo}_{idx}",use_container_width=True):
+                        encolar_exportacion(tipo,pnombre,pdata); st.rerun()
                 if st.button("🗑️ Eliminar",key=f"del_{idx}",use_container_width=True):
                     del st.session_state.proyectos[pnombre]
                     guardar_proyectos(st.session_state.proyectos); st.rerun()
 
+def abrir_proyecto(dispositivo,nombre):
+    """Abre un proyecto para edición, cambiando de dispositivo si hace falta."""
+    if dispositivo!=get_device_id():
+        st.query_params["device_id"]=dispositivo
+        st.session_state.proyectos=cargar_proyectos()
+    if nombre not in st.session_state.proyectos:
+        st.error("❌ El proyecto ya no existe"); return
+    st.session_state.proyecto_actual=nombre; st.session_state.pagina="editar_proyecto"; st.rerun()
+
 def pagina_nuevo_proyecto():
     st.markdown('<div class="main-header"><span style="font-size:2rem">➕</span>'
                 '<div><h1>Nuevo Proyecto</h1></div></div>',unsafe_allow_html=True)
@@ -753,12 +643,27 @@ def pagina_editar_proyecto():
     st.markdown(f'<div class="main-header"><span style="font-size:2rem">✏️</span>'
                 f'<div><h1>{g.get("nombre_empresa","Proyecto")}</h1>'
                 f'<p>{g.get("sede","")} · {g.get("fecha","")}</p></div></div>',unsafe_allow_html=True)
-    cv,ce=st.columns([1,1])
+    cv,ce,cs=st.columns([1,1,1])
     with cv:
         if st.button("← Volver",key="volver_ep"): st.session_state.pagina="inicio"; st.rerun()
     with ce:
         if st.button("⚙️ Editar datos del proyecto",key="toggle_edit"):
             st.session_state["_show_edit"]=not st.session_state.get("_show_edit",False); st.rerun()
+    with cs:
+        if SERVIDOR_SYNC and st.button("🔄 Sincronizar con servidor",key="btn_sync_srv"):
+            with st.spinner("Sincronizando..."):
+                try:
+                    crudo,inf=sincronizar(pnombre,serializar_proyecto(pnombre,pdata),get_device_id(),servidor_sync())
+                    st.session_state.proyectos[pnombre]=decodificar_proyecto(crudo)
+                    guardar_proyectos(st.session_state.proyectos)
+                    st.session_state["_msg_sync"]=(f"✅ Sincronizado: ↑ {inf['subidos']} ítems ({inf['bytes_subidos']/1024:.1f} KB) · "
+                        f"↓ {inf['bajados']} ítems ({inf['bytes_bajados']/1024:.1f} KB)"
+                        +(f" · ⚠️ {len(inf['conflictos'])} conflicto(s) resueltos" if inf["conflictos"] else ""))
+                except Exception as e: st.session_state["_msg_sync"]=f"❌ Error de sincronización: {e}"
+            st.rerun()
+    msg=st.session_state.pop("_msg_sync",None)
+    if msg: (st.error if msg.startswith("❌") else st.success)(msg)
+    panel_trabajos()
     if st.session_state.get("_show_edit",False):
         with st.expander("📝 Editar información",expanded=True):
             with st.form("form_edit_gral"):
@@ -784,12 +689,17 @@ def pagina_editar_proyecto():
                 with cee1: v_marca =st.text_input("Marca luxómetro",value=eq.get("marca","Hanger"))
                 with cee2: v_modelo=st.text_input("Modelo",         value=eq.get("modelo","EC1"))
                 with cee3: v_serie =st.text_input("N° de Serie",    value=eq.get("serie","54815"))
+                v_flujo=st.number_input("Flujo de la luminaria a instalar (lm)",min_value=0.0,step=100.0,
+                    value=float(g.get("flujo_luminaria") or 0),
+                    help="Para estimar luminarias adicionales por el método de los lúmenes en planos "
+                         "calibrados. 0 = no estimarlas.")
                 if st.form_submit_button("💾 Guardar cambios",use_container_width=True):
                     g.update({"numero_orden":v_or,"nombre_empresa":v_em,"nit":v_ni,"direccion":v_di,
                               "sede":v_se,"telefono":v_te,"responsable_empresa":v_re,
                               "responsable_higienista":v_hi,"resolucion":v_rs,"arl":v_arl,
                               "equipo":{"instrumento":"Luxómetro","marca":v_marca,
-                                        "modelo":v_modelo,"serie":v_serie}})
+                                        "modelo":v_modelo,"serie":v_serie},
+                              "flujo_luminaria":v_flujo or None})
                     guardar_proyectos(st.session_state.proyectos)
                     st.session_state["_show_edit"]=False; st.success("✅ Actualizado"); st.rerun()
     st.divider(); st.subheader("📐 Planos")
@@ -804,12 +714,14 @@ def pagina_editar_proyecto():
                 if st.button("✅ Agregar con plano",key="btn_add_plano"):
                     if plano_nombre in pdata["planos"]: st.warning("⚠️ Ya existe")
                     else:
+                        if up_plano.type=="application/pdf":
+                            # La conversión del PDF tarda: se hace en segundo plano
+                            encolar_rasterizado(pnombre,plano_nombre,up_plano.getvalue()); st.rerun()
                         try:
-                            img=(convert_from_bytes(up_plano.read())[0]
-                                 if up_plano.type=="application/pdf" else Image.open(up_plano))
+                            img=Image.open(up_plano)
                             if img.mode!="RGB": img=img.convert("RGB")
                             if img.width>1920: r=1920/img.width; img=img.resize((1920,int(img.height*r)),Image.LANCZOS)
-                            pdata["planos"][plano_nombre]={"img":img,"puntos":[],"data":[],"fotos":{},"sin_plano":False}
+                            pdata["planos"][plano_nombre]={"img":memoria_sesion().imagen(img),"puntos":[],"data":[],"fotos":{},"sin_plano":False}
                             guardar_proyectos(st.session_state.proyectos); st.success(f"✅ '{plano_nombre}' agregado"); st.rerun()
                         except Exception as e: st.error(f"❌ {e}")
         else:
@@ -835,6 +747,219 @@ def pagina_editar_proyecto():
                     del pdata["planos"][pln]; guardar_proyectos(st.session_state.proyectos); st.rerun()
     else: st.info("ℹ️ Agrega un plano para comenzar")
 
+PUNTOS_POR_PAGINA=[10,25,50]
+
+def _lecturas_parciales():
+    """{(proyecto, plano, id_punto): valores} de los puntos con lecturas incompletas: no
+    entran a los resultados hasta tener las 4, pero se conservan en la sesión para cuando
+    el punto se vuelva a mostrar (paginación, filtros, cambio de vista)."""
+    return st.session_state.setdefault("_lecturas_parciales",{})
+
+def _guardar_entrada(pl_data,entrada):
+    idx_ex=next((j for j,d in enumerate(pl_data["data"]) if d["Número"]==entrada["Número"]),None)
+    if idx_ex is not None: pl_data["data"][idx_ex]=entrada
+    else: pl_data["data"].append(entrada)
+
+# Lo que muestra el resumen del plano (tabla, gráfica, estadísticas y simulador)
+COLUMNAS_RESULTADOS=["Número","TipoArea","Em_req","Med1","Med2","Med3","Med4",
+                     "EMin","EMax","EMedio","Promedio","Uo_calc","InterpretacionUo","Resultado"]
+CAMPOS_RESUMEN=COLUMNAS_RESULTADOS+["Coordenadas","AlturaLuminaria"]
+
+def _actualizar_punto(pnombre,pl_nombre,pl_data,i):
+    """Recalcula el punto i con los valores de sus widgets y lo guarda si cambió; las
+    lecturas incompletas quedan en _lecturas_parciales. Devuelve (anterior, entrada)."""
+    ss=st.session_state; k=f"{pnombre}_{pl_nombre}_{i}"; xn,yn=pl_data["puntos"][i]
+    ex=next((d for d in pl_data["data"] if d["Número"]==i+1),{})
+    tipo_area=ss[f"ta_{k}"]; meds=[ss[f"m{j}_{k}"] for j in range(1,5)]
+    detalle={"TipoIluminacion":ss[f"ilum_{k}"],"TipoLampara":ss[f"lamp_{k}"],"PuestoEvaluado":ss[f"puesto_{k}"],
+        "UbicacionLuminaria":ss[f"ubic_{k}"],"ControlLuzNatural":ss[f"ctrl_{k}"],"AlturaLuminaria":ss[f"alt_{k}"],
+        "Nota":ss[f"nota_{k}"],"Recomendacion":ss[f"recom_{k}"],"Foto":tiene_foto_punto(pl_data,i+1)}
+    entrada=calcular_medicion(i+1,xn,yn,tipo_area,meds,detalle)
+    parciales=_lecturas_parciales(); clave_p=(pnombre,pl_nombre,id_punto((xn,yn)))
+    if entrada is None and any(meds):
+        parciales[clave_p]={"TipoArea":tipo_area,**dict(zip(("Med1","Med2","Med3","Med4"),meds)),**detalle}
+    else: parciales.pop(clave_p,None)
+    # Solo se escribe a disco cuando el punto cambió
+    if entrada and entrada!=ex:
+        _guardar_entrada(pl_data,entrada)
+        guardar_proyectos(st.session_state.proyectos)
+    return ex,entrada
+
+def _al_editar_punto(pnombre,pl_nombre,i):
+    """on_change de los widgets de un punto. Sin más, Streamlit re-ejecuta solo el fragmento
+    del punto; si cambió algo que muestra el resumen se re-ejecuta también el resumen, y si
+    cambió el color de un marcador, la página (el plano)."""
+    pl_data=st.session_state.proyectos[pnombre]["planos"][pl_nombre]; kp=f"{pnombre}_{pl_nombre}"
+    marcadores=firma_marcadores(pl_data)
+    ex,entrada=_actualizar_punto(pnombre,pl_nombre,pl_data,i)
+    if not entrada or entrada==ex: return
+    plano_img=pl_data.get("img")
+    if not pl_data.get("sin_plano",plano_img is None) and plano_img is not None \
+            and firma_marcadores(pl_data)!=marcadores:
+        st.rerun()
+    if any(entrada.get(c)!=ex.get(c) for c in CAMPOS_RESUMEN):
+        st.rerun([f"punto_{kp}_{i}",f"resumen_{kp}"])
+
+def editor_punto(pnombre,pl_nombre,i,expandido=False):
+    """Editor de un único punto (solo se instancian los visibles), en su propio fragmento:
+    escribir una lectura re-ejecuta ese punto y, si cambia su resultado, el resumen."""
+    st.fragment(_editor_punto,key=f"punto_{pnombre}_{pl_nombre}_{i}")(pnombre,pl_nombre,i,expandido)
+
+def _editor_punto(pnombre,pl_nombre,i,expandido):
+    TIPOS=TIPOS_AREA; k=f"{pnombre}_{pl_nombre}_{i}"; al_editar=dict(on_change=_al_editar_punto,args=(pnombre,pl_nombre,i))
+    pl_data=st.session_state.proyectos[pnombre]["planos"][pl_nombre]
+    plano_img=pl_data.get("img"); sin_plano=pl_data.get("sin_plano",plano_img is None)
+    if i>=len(pl_data["puntos"]): return
+    ex=next((d for d in pl_data["data"] if d["Número"]==i+1),{})
+    xn,yn=pl_data["puntos"][i]
+    if plano_img and not sin_plano:
+        x=int(xn*plano_img.width); y=int(yn*plano_img.height)
+        coord_txt=f"({x}, {y})"
+    else:
+        coord_txt=""
+    icono=estado_punto(ex)
+    parciales=_lecturas_parciales(); clave_p=(pnombre,pl_nombre,id_punto((xn,yn)))
+    ex_v={**ex,**parciales.get(clave_p,{})}      # lo guardado más lo que quedó a medias
+
+    with st.expander(f"{icono} Punto {i+1}  {coord_txt}",expanded=expandido):
+        if st.button(f"🗑️ Eliminar punto {i+1}",key=f"delpt_{k}"):
+            pl_data["puntos"].pop(i)
+            pl_data["data"]=[d for d in pl_data["data"] if d["Número"]!=i+1]
+            for d in pl_data["data"]:
+                if d["Número"]>i+1: d["Número"]-=1
+            # las fotos van por número: las de los puntos siguientes se corren uno
+            pl_data["fotos"]={(str(int(n)-1) if int(n)>i+1 else n):v
+                              for n,v in pl_data.get("fotos",{}).items() if int(n)!=i+1}
+            guardar_proyectos(st.session_state.proyectos); st.rerun()
+
+        ta_g=ex_v.get("TipoArea",TIPOS[0])
+        # Búsqueda rápida RETILAP
+        busq=st.text_input("🔍 Buscar área RETILAP",value="",
+            placeholder="Escribe p.ej: oficina, taller, educación...",
+            key=f"busq_{k}")
+        tipos_filtrados=INDICE_RETILAP.buscar(busq) if busq else TIPOS
+        if not tipos_filtrados:
+            st.caption("⚠️ Sin resultados — mostrando todas")
+            tipos_filtrados=TIPOS
+        idx_def=tipos_filtrados.index(ta_g) if ta_g in tipos_filtrados else 0
+        tipo_area=st.selectbox("🏷️ Tipo de área RETILAP",tipos_filtrados,
+            index=idx_def,
+            key=f"ta_{k}",**al_editar)
+        em_req=RETILAP_REFERENCIA[tipo_area]["Em"]
+        uo_min=RETILAP_REFERENCIA[tipo_area]["Uo"]
+        st.markdown(f'<div class="em-box">⚡ Em requerida: <strong>{em_req} lx</strong>'
+                    f'&nbsp;·&nbsp; Uo mínima: <strong>{uo_min}</strong></div>',
+                    unsafe_allow_html=True)
+
+        c1,c2,c3,c4=st.columns(4)
+        with c1: st.number_input("Lux 1",min_value=0.0,step=1.0,value=float(ex_v.get("Med1",0)),key=f"m1_{k}",**al_editar)
+        with c2: st.number_input("Lux 2",min_value=0.0,step=1.0,value=float(ex_v.get("Med2",0)),key=f"m2_{k}",**al_editar)
+        with c3: st.number_input("Lux 3",min_value=0.0,step=1.0,value=float(ex_v.get("Med3",0)),key=f"m3_{k}",**al_editar)
+        with c4: st.number_input("Lux 4",min_value=0.0,step=1.0,value=float(ex_v.get("Med4",0)),key=f"m4_{k}",**al_editar)
+
+        ca,cb,cc=st.columns(3)
+        with ca:
+            ti_v=ex_v.get("TipoIluminacion","Artificial")
+            st.selectbox("Tipo iluminación",ILUM,
+                index=ILUM.index(ti_v) if ti_v in ILUM else 1,key=f"ilum_{k}",**al_editar)
+        with cb:
+            tl_v=ex_v.get("TipoLampara","LED")
+            st.selectbox("Tipo lámpara",LAMP,
+                index=LAMP.index(tl_v) if tl_v in LAMP else 0,key=f"lamp_{k}",**al_editar)
+        with cc:
+            ul_v=ex_v.get("UbicacionLuminaria","Lateral")
+            st.selectbox("Ubicación luminaria",UBIC,
+                index=UBIC.index(ul_v) if ul_v in UBIC else 0,key=f"ubic_{k}",**al_editar)
+
+        st.text_input("🪑 Puesto de trabajo / Área evaluada",
+            value=ex_v.get("PuestoEvaluado",""),
+            placeholder="Ej: Escritorio contador, Línea de ensamble 3...",
+            key=f"puesto_{k}",**al_editar)
+
+        cd,ce2=st.columns(2)
+        with cd:
+            cl_v=ex_v.get("ControlLuzNatural","N/A")
+            st.selectbox("Control Luz Natural",CONTROL_LUZ,
+                index=CONTROL_LUZ.index(cl_v) if cl_v in CONTROL_LUZ else 0,key=f"ctrl_{k}",**al_editar)
+        with ce2:
+            st.text_input("Altura Luminaria (m)",value=str(ex_v.get("AlturaLuminaria","")),
+                key=f"alt_{k}",**al_editar)
+
+        st.markdown("**📷 Foto del punto**")
+        foto_bytes=cargar_foto_punto(pl_data,i+1)
+        cf1,cf2=st.columns([1,2])
+        with cf1:
+            if foto_bytes: st.image(foto_bytes,caption=f"Foto {i+1}",width=140)
+        with cf2:
+            foto_up=st.file_uploader("Subir / cambiar foto",type=["jpg","jpeg","png"],
+                key=f"foto_{k}")
+            if foto_up:
+                pl_data["fotos"][i+1]=memoria_sesion().foto(foto_up.read())
+                guardar_proyectos(st.session_state.proyectos); st.success("✅ Foto guardada"); st.rerun()
+
+        st.text_area("Observaciones",height=60,value=ex_v.get("Nota",""),key=f"nota_{k}",**al_editar)
+        st.text_area("Recomendaciones",height=60,value=ex_v.get("Recomendacion",""),key=f"recom_{k}",**al_editar)
+
+        # Las ediciones ya se guardaron en _al_editar_punto; aquí se guarda lo que cambia sin
+        # que el usuario toque el widget (p. ej. el tipo de área al filtrar la búsqueda)
+        _,entrada=_actualizar_punto(pnombre,pl_nombre,pl_data,i)
+        if entrada:
+            if "✅" in entrada["Resultado"]:
+                st.success(f"Promedio: **{entrada['Promedio']} lx** — Uo: **{entrada['Uo_calc']}** — ✅ ADECUADO")
+            else:
+                st.error(f"Promedio: **{entrada['Promedio']} lx** (req. ≥{em_req} lx) — Uo: **{entrada['Uo_calc']}** — ❌ DEFICIENTE")
+
+def editor_tabla_puntos(pnombre,pl_nombre,pl_data,plano_img,sin_plano,por_num):
+    """Edición masiva en una sola tabla (st.data_editor); los cambios se aplican en lote."""
+    import pandas as pd
+    filas=[]; parciales=_lecturas_parciales()
+    claves=[(pnombre,pl_nombre,id_punto(xy)) for xy in pl_data["puntos"]]
+    for i in range(len(pl_data["puntos"])):
+        ex={**por_num.get(i+1,{}),**parciales.get(claves[i],{})}
+        filas.append({"N°":i+1,"Estado":estado_punto(por_num.get(i+1,{})),
+            "Puesto":ex.get("PuestoEvaluado",""),"Tipo de área":ex.get("TipoArea",TIPOS_AREA[0]),
+            "Lux 1":float(ex.get("Med1",0)),"Lux 2":float(ex.get("Med2",0)),
+            "Lux 3":float(ex.get("Med3",0)),"Lux 4":float(ex.get("Med4",0)),
+            "Iluminación":ex.get("TipoIluminacion","Artificial"),"Lámpara":ex.get("TipoLampara","LED"),
+            "Ubicación":ex.get("UbicacionLuminaria","Lateral"),"Ctrl. luz":ex.get("ControlLuzNatural","N/A"),
+            "Altura (m)":str(ex.get("AlturaLuminaria","")),
+            "Observaciones":ex.get("Nota",""),"Recomendaciones":ex.get("Recomendacion","")})
+    cc=st.column_config
+    lux=lambda t: cc.NumberColumn(t,min_value=0.0,step=1.0,format="%.1f")
+    editado=st.data_editor(pd.DataFrame(filas),hide_index=True,num_rows="fixed",
+        use_container_width=True,disabled=["N°","Estado"],key=f"tabla_{pnombre}_{pl_nombre}",
+        column_config={"Tipo de área":cc.SelectboxColumn(options=TIPOS_AREA,required=True,width="large"),
+            "Lux 1":lux("Lux 1"),"Lux 2":lux("Lux 2"),"Lux 3":lux("Lux 3"),"Lux 4":lux("Lux 4"),
+            "Iluminación":cc.SelectboxColumn(options=ILUM,required=True),
+            "Lámpara":cc.SelectboxColumn(options=LAMP,required=True),
+            "Ubicación":cc.SelectboxColumn(options=UBIC,required=True),
+            "Ctrl. luz":cc.SelectboxColumn(options=CONTROL_LUZ,required=True)})
+    if st.button("💾 Aplicar cambios",key=f"aplicar_tabla_{pnombre}_{pl_nombre}",type="primary"):
+        lecturas=editado[["Lux 1","Lux 2","Lux 3","Lux 4"]].to_numpy()
+        detalles=[{"PuestoEvaluado":r["Puesto"],"TipoIluminacion":r["Iluminación"],"TipoLampara":r["Lámpara"],
+              "UbicacionLuminaria":r["Ubicación"],"ControlLuzNatural":r["Ctrl. luz"],
+              "AlturaLuminaria":r["Altura (m)"],"Nota":r["Observaciones"] or "",
+              "Recomendacion":r["Recomendaciones"] or "",
+              "Foto":tiene_foto_punto(pl_data,int(r["N°"]))}
+             for r in editado.to_dict("records")]
+        nuevas=calcular_mediciones(editado["N°"].tolist(),pl_data["puntos"],
+            editado["Tipo de área"].tolist(),lecturas,detalles)
+        for k,e in enumerate(nuevas):
+            if e is None and lecturas[k].any():
+                parciales[claves[k]]={"TipoArea":editado["Tipo de área"].iat[k],
+                    **dict(zip(("Med1","Med2","Med3","Med4"),map(float,lecturas[k]))),**detalles[k]}
+            else: parciales.pop(claves[k],None)
+        cambios=0
+        for e in nuevas:
+            if e and e!=por_num.get(e["Número"]): _guardar_entrada(pl_data,e); cambios+=1
+        incompletos=sum(1 for e in nuevas if e is None)
+        if cambios: guardar_proyectos(st.session_state.proyectos)
+        st.session_state[f"_msg_tabla_{pnombre}_{pl_nombre}"]=(
+            f"✅ {cambios} punto(s) actualizados"+(f" · {incompletos} sin las 4 lecturas" if incompletos else ""))
+        st.rerun()
+    msg=st.session_state.pop(f"_msg_tabla_{pnombre}_{pl_nombre}",None)
+    if msg: st.success(msg)
+
 def pagina_editar_plano():
     if "plano_actual" not in st.session_state: st.session_state.pagina="inicio"; st.rerun()
     pnombre=st.session_state.proyecto_actual; pl_nombre=st.session_state.plano_actual
@@ -848,14 +973,7 @@ def pagina_editar_plano():
     sin_plano=pl_data.get("sin_plano",plano_img is None)
 
     if not sin_plano and plano_img is not None:
-        img_mostrar=dibujar_puntos(plano_img,pl_data["data"]) if pl_data["data"] else plano_img
-        st.image(img_mostrar,caption="Haz clic sobre el plano para agregar un punto",use_container_width=True)
-        clicked=streamlit_image_coordinates(plano_img,key=f"clicker_{pnombre}_{pl_nombre}",
-                                            height=plano_img.height,width=plano_img.width)
-        if clicked is not None:
-            xn=clicked["x"]/plano_img.width; yn=clicked["y"]/plano_img.height
-            if not any(abs(px-xn)<0.01 and abs(py-yn)<0.01 for px,py in pl_data["puntos"]):
-                pl_data["puntos"].append((xn,yn)); guardar_proyectos(st.session_state.proyectos); st.rerun()
+        panel_plano(pnombre,pl_nombre)
 
     cm1,cm2,cm3=st.columns(3)
     with cm1: st.metric("Puntos registrados",len(pl_data["puntos"]))
@@ -864,16 +982,18 @@ def pagina_editar_plano():
             if pl_data["puntos"]:
                 n=len(pl_data["puntos"]); pl_data["puntos"].pop()
                 pl_data["data"]=[d for d in pl_data["data"] if d["Número"]!=n]
+                pl_data["fotos"]={k:v for k,v in pl_data.get("fotos",{}).items() if int(k)!=n}
                 guardar_proyectos(st.session_state.proyectos); st.rerun()
     with cm3:
         if st.button("🧹 Limpiar todos",key=f"limpiar_{pl_nombre}"):
-            pl_data["puntos"]=[]; pl_data["data"]=[]; guardar_proyectos(st.session_state.proyectos); st.rerun()
+            pl_data["puntos"]=[]; pl_data["data"]=[]; pl_data["fotos"]={}; guardar_proyectos(st.session_state.proyectos); st.rerun()
 
     # Sin plano: botón para agregar puntos manualmente
     if sin_plano:
         st.info("📋 Área sin plano — agrega los puntos de medición manualmente.")
         if st.button("➕ Agregar punto de medición",key=f"add_pt_manual_{pl_nombre}"):
-            n=len(pl_data["puntos"])
+            # la coordenada identifica al punto (campo.id_punto): no repetir la de uno existente
+            n=int(max((y for _,y in pl_data["puntos"]),default=-1))+1
             pl_data["puntos"].append((0.0, float(n)))
             guardar_proyectos(st.session_state.proyectos); st.rerun()
 
@@ -883,129 +1003,241 @@ def pagina_editar_plano():
         else: st.info("Haz clic sobre el plano para marcar el primer punto.")
         return
 
+    importador_lecturas(pnombre,pl_nombre)
+    panel_mediciones(pnombre,pl_nombre)
+
+@st.cache_data(max_entries=4, show_spinner="Leyendo registro...")
+def _leer_registro(datos,nombre,col_lux,col_tiempo,unidad,col_unidad,decimal):
+    from importar_lecturas import leer_registro
+    return leer_registro(datos,nombre,col_lux,col_tiempo,unidad,col_unidad,decimal)
+
+def _sugerir(cols,claves):
+    return next((i for i,c in enumerate(cols) if any(k in c.lower() for k in claves)),None)
+
+@st.fragment
+def importador_lecturas(pnombre,pl_nombre):
+    """Carga masiva de Lux 1..4 desde el archivo de registro (CSV/XLSX) de un luxómetro."""
+    from importar_lecturas import columnas_registro, asignar_lecturas, UNIDADES, MODOS as MODOS_IMPORTACION
+    pl_data=st.session_state.proyectos[pnombre]["planos"][pl_nombre]; kp=f"{pnombre}_{pl_nombre}"
+    n_total=len(pl_data["puntos"])
+    msg=st.session_state.pop(f"_msg_imp_{kp}",None)
+    if msg: st.success(msg)
+    with st.expander("📥 Importar lecturas del luxómetro (CSV / XLSX)"):
+        arch=st.file_uploader("Archivo del registrador",type=["csv","txt","xlsx"],key=f"imp_arch_{kp}")
+        if not arch:
+            st.caption("Las lecturas se reparten de a 4 por punto, en orden o por pausas entre ráfagas.")
+            return
+        try: cols=columnas_registro(arch,arch.name)
+        except Exception as e: st.error(f"❌ No se pudo leer el archivo: {e}"); return
+        if not cols: st.error("❌ El archivo no tiene encabezados"); return
+        c1,c2,c3=st.columns(3)
+        with c1: col_lux=st.selectbox("Columna de lecturas",cols,key=f"imp_lux_{kp}",
+                                      index=_sugerir(cols,("lux","lx","ilum","valor","value")) or 0)
+        with c2:
+            i_t=_sugerir(cols,("fecha","hora","time","date"))
+            col_t=st.selectbox("Columna de tiempo",["(ninguna)"]+cols,key=f"imp_t_{kp}",
+                               index=0 if i_t is None else i_t+1)
+        with c3:
+            i_u=_sugerir(cols,("unidad","unit"))
+            col_u=st.selectbox("Columna de unidad",["(ninguna)"]+cols,key=f"imp_u_{kp}",
+                               index=0 if i_u is None else i_u+1)
+        c4,c5,c6,c7,c8=st.columns([1,1,3,1,1])
+        with c4: unidad=st.selectbox("Unidad",list(UNIDADES),key=f"imp_unid_{kp}",
+                                     help="Se usa cuando no hay columna de unidad")
+        with c5: decimal=st.selectbox("Decimal",[".",","],key=f"imp_dec_{kp}")
+        with c6: modo=st.selectbox("Asignación a puntos",MODOS_IMPORTACION,key=f"imp_modo_{kp}")
+        with c7: desde=int(st.number_input("Desde punto N°",min_value=1,max_value=n_total,step=1,key=f"imp_desde_{kp}"))
+        with c8: pausa=st.number_input("Pausa (s)",min_value=0.5,value=5.0,step=0.5,key=f"imp_pausa_{kp}",
+                                       help="Silencio mínimo entre dos puntos (modo por tiempo)")
+        tipo_def=st.selectbox("Tipo de área para puntos sin medición",TIPOS_AREA,key=f"imp_area_{kp}")
+        sin_col=lambda c: None if c=="(ninguna)" else c
+        try:
+            lux,tiempos=_leer_registro(arch.getvalue(),arch.name,col_lux,sin_col(col_t),
+                                       unidad,sin_col(col_u),decimal)
+            vista=asignar_lecturas(lux,tiempos,n_total,modo,desde,pausa)
+        except Exception as e: st.error(f"❌ {e}"); return
+        n_alertas=int((vista["Alertas"]!="").sum())
+        st.caption(f"{len(lux):,} muestras · {len(vista)} puntos asignados (N° {desde} a {desde+len(vista)-1})"
+                   +(f" · ⚠️ {n_alertas} con alertas" if n_alertas else ""))
+        editado=st.data_editor(vista,hide_index=True,num_rows="fixed",use_container_width=True,
+                               disabled=[c for c in vista.columns if c!="Aplicar"],key=f"imp_vista_{kp}")
+        sel=editado[editado["Aplicar"]]
+        if st.button(f"✅ Aplicar {len(sel)} punto(s)",key=f"imp_aplicar_{kp}",type="primary",disabled=sel.empty):
+            por_num={d["Número"]:d for d in pl_data["data"]}
+            nums=sel["Punto"].astype(int).tolist()
+            nuevas=calcular_mediciones(nums,[pl_data["puntos"][n-1] for n in nums],
+                [por_num.get(n,{}).get("TipoArea",tipo_def) for n in nums],
+                sel[["Lux 1","Lux 2","Lux 3","Lux 4"]].to_numpy(),
+                [{k:por_num.get(n,{}).get(k,v) for k,v in DETALLE_DEFECTO.items()} for n in nums])
+            aplicados=0
+            for e in nuevas:
+                if not e: continue
+                _guardar_entrada(pl_data,e); aplicados+=1
+                # los editores del punto deben tomar los valores importados
+                for c in ("m1","m2","m3","m4","ta"): st.session_state.pop(f"{c}_{kp}_{e['Número']-1}",None)
+            if aplicados: guardar_proyectos(st.session_state.proyectos)
+            st.session_state[f"_msg_imp_{kp}"]=f"✅ {aplicados} punto(s) con lecturas importadas"
+            st.rerun(scope="app")
+
+def firma_marcadores(pl_data):
+    """Lo que se dibuja sobre el plano: número, posición y color de cada punto."""
+    return firma_puntos(pl_data["data"])
+
+def plano_anotado(pnombre,pl_nombre,pl_data):
+    """PNG del plano con sus marcadores, con caché por sesión: solo se redibuja y
+    re-codifica cuando cambian los marcadores."""
+    mem=memoria_sesion(); clave=(pnombre,pl_nombre); firma=firma_marcadores(pl_data); img=pl_data["img"]
+    previo=mem.recordado("anotado",clave)
+    if previo and previo[0]==firma and previo[1] is img: return previo[2]
+    if not pl_data["data"] and isinstance(img,ImagenPlano): png=img.datos()   # sin puntos: el PNG tal cual
+    else:
+        with etapa("dibujar_puntos"): anotado=dibujar_puntos(img,pl_data["data"]) if pl_data["data"] else img
+        with etapa("codificar_plano"): buf=io.BytesIO(); anotado.save(buf,format="PNG"); png=buf.getvalue()
+    mem.recordar("anotado",clave,(firma,img,png),len(png))    # cuenta contra el presupuesto de la sesión
+    return png
+
+@st.fragment
+def panel_plano(pnombre,pl_nombre):
+    """Plano anotado + captura de clics. Se re-ejecuta solo al hacer clic. Los clics
+    marcan puntos, los dos extremos de la calibración o los vértices del recinto."""
+    from streamlit_image_coordinates import streamlit_image_coordinates
+    pl_data=st.session_state.proyectos[pnombre]["planos"][pl_nombre]; plano_img=pl_data["img"]
+    kp=f"{pnombre}_{pl_nombre}"
+    modo=st.radio("Clic sobre el plano",["📍 Puntos","📏 Calibrar escala","⬛ Recinto"],horizontal=True,
+                  key=f"modo_plano_{kp}",label_visibility="collapsed")
+    if modo.startswith("📍"):
+        st.image(plano_anotado(pnombre,pl_nombre,pl_data),
+                 caption="Haz clic sobre el plano para agregar un punto",use_container_width=True)
+        clicked=streamlit_image_coordinates(pil(plano_img),key=f"clicker_{pnombre}_{pl_nombre}",
+                                            height=plano_img.height,width=plano_img.width)
+        if clicked is not None:
+            xn=clicked["x"]/plano_img.width; yn=clicked["y"]/plano_img.height
+            if not any(abs(px-xn)<0.01 and abs(py-yn)<0.01 for px,py in pl_data["puntos"]):
+                # Punto nuevo: cambia la lista de editores, se re-ejecuta toda la página
+                pl_data["puntos"].append((xn,yn)); guardar_proyectos(st.session_state.proyectos); st.rerun()
+    else: editor_trazo(pl_data,plano_img,kp,calibrar=modo.startswith("📏"))
+    panel_geometria(pl_data,plano_img,kp)
+
+def editor_trazo(pl_data,plano_img,kp,calibrar):
+    """Clics de calibración (dos puntos y la distancia real) o vértices del recinto."""
+    from streamlit_image_coordinates import streamlit_image_coordinates
+    from PIL import ImageDraw
+    clave=f"trazo_{kp}"; tipo="escala" if calibrar else "recinto"
+    trazo=st.session_state.get(clave)
+    if not trazo or trazo["tipo"]!=tipo: trazo=st.session_state[clave]={"tipo":tipo,"puntos":[],"ultimo":None}
+    vista=pil(plano_img).convert("RGB"); dib=ImageDraw.Draw(vista)
+    w,h=vista.size; r=max(4,min(w,h)//150)
+    guardado=[] if calibrar else [(x*w,y*h) for x,y in pl_data.get("recinto",[])]
+    if len(guardado)>=3: dib.polygon(guardado,outline="#1a3a5c",width=max(2,r//2))
+    xy=[(x*w,y*h) for x,y in trazo["puntos"]]
+    if len(xy)>1: dib.line(xy+([xy[0]] if not calibrar and len(xy)>2 else []),fill="#e74c3c",width=max(2,r//2))
+    for x,y in xy: dib.ellipse((x-r,y-r,x+r,y+r),fill="#e74c3c")
+    clicked=streamlit_image_coordinates(vista,key=f"clicker_{tipo}_{kp}",height=h,width=w)
+    if clicked is not None and (clicked["x"],clicked["y"])!=trazo["ultimo"]:
+        trazo["ultimo"]=(clicked["x"],clicked["y"])
+        if calibrar and len(trazo["puntos"])==2: trazo["puntos"]=[]
+        trazo["puntos"].append((clicked["x"]/w,clicked["y"]/h)); st.rerun(scope="fragment")
+    pts=trazo["puntos"]
+    if calibrar:
+        st.caption("Haz clic en los dos extremos de una medida conocida (una pared, una puerta...).")
+        if len(pts)==2:
+            c1,c2=st.columns([2,1])
+            with c1: metros=st.number_input("Distancia real entre los dos puntos (m)",min_value=0.01,value=1.0,
+                                            step=0.1,key=f"cal_m_{kp}")
+            with c2:
+                if st.button("💾 Guardar escala",key=f"cal_ok_{kp}",use_container_width=True):
+                    pl_data["escala"]=calibracion(pts[0],pts[1],metros); trazo["puntos"]=[]
+                    guardar_proyectos(st.session_state.proyectos); st.rerun()
+        return
+    st.caption(f"Haz clic en los vértices del recinto, en orden ({len(pts)} marcados). "
+               "Sin recinto se toma el plano completo.")
+    c1,c2,c3=st.columns(3)
+    with c1:
+        if st.button("💾 Guardar recinto",key=f"rec_ok_{kp}",disabled=len(pts)<3,use_container_width=True):
+            pl_data["recinto"]=[list(p) for p in pts]; trazo["puntos"]=[]
+            guardar_proyectos(st.session_state.proyectos); st.rerun()
+    with c2:
+        if st.button("↩️ Deshacer",key=f"rec_undo_{kp}",disabled=not pts,use_container_width=True):
+            pts.pop(); st.rerun(scope="fragment")
+    with c3:
+        if st.button("🗑️ Quitar recinto",key=f"rec_del_{kp}",disabled=not pl_data.get("recinto"),
+                     use_container_width=True):
+            pl_data.pop("recinto",None); guardar_proyectos(st.session_state.proyectos); st.rerun()
+
+def panel_geometria(pl_data,plano_img,kp):
+    """Distancias reales del plano calibrado: separación de la malla y cobertura por punto."""
+    geo=resumen_geometria(pl_data,plano_img.width,plano_img.height)
+    if geo is None:
+        st.caption("📏 Calibra la escala del plano para ver distancias reales y la malla recomendada."); return
+    m_px=metros_por_px(pl_data["escala"],plano_img.width,plano_img.height)
+    g1,g2,g3,g4=st.columns(4)
+    g1.metric("Recinto",f"{geo.area:g} m²",help=f"{geo.largo:g} × {geo.ancho:g} m")
+    g2.metric("Puntos / recomendados",f"{geo.puntos} / {geo.recomendados}")
+    g3.metric("Separación máx.",f"{geo.separacion_max:g} m",f"p ≤ {geo.p_maxima:g} m",
+              delta_color="off" if geo.separacion_max<=geo.p_maxima else "inverse")
+    g4.metric("Área por punto",f"{geo.cobertura_media:g} m²",f"máx. {geo.cobertura_max:g} m²",delta_color="off")
+    st.caption(f"Escala: 1 px = {m_px*100:.2f} cm · plano de {plano_img.width*m_px:.1f} × {plano_img.height*m_px:.1f} m · "
+               f"malla {'✅ suficiente' if geo.cumple else '⚠️ insuficiente'} (p = 0.2·5^log10(d))")
+    if not pl_data["puntos"]:
+        malla=malla_plano(pl_data,plano_img.width,plano_img.height)
+        if st.button(f"➕ Agregar malla recomendada ({len(malla)} puntos)",key=f"malla_{kp}"):
+            pl_data["puntos"].extend(malla); guardar_proyectos(st.session_state.proyectos); st.rerun()
+
+@st.fragment
+def panel_mediciones(pnombre,pl_nombre):
+    """Editores de punto + resumen. Escribir una lectura re-ejecuta solo este panel;
+    la página completa (plano incluido) solo cuando cambia el color de algún marcador."""
+    pdata=st.session_state.proyectos[pnombre]; pl_data=pdata["planos"][pl_nombre]
+    plano_img=pl_data.get("img"); sin_plano=pl_data.get("sin_plano",plano_img is None)
+    marcadores=firma_marcadores(pl_data)
     st.subheader("📊 Mediciones por punto")
-    TIPOS=list(RETILAP_REFERENCIA.keys())
-    ILUM=["Natural","Artificial","Mixta"]
-    LAMP=["LED","Fluorescente","Incandescente","Halógeno","Otro"]
-    UBIC=["Localizado","Lateral","Frontal","Trasera","Cenital","SIA"]
-
-    for i,(xn,yn) in enumerate(pl_data["puntos"]):
-        if plano_img and not sin_plano:
-            x=int(xn*plano_img.width); y=int(yn*plano_img.height)
-            coord_txt=f"({x}, {y})"
-        else:
-            coord_txt=""
-        ex=next((d for d in pl_data["data"] if d["Número"]==i+1),{})
-        r_actual=ex.get("Resultado","")
-        icono="✅" if "✅" in r_actual else("❌" if "❌" in r_actual else "⏳")
-
-        with st.expander(f"{icono} Punto {i+1}  {coord_txt}",expanded=False):
-            if st.button(f"🗑️ Eliminar punto {i+1}",key=f"delpt_{pnombre}_{pl_nombre}_{i}"):
-                pl_data["puntos"].pop(i)
-                pl_data["data"]=[d for d in pl_data["data"] if d["Número"]!=i+1]
-                for d in pl_data["data"]:
-                    if d["Número"]>i+1: d["Número"]-=1
-                guardar_proyectos(st.session_state.proyectos); st.rerun()
-
-            ta_g=ex.get("TipoArea",TIPOS[0])
-            # Búsqueda rápida RETILAP
-            busq=st.text_input("🔍 Buscar área RETILAP",value="",
-                placeholder="Escribe p.ej: oficina, taller, educación...",
-                key=f"busq_{pnombre}_{pl_nombre}_{i}")
-            tipos_filtrados=[t for t in TIPOS if busq.lower() in t.lower()] if busq else TIPOS
-            if not tipos_filtrados:
-                st.caption("⚠️ Sin resultados — mostrando todas")
-                tipos_filtrados=TIPOS
-            idx_def=tipos_filtrados.index(ta_g) if ta_g in tipos_filtrados else 0
-            tipo_area=st.selectbox("🏷️ Tipo de área RETILAP",tipos_filtrados,
-                index=idx_def,
-                key=f"ta_{pnombre}_{pl_nombre}_{i}")
-            em_req=RETILAP_REFERENCIA[tipo_area]["Em"]
-            uo_min=RETILAP_REFERENCIA[tipo_area]["Uo"]
-            st.markdown(f'<div class="em-box">⚡ Em requerida: <strong>{em_req} lx</strong>'
-                        f'&nbsp;·&nbsp; Uo mínima: <strong>{uo_min}</strong></div>',
-                        unsafe_allow_html=True)
-
-            c1,c2,c3,c4=st.columns(4)
-            with c1: med1=st.number_input("Lux 1",min_value=0.0,step=1.0,value=float(ex.get("Med1",0)),key=f"m1_{pnombre}_{pl_nombre}_{i}")
-            with c2: med2=st.number_input("Lux 2",min_value=0.0,step=1.0,value=float(ex.get("Med2",0)),key=f"m2_{pnombre}_{pl_nombre}_{i}")
-            with c3: med3=st.number_input("Lux 3",min_value=0.0,step=1.0,value=float(ex.get("Med3",0)),key=f"m3_{pnombre}_{pl_nombre}_{i}")
-            with c4: med4=st.number_input("Lux 4",min_value=0.0,step=1.0,value=float(ex.get("Med4",0)),key=f"m4_{pnombre}_{pl_nombre}_{i}")
-
-            ca,cb,cc=st.columns(3)
-            with ca:
-                ti_v=ex.get("TipoIluminacion","Artificial")
-                tipo_ilum=st.selectbox("Tipo iluminación",ILUM,
-                    index=ILUM.index(ti_v) if ti_v in ILUM else 1,key=f"ilum_{pnombre}_{pl_nombre}_{i}")
-            with cb:
-                tl_v=ex.get("TipoLampara","LED")
-                tipo_lamp=st.selectbox("Tipo lámpara",LAMP,
-                    index=LAMP.index(tl_v) if tl_v in LAMP else 0,key=f"lamp_{pnombre}_{pl_nombre}_{i}")
-            with cc:
-                ul_v=ex.get("UbicacionLuminaria","Lateral")
-                ubic_lum=st.selectbox("Ubicación luminaria",UBIC,
-                    index=UBIC.index(ul_v) if ul_v in UBIC else 0,key=f"ubic_{pnombre}_{pl_nombre}_{i}")
-
-            puesto=st.text_input("🪑 Puesto de trabajo / Área evaluada",
-                value=ex.get("PuestoEvaluado",""),
-                placeholder="Ej: Escritorio contador, Línea de ensamble 3...",
-                key=f"puesto_{pnombre}_{pl_nombre}_{i}")
-
-            cd,ce2=st.columns(2)
-            with cd:
-                cl_v=ex.get("ControlLuzNatural","N/A")
-                ctrl_luz=st.selectbox("Control Luz Natural",CONTROL_LUZ,
-                    index=CONTROL_LUZ.index(cl_v) if cl_v in CONTROL_LUZ else 0,key=f"ctrl_{pnombre}_{pl_nombre}_{i}")
-            with ce2:
-                altura=st.text_input("Altura Luminaria (m)",value=str(ex.get("AlturaLuminaria","")),
-                    key=f"alt_{pnombre}_{pl_nombre}_{i}")
-
-            st.markdown("**📷 Foto del punto**")
-            foto_bytes=cargar_foto_punto(pl_data,i+1)
-            cf1,cf2=st.columns([1,2])
-            with cf1:
-                if foto_bytes: st.image(foto_bytes,caption=f"Foto {i+1}",width=140)
-            with cf2:
-                foto_up=st.file_uploader("Subir / cambiar foto",type=["jpg","jpeg","png"],
-                    key=f"foto_{pnombre}_{pl_nombre}_{i}")
-                if foto_up:
-                    pl_data["fotos"][i+1]=foto_up.read()
-                    guardar_proyectos(st.session_state.proyectos); st.success("✅ Foto guardada"); st.rerun()
-
-            nota=st.text_area("Observaciones",height=60,value=ex.get("Nota",""),key=f"nota_{pnombre}_{pl_nombre}_{i}")
-            recom=st.text_area("Recomendaciones",height=60,value=ex.get("Recomendacion",""),key=f"recom_{pnombre}_{pl_nombre}_{i}")
-
-            if all(v>0 for v in[med1,med2,med3,med4]):
-                vals=[med1,med2,med3,med4]
-                promedio=round(sum(vals)/4,1)
-                e_min=round(min(vals),1); e_max=round(max(vals),1); e_medio=round(sum(vals)/len(vals),1)
-                uo_calc=round(e_min/e_medio,2) if e_medio>0 else 0
-                interp_uo="U" if uo_calc>=uo_min else "NU"
-                conforme=promedio>=em_req
-                resultado="✅ Conforme" if conforme else "❌ No conforme"
-                color_res="green" if conforme else "red"
-                if conforme:
-                    st.success(f"Promedio: **{promedio} lx** — Uo: **{uo_calc}** — ✅ ADECUADO")
-                else:
-                    st.error(f"Promedio: **{promedio} lx** (req. ≥{em_req} lx) — Uo: **{uo_calc}** — ❌ DEFICIENTE")
-                entrada={
-                    "Número":i+1,"Coordenadas":f"({xn:.6f}, {yn:.6f})",
-                    "TipoArea":tipo_area,"Em_req":em_req,"Uo_min":uo_min,
-                    "Med1":med1,"Med2":med2,"Med3":med3,"Med4":med4,
-                    "EMin":e_min,"EMax":e_max,"EMedio":e_medio,
-                    "Promedio":promedio,"Uo_calc":uo_calc,"InterpretacionUo":interp_uo,
-                    "Resultado":resultado,"Color":color_res,
-                    "TipoIluminacion":tipo_ilum,"TipoLampara":tipo_lamp,
-                    "PuestoEvaluado":puesto,"UbicacionLuminaria":ubic_lum,"ControlLuzNatural":ctrl_luz,
-                    "AlturaLuminaria":altura,"Nota":nota.strip(),"Recomendacion":recom.strip(),
-                    "Foto":foto_bytes is not None,
-                }
-                idx_ex=next((j for j,d in enumerate(pl_data["data"]) if d["Número"]==i+1),None)
-                if idx_ex is not None: pl_data["data"][idx_ex]=entrada
-                else: pl_data["data"].append(entrada)
-                guardar_proyectos(st.session_state.proyectos)
+    kp=f"{pnombre}_{pl_nombre}"
+    modo=st.radio("Vista",["📄 Por páginas","🎯 Un punto","📋 Tabla (edición masiva)"],
+                  horizontal=True,key=f"modo_{kp}",label_visibility="collapsed")
+    n_total=len(pl_data["puntos"])
+    por_num={d["Número"]:d for d in pl_data["data"]}
+
+    if modo.startswith("📋"):
+        editor_tabla_puntos(pnombre,pl_nombre,pl_data,plano_img,sin_plano,por_num)
+    elif modo.startswith("🎯"):
+        if st.session_state.get(f"sel_pt_{kp}",1)>n_total: st.session_state[f"sel_pt_{kp}"]=n_total
+        num=st.number_input("N° de punto",min_value=1,max_value=n_total,step=1,key=f"sel_pt_{kp}")
+        editor_punto(pnombre,pl_nombre,int(num)-1,expandido=True)
+    else:
+        cf1,cf2,cf3,cf4=st.columns([2,3,1,1])
+        with cf1: estados=st.multiselect("Estado",["⏳","✅","❌"],key=f"f_est_{kp}")
+        with cf2:
+            usadas=sorted({d.get("TipoArea","") for d in pl_data["data"]}-{""})
+            area=st.selectbox("Tipo de área",["Todas"]+usadas,key=f"f_area_{kp}")
+        with cf3: desde=int(st.number_input("Desde N°",min_value=1,step=1,key=f"f_desde_{kp}"))
+        with cf4: hasta=int(st.number_input("Hasta N°",min_value=0,step=1,key=f"f_hasta_{kp}",
+                                            help="0 = hasta el último punto")) or n_total
+        visibles=[i for i in range(n_total)
+                  if desde<=i+1<=hasta
+                  and (not estados or estado_punto(por_num.get(i+1)) in estados)
+                  and (area=="Todas" or por_num.get(i+1,{}).get("TipoArea")==area)]
+        cp1,cp2,cp3=st.columns([2,2,3])
+        with cp1: tam=st.selectbox("Puntos por página",PUNTOS_POR_PAGINA,key=f"tam_{kp}")
+        n_pag=max(1,-(-len(visibles)//tam))
+        if st.session_state.get(f"pag_{kp}",1)>n_pag: st.session_state[f"pag_{kp}"]=n_pag
+        with cp2: pag=int(st.number_input("Página",min_value=1,max_value=n_pag,step=1,key=f"pag_{kp}"))
+        with cp3: st.caption(f"{len(visibles)} de {n_total} puntos · página {pag} de {n_pag}")
+        for i in visibles[(pag-1)*tam:pag*tam]:
+            editor_punto(pnombre,pl_nombre,i)
 
     st.divider()
+    st.fragment(panel_resumen,key=f"resumen_{kp}")(pnombre,pl_nombre)
+    if not sin_plano and plano_img is not None and firma_marcadores(pl_data)!=marcadores:
+        st.rerun()
+
+def panel_resumen(pnombre,pl_nombre):
+    """Resumen del plano en su fragmento: lo re-ejecuta un punto cuyo resultado cambió."""
+    pdata=st.session_state.proyectos[pnombre]
+    panel_resultados(pdata["planos"][pl_nombre],pl_nombre,pdata["general"].get("flujo_luminaria"))
+
+def panel_resultados(pl_data,pl_nombre,flujo=None):
+    """Gráfica de conformidad, tabla de resultados y estadísticas por área del plano."""
+    import pandas as pd
     if pl_data["data"]:
         col_graf,col_tab=st.columns([1,2])
         with col_graf:
@@ -1015,24 +1247,218 @@ def pagina_editar_plano():
         with col_tab:
             st.subheader("📋 Resultados")
             df=pd.DataFrame(pl_data["data"])
-            cols=["Número","TipoArea","Em_req","Med1","Med2","Med3","Med4",
-                  "EMin","EMax","EMedio","Promedio","Uo_calc","InterpretacionUo","Resultado"]
-            cex=[c for c in cols if c in df.columns]
+            cex=[c for c in COLUMNAS_RESULTADOS if c in df.columns]
             st.dataframe(df[cex].rename(columns={
                 "Número":"N°","TipoArea":"Área","Em_req":"Em req.",
                 "EMin":"E Min","EMax":"E Max","EMedio":"E Medio",
                 "Uo_calc":"Uo","InterpretacionUo":"Interp. Uo"}),
                 use_container_width=True)
+        with st.expander("📐 Estadísticas por tipo de área"):
+            est=estadisticas_planos([pl_data],flujo)
+            st.dataframe(est.filas(),use_container_width=True,hide_index=True)
+            if est.total.luminarias is not None:
+                st.caption("Percentiles sobre el promedio de cada punto. Luminarias adicionales: método de los "
+                           f"lúmenes N = (Em−Ē)·A/(Φ·CU·MF) con Φ = {flujo:g} lm, CU = {CU:g}, MF = {MANTENIMIENTO:g} "
+                           "y A el área del recinto que cubren los puntos de cada tipo.")
+            else:
+                st.caption("Percentiles sobre el promedio de cada punto. Para estimar luminarias adicionales "
+                           "calibra la escala del plano e indica el flujo de la luminaria en los datos del proyecto.")
+        plano_img=pl_data.get("img")
+        if not pl_data.get("sin_plano",plano_img is None) and plano_img is not None \
+                and any(estado_punto(d)=="❌" for d in pl_data["data"]):
+            panel_simulacion(pl_data,pl_nombre,plano_img)
+
+def panel_simulacion(pl_data,pl_nombre,plano_img):
+    """Simulador de reacondicionamiento: luminarias mínimas para los puntos deficientes."""
+    import pandas as pd
+    from simulacion import Simulacion, Luminaria, MANTENIMIENTO
+    with st.expander("🔧 Simulador de reacondicionamiento"):
+        m_px=metros_por_px(pl_data.get("escala"),plano_img.width,plano_img.height)
+        with st.form(f"sim_{pl_nombre}"):
+            c1,c2,c3,c4=st.columns(4)
+            with c1: ancho=st.number_input("Ancho real del plano (m)",min_value=1.0,step=1.0,
+                                           value=max(1.0,round(plano_img.width*m_px,2)) if m_px else 20.0,
+                                           help="Tomado de la escala calibrada" if m_px else "Plano sin calibrar")
+            with c2: flujo=st.number_input("Flujo por luminaria (lm)",min_value=100.0,value=4000.0,step=100.0)
+            with c3: mf=st.number_input("Factor de mantenimiento",min_value=0.3,max_value=1.0,value=MANTENIMIENTO,step=0.05)
+            with c4: altura=st.number_input("Altura de montaje (m)",min_value=0.0,value=0.0,step=0.1,
+                                            help="0 = la altura de luminaria registrada en cada punto")
+            if not st.form_submit_button("🔧 Proponer luminarias",use_container_width=True): return
+        data=pl_data["data"]
+        sim=Simulacion(data,ancho,plano_img.width,plano_img.height,Luminaria(flujo,mf,altura))
+        prop=sim.proponer()
+        antes=int((sim.base>=sim.em).sum())
+        m1,m2,m3=st.columns(3)
+        m1.metric("Luminarias a agregar",len(prop.luminarias))
+        m2.metric("Puntos conformes",prop.conformes,prop.conformes-antes)
+        m3.metric("Siguen deficientes",prop.deficientes)
+        if prop.luminarias:
+            st.dataframe(pd.DataFrame([{"Sobre el punto N°":sim.numeros[j],"X (m)":round(sim.xy[j,0],2),
+                                        "Y (m)":round(sim.xy[j,1],2)} for j in prop.luminarias]),
+                         use_container_width=True,hide_index=True)
+        defic=[k for k in range(len(data)) if sim.base[k]<sim.em[k]]
+        st.dataframe(pd.DataFrame([{"N°":sim.numeros[k],"Em req. (lx)":sim.em[k],"Medido (lx)":sim.base[k],
+                                    "Estimado (lx)":round(float(prop.iluminancia[k]),1),
+                                    "Cumple":"✅" if prop.iluminancia[k]>=sim.em[k] else "❌"} for k in defic]),
+                     use_container_width=True,hide_index=True)
+        st.caption("Fuente puntual con distribución coseno sobre el plano de trabajo (0.8 m); las luminarias "
+                   "candidatas se ubican sobre cada punto medido. Es una estimación, no un cálculo fotométrico.")
+
+@st.cache_resource
+def dataset_analitico():
+    # Un único dataset por proceso, compartido por todas las sesiones
+    from analitica import DatasetAnalitico
+    return DatasetAnalitico(PROYECTOS_DIR)
+
+def pagina_analitica():
+    from analitica import DIMENSIONES, filtrar, agregar
+    st.markdown('<div class="main-header"><span style="font-size:2rem">📈</span>'
+                '<div><h1>Analítica consolidada</h1><p>Todas las auditorías de todos los dispositivos</p></div></div>',
+                unsafe_allow_html=True)
+    if st.button("← Volver",key="volver_an"): st.session_state.pagina="inicio"; st.rerun()
+    ds=dataset_analitico(); ds.refrescar(); df=ds.df
+    if df.empty:
+        st.info("ℹ️ Aún no hay mediciones registradas."); return
+    fechas=df["fecha"].dropna()
+    c1,c2,c3=st.columns([2,2,2])
+    with c1:
+        rango=(st.date_input("Periodo",value=(fechas.min().date(),fechas.max().date()),key="an_rango")
+               if len(fechas) else ())
+    with c2: arls=st.multiselect("ARL",sorted(df["arl"].cat.categories),key="an_arl")
+    with c3: ciudades=st.multiselect("Ciudad",sorted(df["ciudad"].cat.categories),key="an_ciudad")
+    desde,hasta=(rango if len(rango)==2 else (None,None))
+    dff=filtrar(df,desde,hasta,arls,ciudades)
+    tot=len(dff); n_def=int((~dff["conforme"]).sum())
+    deficit_medio=dff.loc[~dff["conforme"],"deficit"].mean() if n_def else 0
+    m1,m2,m3,m4=st.columns(4)
+    with m1: st.metric("Mediciones",tot)
+    with m2: st.metric("Proyectos",dff["proyecto"].nunique())
+    with m3: st.metric("% Deficientes",f"{round(n_def/tot*100,1) if tot else 0}%")
+    with m4: st.metric("Déficit medio",f"{round(float(deficit_medio),1)} lx")
+    dim=st.selectbox("Agrupar por",list(DIMENSIONES),key="an_dim")
+    col=DIMENSIONES[dim]
+    res=agregar(dff,col).rename(columns={col:dim})
+    if not res.empty:
+        st.bar_chart(res.head(15).set_index(dim)["% Deficientes"],horizontal=True)
+    st.dataframe(res,use_container_width=True,hide_index=True)
+
+@st.cache_resource
+def catalogo_proyectos():
+    return CatalogoProyectos(PROYECTOS_DIR)
+
+def pagina_catalogo():
+    import pandas as pd
+    st.markdown('<div class="main-header"><span style="font-size:2rem">🗂️</span>'
+                '<div><h1>Catálogo de proyectos</h1><p>Trabajo de todos los técnicos y dispositivos</p></div></div>',
+                unsafe_allow_html=True)
+    if st.button("← Volver",key="volver_cat"): st.session_state.pagina="inicio"; st.rerun()
+    cat=catalogo_proyectos(); cat.refrescar()
+    c1,c2,c3=st.columns(3)
+    with c1:
+        texto=st.text_input("🔍 Buscar",key="cat_txt",placeholder="Empresa, NIT, OT, sede, higienista...")
+        empresa=st.text_input("Empresa",key="cat_emp")
+    with c2:
+        nit=st.text_input("NIT",key="cat_nit"); orden=st.text_input("N° Orden",key="cat_ot")
+    with c3:
+        arls=st.multiselect("ARL",ARLS,key="cat_arl")
+        disp=st.multiselect("Dispositivo",cat.dispositivos(),key="cat_disp")
+    cd1,cd2=st.columns(2)
+    with cd1: desde=st.date_input("Desde",value=None,key="cat_desde")
+    with cd2: hasta=st.date_input("Hasta",value=None,key="cat_hasta")
+    res=cat.buscar(texto,empresa,nit,orden,arls,disp,desde,hasta)
+    st.caption(f"{len(res)} proyecto{'s' if len(res)!=1 else ''}")
+    if not res: return
+    df=pd.DataFrame(res)[["dispositivo","empresa","nit","numero_orden","arl","sede","fecha","planos","puntos","conformes"]]
+    st.dataframe(df.rename(columns={"dispositivo":"Dispositivo","empresa":"Empresa","nit":"NIT",
+        "numero_orden":"OT","arl":"ARL","sede":"Ciudad","fecha":"Fecha","planos":"Planos",
+        "puntos":"Puntos","conformes":"Adecuados"}),use_container_width=True,hide_index=True)
+    opciones={f"{e['empresa']} · {e['numero_orden']} · {e['fecha']} [{e['dispositivo']}]":e for e in res[:500]}
+    sel=st.selectbox("Proyecto",list(opciones),key="cat_sel")
+    e=opciones[sel]; clave_sel=(e["dispositivo"],e["nombre"])
+    ca,cb=st.columns(2)
+    with ca:
+        if st.button("👁️ Ver resumen",key="cat_ver",use_container_width=True):
+            crudo=cat.cargar_proyecto(*clave_sel)
+            if crudo is None: st.error("❌ El proyecto ya no existe")
+            else:
+                # conteos del JSON crudo, sin decodificar planos ni fotos; el resumen queda en
+                # la sesión para que no desaparezca en el siguiente rerun
+                st.session_state.cat_resumen={"clave":clave_sel,"planos":[
+                    (pln,len(pi.get("data",[])),sum(1 for d in pi.get("data",[]) if "✅" in str(d.get("Resultado",""))))
+                    for pln,pi in crudo.get("planos",{}).items()]}
+        resumen=st.session_state.get("cat_resumen")
+        if resumen and resumen["clave"]==clave_sel:
+            for pln,n_pts,n_conf in resumen["planos"]:
+                st.write(f"📄 **{pln}** — {n_pts} puntos ({n_conf} adecuados)")
+            if any(n_pts for _,n_pts,_ in resumen["planos"]):
+                # el CSV se arma al descargarlo
+                st.download_button("📊 CSV",data=lambda: generar_reporte_csv(
+                        cat.cargar_proyecto(*clave_sel) or {"planos":{}},clave_sel[1]) or b"",
+                    file_name=f"RETILAP_{e['nombre'][:18].replace(' ','_')}.csv",
+                    mime="text/csv;charset=utf-8",key="cat_csv")
+    with cb:
+        if st.button("✏️ Abrir en su dispositivo",key="cat_abrir",use_container_width=True):
+            abrir_proyecto(e["dispositivo"],e["nombre"])
+
+# ============================================================================
+# DIAGNÓSTICO (?diag=1) — tiempos por etapa de cada rerun y perfil a pedido
+# ============================================================================
+def panel_diagnostico():
+    hist=st.session_state.get("_diagnostico",[])
+    with st.sidebar.expander("🩺 Diagnóstico",expanded=True):
+        if not hist: st.caption("Sin reruns registrados.")
+        else:
+            r=hist[-1]
+            st.caption(f"Último rerun · {r.pagina} · {r.total*1000:.0f} ms")
+            st.dataframe(filas_diagnostico(r),hide_index=True,use_container_width=True)
+            st.caption("Reruns recientes (ms)")
+            st.bar_chart({"ms":[round(h.total*1000) for h in hist]},height=140)
+        if st.button("🔬 Perfilar el próximo rerun",key="diag_perfil",use_container_width=True):
+            st.query_params["perfil"]="1"; st.rerun()
+        perf=next((h for h in reversed(hist) if h.perfil),None)
+        if perf:
+            st.caption(f"Perfil · {perf.pagina} · {datetime.fromtimestamp(perf.inicio).strftime('%H:%M:%S')}")
+            st.code(perf.perfil,language=None)
+    with st.sidebar.expander("🧠 Memoria del proceso"):
+        st.caption(f"RSS: {memoria_proceso()/2**20:,.0f} MB · recursos compartidos: {bytes_recursos()/2**20:,.1f} MB")
+        st.dataframe(inventario_recursos(),hide_index=True,use_container_width=True)
+    with st.sidebar.expander("🗂️ Memoria de esta sesión"):
+        u=memoria_sesion().uso()
+        filas=[{"Parte":"Proyectos (metadatos y referencias)","MB":tamano(st.session_state.get("proyectos",{}))},
+               {"Parte":"Planos decodificados (LRU)","MB":u["imagenes_bytes"]},
+               {"Parte":"Fotos (LRU)","MB":u["fotos_bytes"]},
+               {"Parte":"Planos anotados en pantalla (LRU)","MB":u["anotados_bytes"]},
+               {"Parte":"Planos preparados para informes (LRU)","MB":u["preparados_bytes"]}]
+        for f in filas: f["MB"]=round(f["MB"]/2**20,2)
+        st.dataframe(filas,hide_index=True,use_container_width=True)
+        st.caption(f"LRU: {u['usados']/2**20:,.1f} de {u['presupuesto']/2**20:,.0f} MB · "
+                   f"{u['entradas']} entradas · aciertos {u['aciertos']} / fallos {u['fallos']} · "
+                   f"desalojos {u['desalojos']}")
 
 def main():
     st.set_page_config(page_title="LuxOMeter PRO · RETILAP",page_icon="💡",
                        layout="wide",initial_sidebar_state="collapsed")
-    aplicar_estilos(); inicializar_session_state()
-    pagina=st.session_state.pagina
-    if   pagina=="inicio":          pagina_inicio()
-    elif pagina=="nuevo_proyecto":  pagina_nuevo_proyecto()
-    elif pagina=="editar_proyecto": pagina_editar_proyecto()
-    elif pagina=="editar_plano":    pagina_editar_plano()
+    diag=DIAGNOSTICO_GLOBAL or st.query_params.get("diag")=="1"
+    perfilar=diag and st.query_params.get("perfil")=="1"
+    if diag: r=iniciar_diagnostico(st.session_state.get("pagina","inicio"),get_device_id(),perfilar)
+    try:
+        with etapa("inicializar"): aplicar_estilos(); inicializar_session_state()
+        pagina=st.session_state.pagina
+        if diag: r.pagina=pagina
+        with etapa("aplicar_trabajos"): aplicar_trabajos()
+        with etapa(f"pagina_{pagina}"):
+            if   pagina=="inicio":          pagina_inicio()
+            elif pagina=="nuevo_proyecto":  pagina_nuevo_proyecto()
+            elif pagina=="editar_proyecto": pagina_editar_proyecto()
+            elif pagina=="editar_plano":    pagina_editar_plano()
+            elif pagina=="analitica":       pagina_analitica()
+            elif pagina=="catalogo":        pagina_catalogo()
+    finally:
+        if diag:
+            terminar_diagnostico(st.session_state.setdefault("_diagnostico",[]))
+            if perfilar: del st.query_params["perfil"]   # el perfil es de un solo rerun
+    if diag: panel_diagnostico()
+    precargar()
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,68 @@
+"""
+generadores.py  —  LuxOMeter PRO / RETILAP 2024
+Proyectos sintéticos para los benchmarks: N planos × M puntos × F fotos,
+con planos dibujados (líneas y recintos, como un PDF convertido a 200 dpi)
+y fotos JPEG. Con la misma semilla se obtiene siempre el mismo proyecto.
+"""
+import io
+import random
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from mediciones import calcular_medicion
+from retilap import REFERENCIA
+
+TAM_PLANO = (2400, 1700)
+TAM_FOTO = (1600, 1200)
+
+# nombre -> (planos, puntos por plano, fotos por plano)
+ESCENARIOS = {
+    "pequeno": (2, 20, 5),
+    "mediano": (5, 100, 20),
+    "grande":  (15, 300, 40),
+}
+
+
+def plano_sintetico(rng, tam=TAM_PLANO):
+    img = Image.new("RGB", tam, "white"); d = ImageDraw.Draw(img)
+    w, h = tam
+    for _ in range(120):
+        x, y = rng.randrange(w), rng.randrange(h)
+        d.rectangle([x, y, x + rng.randint(50, 400), y + rng.randint(50, 300)], outline=(40, 40, 40), width=3)
+    for _ in range(40):
+        d.line([(rng.randrange(w), rng.randrange(h)), (rng.randrange(w), rng.randrange(h))], fill=(90, 90, 90), width=2)
+    return img
+
+
+def foto_sintetica(rng, tam=TAM_FOTO):
+    """JPEG con contenido de foto (ruido de color suavizado), en bytes."""
+    canales = [Image.effect_noise((tam[0] // 4, tam[1] // 4), rng.randint(30, 80)) for _ in range(3)]
+    img = Image.merge("RGB", canales).resize(tam).filter(ImageFilter.GaussianBlur(2))
+    buf = io.BytesIO(); img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def proyecto_sintetico(n_planos, n_puntos, n_fotos, arl="Positiva", semilla=0):
+    """Proyecto en memoria (imágenes PIL, fotos en bytes) como lo maneja app.py."""
+    rng = random.Random(semilla)
+    tipos = list(REFERENCIA)
+    planos = {}
+    fotos_base = [foto_sintetica(rng) for _ in range(min(n_fotos, 8))]
+    for i in range(n_planos):
+        puntos, data = [], []
+        for n in range(1, n_puntos + 1):
+            xy = (rng.random(), rng.random()); puntos.append(xy)
+            data.append(calcular_medicion(n, xy[0], xy[1], rng.choice(tipos),
+                [float(rng.randint(60, 900)) for _ in range(4)],
+                {"PuestoEvaluado": f"Puesto {n}", "Nota": rng.choice(["", "Luminaria fundida", "Reflejo en pantalla"]),
+                 "Recomendacion": rng.choice(["", "Cambiar luminaria", "Limpiar difusores"]),
+                 "Foto": n <= n_fotos}))
+        fotos = {n: fotos_base[(n - 1) % len(fotos_base)] for n in range(1, n_fotos + 1)} if fotos_base else {}
+        planos[f"Plano {i + 1}"] = {"puntos": puntos, "data": data, "fotos": fotos,
+                                    "img": plano_sintetico(rng)}
+    general = {"numero_orden": "OT-BENCH", "nombre_empresa": "EMPRESA SINTÉTICA SAS", "nit": "900000000",
+               "direccion": "Calle 1 # 2-3", "sede": "Bogotá", "telefono": "", "fecha": "15/03/2026",
+               "mes_anio": "Marzo de 2026", "responsable_empresa": "Responsable", "responsable_higienista": "Higienista",
+               "resolucion": "0000", "arl": arl,
+               "equipo": {"instrumento": "Luxómetro", "marca": "Marca", "modelo": "M1", "serie": "0001"}}
+    return {"general": general, "planos": planos}
@@ -0,0 +1,305 @@
+"""
+run.py  —  LuxOMeter PRO / RETILAP 2024
+Benchmarks de las rutas críticas: guardar/cargar proyectos, dibujar_puntos,
+gráfica de conformidad, preparación de planos, PDF (en memoria y a archivo) y
+Word (una vez por plantilla de ARL). Mide tiempo de pared, pico de memoria Python (tracemalloc)
+y tamaño de la salida; guarda los resultados en JSON y los compara con una base.
+También verifica el presupuesto de arranque: importar app.py en un proceso
+nuevo no debe pasar de PRESUPUESTO_IMPORTACION_S ni cargar MODULOS_DIFERIDOS.
+
+Uso (desde la raíz del repositorio, sin conexión):
+    python benchmarks/run.py                          # escenarios pequeno y mediano
+    python benchmarks/run.py -e grande -r 1 -o base.json
+    python benchmarks/run.py --base base.json         # compara; código 1 si hay regresión
+    python benchmarks/run.py -e pequeno -t 100,1000,5000   # tabla del PDF con N filas
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ); sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generadores import ESCENARIOS, proyecto_sintetico  # noqa: E402
+
+# Tolerancias de la comparación con la base (fracción de aumento permitida)
+TOLERANCIA = {"tiempo_s": 0.25, "memoria_pico_mb": 0.25, "tamano_bytes": 0.10}
+
+# Arranque: importar app.py (con streamlit ya cargado, como en el servidor)
+PRESUPUESTO_IMPORTACION_S = 0.35
+MODULOS_DIFERIDOS = ("pandas", "docx", "pdf2image", "streamlit_image_coordinates", "matplotlib", "reportlab")
+_SONDA = """
+import json, logging, sys, time
+logging.disable(logging.WARNING)
+sys.path.insert(0, {raiz!r})
+import streamlit
+t = time.perf_counter(); import app; t = time.perf_counter() - t
+print(json.dumps({{"s": t, "cargados": [m for m in {diferidos!r} if m in sys.modules]}}))
+"""
+
+
+# ── Medición ──────────────────────────────────────────────────────────────────
+
+def medir(funcion, repeticiones, preparar=None):
+    """Ejecuta funcion() varias veces; devuelve mediana/mínimo de tiempo, pico de
+    memoria Python y tamaño de la salida (bytes, o el entero que devuelva).
+    tracemalloc hace varias veces más lenta la ejecución, así que la memoria se
+    mide en una corrida aparte que no cuenta para el tiempo."""
+    tiempos, tam = [], None
+    for _ in range(repeticiones):
+        if preparar: preparar()
+        gc.collect()
+        t = time.perf_counter(); salida = funcion(); tiempos.append(time.perf_counter() - t)
+        if salida is not None:
+            tam = salida if isinstance(salida, int) else len(salida)
+    if preparar: preparar()
+    gc.collect(); tracemalloc.start()
+    try: funcion(); pico = tracemalloc.get_traced_memory()[1]
+    finally: tracemalloc.stop()
+    return {"tiempo_s": round(statistics.median(tiempos), 4), "tiempo_min_s": round(min(tiempos), 4),
+            "memoria_pico_mb": round(pico / 2**20, 2), "tamano_bytes": tam}
+
+
+def _app():
+    """Importa app.py como módulo (sin ejecutar main) con el runtime de Streamlit en modo bare."""
+    import logging
+    logging.disable(logging.WARNING)      # avisos de "bare mode" en cada llamada a st.*
+    import app
+    return app
+
+
+def etapas(app, proyecto, directorio):
+    """[(nombre, función, preparar)] de cada etapa sobre un proyecto."""
+    import streamlit as st
+    from imagenes_informe import PreparadorPlanos, dibujar_puntos
+    from generar_word import informe_word
+    from informe_pdf import escribir_pdf
+    from modelo_informe import construir_modelo, grafica_conteos
+    import estadisticas
+    import geometria
+
+    proyectos = {"Benchmark": proyecto}
+    ruta = os.path.join(directorio, app.PROYECTOS_DIR, "proyectos_default.json")
+    planos = proyecto["planos"]
+    filas = [d for pi in planos.values() for d in pi["data"]]
+
+    def guardar():
+        app.guardar_proyectos(proyectos); return os.path.getsize(ruta)
+
+    def dibujar():
+        for pi in planos.values(): dibujar_puntos(pi["img"], pi["data"])
+
+    def graficas():
+        return sum(len(app.grafica_conformidad(pi["data"]) or b"") for pi in planos.values()) \
+            + len(app.grafica_conformidad(filas) or b"")
+
+    def sin_cache_graficas():
+        app._grafica_barras.clear()
+
+    def sin_cache_planos():
+        st.session_state.pop("_preparador_planos", None); grafica_conteos.cache_clear()
+
+    def pdf_archivo():
+        destino = os.path.join(directorio, "informe.pdf")
+        app.construir_reporte_pdf(proyecto, "Benchmark", destino=destino); return os.path.getsize(destino)
+
+    def simular():
+        # Propuesta voraz y 1000 configuraciones aleatorias sobre cada plano
+        from simulacion import Simulacion, Luminaria
+        import numpy as np
+        rng = np.random.default_rng(0)
+        for pi in planos.values():
+            sim = Simulacion(pi["data"], 20.0, pi["img"].width, pi["img"].height, Luminaria(4000))
+            sim.proponer(); sim.conformes(rng.random((1000, len(pi["data"]))) < 0.05)
+
+    def geometria_planos():
+        # Plano calibrado a 30 m de ancho con el recinto completo
+        for pi in planos.values():
+            pl = {**pi, "escala": geometria.calibracion((0, 0), (1, 0), 30.0)}
+            geometria.resumen(pl, pi["img"].width, pi["img"].height)
+
+    def preparar_planos():
+        return sum(len(p.datos) for p in PreparadorPlanos().preparar(planos).values())
+
+    res = [("guardar_proyectos", guardar, None),
+           ("cargar_proyectos", lambda: app.cargar_proyectos() and None, None),
+           ("dibujar_puntos", dibujar, None),
+           ("grafica_conformidad", graficas, sin_cache_graficas),
+           ("preparar_planos", preparar_planos, None),
+           ("simulacion", simular, None),
+           ("geometria", geometria_planos, geometria._resumen.cache_clear),
+           ("estadisticas", lambda: estadisticas.estadisticas_proyecto(proyecto) and None,
+            estadisticas._calcular.cache_clear),
+           ("generar_reporte_pdf", lambda: len(app.construir_reporte_pdf(proyecto, "Benchmark")), sin_cache_planos),
+           ("generar_reporte_pdf[archivo]", pdf_archivo, sin_cache_planos)]
+
+    plantillas = {arl: os.path.join(RAIZ, f) for arl, f in app.PLANTILLAS_ARL.items()}
+    for arl in app.ARLS:
+        def word(arl=arl):
+            modelo = construir_modelo({**proyecto, "general": {**proyecto["general"], "arl": arl}},
+                                      app.preparador_planos())
+            modelo.imagenes(); return informe_word(modelo, plantillas)
+        res.append((f"generar_informe_word[{arl}]", word, sin_cache_planos))
+
+    # Los dos formatos del mismo modelo frente a cada uno por su lado
+    def separados():
+        n = len(app.construir_reporte_pdf(proyecto, "Benchmark")); sin_cache_planos()
+        modelo = construir_modelo(proyecto, app.preparador_planos()); modelo.imagenes()
+        return n + len(informe_word(modelo, plantillas))
+
+    def juntos():
+        modelo = construir_modelo(proyecto, app.preparador_planos()); modelo.imagenes()
+        return len(escribir_pdf(modelo)) + len(informe_word(modelo, plantillas))
+
+    res += [("informe_pdf_word[separados]", separados, sin_cache_planos),
+            ("informe_pdf_word[modelo]", juntos, sin_cache_planos)]
+    return res
+
+
+def importacion(repeticiones, directorio):
+    """Tiempo de importar app.py en procesos nuevos (mediana) y módulos diferidos que se cargaron."""
+    sonda = _SONDA.format(raiz=RAIZ, diferidos=MODULOS_DIFERIDOS)
+    tiempos, cargados = [], set()
+    for _ in range(repeticiones):
+        out = subprocess.run([sys.executable, "-c", sonda], cwd=directorio, capture_output=True,
+                             text=True, timeout=120, env={**os.environ, "LUXOMETER_PRECARGA": "0"})
+        if out.returncode: raise RuntimeError(out.stderr.strip().splitlines()[-1])
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        tiempos.append(r["s"]); cargados.update(r["cargados"])
+    return {"tiempo_s": round(statistics.median(tiempos), 4), "tiempo_min_s": round(min(tiempos), 4),
+            "memoria_pico_mb": None, "tamano_bytes": None, "modulos_diferidos_cargados": sorted(cargados)}
+
+
+def presupuesto(resultados):
+    """Incumplimientos del presupuesto de arranque."""
+    r = resultados.get("arranque/importar_app")
+    if not r: return []
+    fallas = []
+    if r["tiempo_s"] > PRESUPUESTO_IMPORTACION_S:
+        fallas.append(f"importar app.py tomó {r['tiempo_s']:.3f} s (presupuesto {PRESUPUESTO_IMPORTACION_S} s)")
+    if r["modulos_diferidos_cargados"]:
+        fallas.append(f"app.py carga al importarse: {', '.join(r['modulos_diferidos_cargados'])}")
+    return fallas
+
+
+# ── Ejecución ─────────────────────────────────────────────────────────────────
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except Exception: return ""
+
+
+def tabla_pdf(app, filas):
+    """Etapa del PDF de un plano sin imagen con 'filas' puntos: mide solo la tabla RETILAP."""
+    proyecto = proyecto_sintetico(1, filas, 0)
+    for pi in proyecto["planos"].values(): pi["img"] = None
+    return lambda: app.construir_reporte_pdf(proyecto, "Benchmark")
+
+
+def ejecutar(escenarios, repeticiones, filtro="", tablas=()):
+    directorio = tempfile.mkdtemp(prefix="bench_luxometer_")
+    previo = os.getcwd(); os.chdir(directorio)     # dispositivos/ se crea aquí, no en el repo
+    try:
+        resultados = {}
+        if not filtro or filtro in "importar_app":
+            resultados["arranque/importar_app"] = r = importacion(max(repeticiones, 3), directorio)
+            print(f"  {'arranque/importar_app':<45} {r['tiempo_s']:>8.3f} s", flush=True)
+        app = _app()
+        for esc in escenarios:
+            n_planos, n_puntos, n_fotos = ESCENARIOS[esc]
+            proyecto = proyecto_sintetico(n_planos, n_puntos, n_fotos)
+            for nombre, funcion, preparar in etapas(app, proyecto, directorio):
+                if filtro and filtro not in nombre: continue
+                clave = f"{esc}/{nombre}"
+                resultados[clave] = r = medir(funcion, repeticiones, preparar)
+                _linea(clave, r)
+        for n in tablas:
+            clave = f"pdf/tabla_{n}"
+            if filtro and filtro not in clave: continue
+            resultados[clave] = r = medir(tabla_pdf(app, n), repeticiones)
+            _linea(clave, r)
+    finally:
+        os.chdir(previo)
+    return {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": _commit(),
+            "python": platform.python_version(), "plataforma": platform.platform(),
+            "cpus": os.cpu_count(), "repeticiones": repeticiones,
+            "rss_max_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "resultados": resultados}
+
+
+def _linea(clave, r):
+    print(f"  {clave:<45} {r['tiempo_s']:>8.3f} s  {r['memoria_pico_mb']:>8.1f} MB  "
+          f"{_tam(r['tamano_bytes']):>10}", flush=True)
+
+
+def _tam(n):
+    if n is None: return "-"
+    return f"{n / 1024:.0f} KB" if n >= 1024 else str(n)
+
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """Lista de regresiones: (clave, métrica, base, actual, variación)."""
+    regresiones = []
+    for clave, r in actual["resultados"].items():
+        b = base.get("resultados", {}).get(clave)
+        if not b: continue
+        for m, tol in tolerancia.items():
+            va, vb = r.get(m), b.get(m)
+            if not va or not vb: continue
+            var = va / vb - 1
+            marca = "⚠️ " if var > tol else ("✅ " if var < -tol else "   ")
+            print(f"{marca}{clave:<45} {m:<16} {vb:>12.4g} -> {va:>12.4g}  ({var:+.0%})")
+            if var > tol: regresiones.append((clave, m, vb, va, var))
+    return regresiones
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks de LuxOMeter PRO")
+    ap.add_argument("-e", "--escenarios", default="pequeno,mediano",
+                    help=f"separados por coma: {', '.join(ESCENARIOS)}")
+    ap.add_argument("-r", "--repeticiones", type=int, default=3)
+    ap.add_argument("-f", "--filtro", default="", help="solo etapas cuyo nombre contenga este texto")
+    ap.add_argument("-t", "--tablas", default="", help="filas de la tabla del PDF a medir, p. ej. 100,1000,5000")
+    ap.add_argument("-o", "--salida", default="", help="JSON de resultados (por defecto benchmarks/resultados/)")
+    ap.add_argument("-b", "--base", default="", help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args(argv)
+
+    escenarios = [e.strip() for e in args.escenarios.split(",") if e.strip()]
+    for e in escenarios:
+        if e not in ESCENARIOS: ap.error(f"escenario desconocido: {e}")
+    tablas = [int(n) for n in args.tablas.split(",") if n.strip()]
+    res = ejecutar(escenarios, args.repeticiones, args.filtro, tablas)
+
+    salida = args.salida or os.path.join(RAIZ, "benchmarks", "resultados",
+                                         f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f: json.dump(res, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados: {salida}")
+
+    fallas = presupuesto(res["resultados"])
+    for f in fallas: print(f"⚠️ Presupuesto de arranque: {f}")
+
+    if args.base:
+        with open(args.base, "r", encoding="utf-8") as f: base = json.load(f)
+        print(f"\nComparación con {args.base} ({base.get('commit', '')}):")
+        regresiones = comparar(res, base)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresión(es) por encima de la tolerancia"); return 1
+        print("\nSin regresiones")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
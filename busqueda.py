@@ -0,0 +1,220 @@
+"""
+busqueda.py  —  LuxOMeter PRO / RETILAP 2024
+Índice invertido para búsqueda de texto sobre proyectos y notas de medición.
+Sin distinción de tildes ni mayúsculas, con coincidencia por prefijo y
+tolerancia a errores de tipeo (trigramas + distancia de edición).
+Se actualiza por proyecto al guardar; solo re-lee archivos de otros
+dispositivos cuando cambia su mtime.
+"""
+import bisect
+import json
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from catalogo import listar_archivos_dispositivos
+
+_RE_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Campos indexados: (etiqueta, clave en general / en la fila de medición)
+CAMPOS_PROYECTO = [("Empresa", "nombre_empresa"), ("NIT", "nit"),
+                   ("OT", "numero_orden"), ("Sede", "sede"), ("Dirección", "direccion")]
+CAMPOS_PUNTO = [("Puesto", "PuestoEvaluado"), ("Observaciones", "Nota"),
+                ("Recomendaciones", "Recomendacion")]
+
+PESO_EXACTO, PESO_PREFIJO, PESO_APROX = 3.0, 2.0, 1.0
+
+
+# ── Normalización ─────────────────────────────────────────────────────────────
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Educación' -> 'educacion'."""
+    t = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in t if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return _RE_TOKEN.findall(normalizar(texto))
+
+
+def _trigramas(token):
+    t = f"  {token} "
+    return {t[i:i+3] for i in range(len(t) - 2)}
+
+
+def distancia_edicion(a, b, tope):
+    """Levenshtein con corte: devuelve tope+1 en cuanto se supera."""
+    if abs(len(a) - len(b)) > tope: return tope + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]; minimo = i
+        for j, cb in enumerate(b, 1):
+            v = min(prev[j] + 1, cur[j-1] + 1, prev[j-1] + (ca != cb))
+            cur.append(v); minimo = min(minimo, v)
+        if minimo > tope: return tope + 1
+        prev = cur
+    return prev[-1]
+
+
+def distancia_prefijo(a, b, tope):
+    """Distancia de edición de a al prefijo de b que más se le parece (a es lo que se
+    lleva escrito de b): 'ofcin' está a 1 de 'oficinas'. Con corte como la anterior."""
+    if len(b) < len(a) - tope: return tope + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j-1] + 1, prev[j-1] + (ca != cb)))
+        if min(cur) > tope: return tope + 1
+        prev = cur
+    return min(prev)
+
+
+def tope_edicion(token):
+    """Errores de tipeo tolerados según el largo del término."""
+    return 0 if len(token) <= 3 else (1 if len(token) <= 6 else 2)
+
+
+# ── Índice ────────────────────────────────────────────────────────────────────
+
+class IndiceBusqueda:
+    """Documentos = campos de proyecto y de cada punto; resultados agrupados por proyecto."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}                        # doc_id -> metadatos del documento
+        self._tokens_doc = {}                  # doc_id -> set(tokens)
+        self._post = defaultdict(set)          # token -> {doc_id}
+        self._tri = defaultdict(set)           # trigrama -> {token}
+        self._vocab = []                       # tokens ordenados (prefijos)
+        self._vocab_sucio = False
+        self._por_proyecto = defaultdict(set)  # (dispositivo, proyecto) -> {doc_id}
+        self._firmas = {}                      # (dispositivo, proyecto) -> firma del texto
+        self._mtimes = {}                      # dispositivo -> mtime indexado
+        self._sig_id = 0
+
+    # ── mantenimiento ──
+    def _agregar_doc(self, meta, texto):
+        toks = set(tokenizar(texto))
+        if not toks: return
+        self._sig_id += 1; did = self._sig_id
+        self._docs[did] = meta; self._tokens_doc[did] = toks
+        for t in toks:
+            if t not in self._post:
+                for g in _trigramas(t): self._tri[g].add(t)
+                self._vocab_sucio = True
+            self._post[t].add(did)
+        self._por_proyecto[(meta["dispositivo"], meta["proyecto"])].add(did)
+
+    def _quitar_doc(self, did):
+        for t in self._tokens_doc.pop(did, ()):
+            ds = self._post.get(t)
+            if ds is None: continue
+            ds.discard(did)
+            if not ds:
+                del self._post[t]
+                for g in _trigramas(t):
+                    self._tri[g].discard(t)
+                    if not self._tri[g]: del self._tri[g]
+                self._vocab_sucio = True
+        self._docs.pop(did, None)
+
+    def eliminar_proyecto(self, dispositivo, nombre):
+        with self._lock:
+            for did in self._por_proyecto.pop((dispositivo, nombre), ()):
+                self._quitar_doc(did)
+            self._firmas.pop((dispositivo, nombre), None)
+
+    def actualizar_proyecto(self, dispositivo, nombre, p):
+        """Re-indexa un proyecto solo si cambió alguno de sus textos."""
+        g = p.get("general", {})
+        textos = [(None, None, et, g.get(k, "")) for et, k in CAMPOS_PROYECTO]
+        for pln, pi in p.get("planos", {}).items():
+            textos.append((pln, None, "Plano", pln))
+            for r in pi.get("data", []):
+                for et, k in CAMPOS_PUNTO:
+                    if r.get(k): textos.append((pln, r.get("Número"), et, r.get(k)))
+        firma = hash(tuple(textos))
+        with self._lock:
+            if self._firmas.get((dispositivo, nombre)) == firma: return False
+            self.eliminar_proyecto(dispositivo, nombre)
+            empresa = g.get("nombre_empresa", "")
+            for pln, num, et, txt in textos:
+                if not txt: continue
+                self._agregar_doc({"dispositivo": dispositivo, "proyecto": nombre,
+                                   "empresa": empresa, "plano": pln, "numero": num,
+                                   "campo": et, "texto": str(txt)}, txt)
+            self._firmas[(dispositivo, nombre)] = firma
+            return True
+
+    def actualizar_dispositivo(self, dispositivo, proyectos, mtime=None):
+        """Sincroniza todos los proyectos de un dispositivo (p.ej. tras guardar)."""
+        with self._lock:
+            for (d, n) in [k for k in self._firmas if k[0] == dispositivo and k[1] not in proyectos]:
+                self.eliminar_proyecto(d, n)
+            for nombre, p in proyectos.items():
+                self.actualizar_proyecto(dispositivo, nombre, p)
+            if mtime is not None: self._mtimes[dispositivo] = mtime
+
+    def refrescar(self, directorio):
+        """Indexa archivos de dispositivo nuevos o modificados por otros procesos."""
+        archivos = listar_archivos_dispositivos(directorio)
+        with self._lock:
+            for d in [d for d in self._mtimes if d not in archivos]:
+                self.actualizar_dispositivo(d, {}); del self._mtimes[d]
+            for d, (ruta, mtime) in archivos.items():
+                if self._mtimes.get(d) == mtime: continue
+                try:
+                    with open(ruta, "r", encoding="utf-8") as f: data = json.load(f)
+                except (OSError, ValueError): continue
+                self.actualizar_dispositivo(d, data, mtime)
+
+    # ── consulta ──
+    def _expandir(self, qt):
+        """Tokens del vocabulario que casan con qt, con su peso."""
+        if self._vocab_sucio:
+            self._vocab = sorted(self._post); self._vocab_sucio = False
+        res = {}
+        if qt in self._post: res[qt] = PESO_EXACTO
+        if len(qt) >= 2:
+            i = bisect.bisect_left(self._vocab, qt)
+            while i < len(self._vocab) and self._vocab[i].startswith(qt):
+                res.setdefault(self._vocab[i], PESO_PREFIJO); i += 1
+        tope = tope_edicion(qt)
+        if tope:
+            tri = _trigramas(qt); votos = defaultdict(int)
+            for g in tri:
+                for t in self._tri.get(g, ()): votos[t] += 1
+            minimo = max(1, len(tri) - 3 * tope)
+            for t, v in votos.items():
+                if v >= minimo and t not in res and distancia_edicion(qt, t, tope) <= tope:
+                    res[t] = PESO_APROX
+        return res
+
+    def buscar(self, consulta, limite=50):
+        """Proyectos que contienen todos los términos (exactos, por prefijo o aproximados)
+        en cualquiera de sus campos. Devuelve [{dispositivo, proyecto, empresa,
+        puntaje, coincidencias: [metadatos del documento, ...]}]."""
+        qts = tokenizar(consulta)
+        if not qts: return []
+        with self._lock:
+            acumulado = None
+            coincidencias = defaultdict(dict)
+            for qt in qts:
+                mejor = defaultdict(float)
+                for t, peso in self._expandir(qt).items():
+                    for did in self._post[t]:
+                        m = self._docs[did]; k = (m["dispositivo"], m["proyecto"])
+                        if peso > mejor[k]: mejor[k] = peso
+                        coincidencias[k][did] = m
+                acumulado = dict(mejor) if acumulado is None else \
+                    {k: s + mejor[k] for k, s in acumulado.items() if k in mejor}
+                if not acumulado: return []
+            res = []
+            for k, s in acumulado.items():
+                docs = list(coincidencias[k].values())
+                res.append({"dispositivo": k[0], "proyecto": k[1], "empresa": docs[0]["empresa"],
+                            "puntaje": s, "coincidencias": docs})
+        res.sort(key=lambda e: (-e["puntaje"], -len(e["coincidencias"])))
+        return res[:limite]
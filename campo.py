@@ -0,0 +1,220 @@
+"""
+campo.py  —  LuxOMeter PRO / RETILAP 2024
+Paquetes de campo para trabajo sin conexión.
+Un paquete es un ZIP (paquete.json + imágenes de plano + fotos) con una copia
+del proyecto y la huella de cada punto al momento de exportarlo (la "base").
+El equipo de campo devuelve solo lo que cambió respecto a esa base y el
+servidor lo fusiona a tres vías con una regla determinista: el resultado no
+depende del orden en que se apliquen los cambios.
+"""
+import base64
+import hashlib
+import json
+import zipfile
+from datetime import datetime
+
+from geometria import CAMPOS_PLANO
+
+FORMATO = 2     # 2: puntos identificados por id_punto, no por su número
+MANIFIESTO = "paquete.json"
+
+
+# ── Huellas ───────────────────────────────────────────────────────────────────
+
+def huella(obj):
+    """Hash estable de un valor JSON (orden de claves normalizado)."""
+    txt = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(txt.encode("utf-8")).hexdigest()[:16]
+
+
+def puntos_plano(pl):
+    """{número: {"xy", "fila", "foto"}} de un plano crudo (foto en base64 o None)."""
+    por_num = {r.get("Número"): r for r in pl.get("data", [])}
+    fotos = pl.get("fotos", {})
+    return {n: {"xy": list(xy), "fila": por_num.get(n), "foto": fotos.get(str(n))}
+            for n, xy in enumerate(pl.get("puntos", []), 1)}
+
+
+def id_punto(xy):
+    """Identidad estable de un punto: sus coordenadas normalizadas. A diferencia del
+    número, no cambia cuando se borra un punto anterior."""
+    return f"{float(xy[0]):.6f},{float(xy[1]):.6f}"
+
+
+def puntos_por_id(pl):
+    """{id: {"xy", "fila", "foto"}} en el orden del plano. La fila va sin "Número":
+    es la posición, que se vuelve a asignar al armar el plano."""
+    res = {}
+    for c in puntos_plano(pl).values():
+        pid = base = id_punto(c["xy"]); k = 1
+        while pid in res: k += 1; pid = f"{base}#{k}"      # coordenadas repetidas
+        fila = {kf: v for kf, v in c["fila"].items() if kf != "Número"} if c["fila"] else None
+        res[pid] = {"xy": c["xy"], "fila": fila, "foto": c["foto"]}
+    return res
+
+
+def huella_punto(c):
+    if c is None: return None
+    foto = c.get("foto")
+    return huella({"xy": c["xy"], "fila": c["fila"],
+                   "foto": hashlib.sha1(foto.encode()).hexdigest() if foto else None})
+
+
+def huellas(proyecto):
+    """Base de un proyecto crudo: huella de cada campo general, imagen y punto (por
+    id_punto), y el orden de los puntos."""
+    planos = {}
+    for pln, pl in proyecto.get("planos", {}).items():
+        pts = puntos_por_id(pl)
+        planos[pln] = {"img": huella(pl.get("img_base64")), "orden": list(pts),
+                       "puntos": {pid: huella_punto(c) for pid, c in pts.items()}}
+    return {"general": {k: huella(v) for k, v in proyecto.get("general", {}).items()}, "planos": planos}
+
+
+# ── Paquete ───────────────────────────────────────────────────────────────────
+
+def geometria_plano(pl):
+    """Escala y recinto del plano (CAMPOS_PLANO), solo los que tiene."""
+    return {k: pl[k] for k in CAMPOS_PLANO if pl.get(k)}
+
+
+def crear_paquete(nombre, proyecto, origen, destino, base=None):
+    """Escribe el paquete en destino (ruta o buffer). Sin base es un paquete completo
+    (su base son las huellas actuales); con base solo lleva lo que cambió."""
+    completo = base is None
+    if completo: base = huellas(proyecto)
+    g = proyecto.get("general", {})
+    man = {"formato": FORMATO, "proyecto": nombre, "origen": origen,
+           "tipo": "completo" if completo else "cambios",
+           "creado": datetime.now().isoformat(timespec="seconds"), "base": base,
+           "general": {k: v for k, v in g.items()
+                       if completo or huella(v) != base["general"].get(k)},
+           "planos": {}}
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED) as z:
+        for i, (pln, pl) in enumerate(proyecto.get("planos", {}).items()):
+            bpl = base["planos"].get(pln, {"img": None, "puntos": {}})
+            ent = {"img": None, "puntos": {}, "eliminados": [], "geometria": geometria_plano(pl)}
+            img = pl.get("img_base64")
+            if img and (completo or huella(img) != bpl["img"]):
+                ent["img"] = f"planos/{i}.png"
+                z.writestr(ent["img"], base64.b64decode(img), compress_type=zipfile.ZIP_STORED)
+            actuales = puntos_por_id(pl)
+            for j, (pid, c) in enumerate(actuales.items()):
+                if not completo and huella_punto(c) == bpl["puntos"].get(pid): continue
+                foto = None
+                if c["foto"]:
+                    foto = f"fotos/{i}/{j}.jpg"
+                    z.writestr(foto, base64.b64decode(c["foto"]), compress_type=zipfile.ZIP_STORED)
+                ent["puntos"][pid] = {"xy": c["xy"], "fila": c["fila"], "foto": foto}
+            ent["eliminados"] = sorted(pid for pid in bpl["puntos"] if pid not in actuales)
+            # la geometría va siempre: la base no tiene su huella y fusionar solo la usa si el
+            # plano del servidor no está calibrado
+            if completo or ent["img"] or ent["puntos"] or ent["eliminados"] or ent["geometria"] \
+                    or pln not in base["planos"]:
+                man["planos"][pln] = ent
+        z.writestr(MANIFIESTO, json.dumps(man, ensure_ascii=False))
+    return destino
+
+
+def leer_paquete(archivo):
+    """Manifiesto con las imágenes y fotos ya en base64 (formato de almacenamiento)."""
+    with zipfile.ZipFile(archivo) as z:
+        man = json.loads(z.read(MANIFIESTO).decode("utf-8"))
+        if man.get("formato") != FORMATO:
+            raise ValueError(f"Formato de paquete no soportado: {man.get('formato')}")
+        b64 = lambda ruta: base64.b64encode(z.read(ruta)).decode() if ruta else None
+        for ent in man["planos"].values():
+            ent["img"] = b64(ent.get("img"))
+            for c in ent["puntos"].values(): c["foto"] = b64(c.get("foto"))
+    return man
+
+
+def proyecto_desde_paquete(man):
+    """Proyecto crudo a partir de un paquete completo, marcado como copia de campo."""
+    if man["tipo"] != "completo": raise ValueError("Solo un paquete completo crea un proyecto")
+    planos = {pln: _armar_plano(ent["img"], ent["puntos"], ent.get("geometria"))
+              for pln, ent in man["planos"].items()}
+    return {"general": man["general"], "planos": planos,
+            "campo": {"origen": man["origen"], "creado": man["creado"], "base": man["base"]}}
+
+
+def _armar_plano(img, puntos, geometria=None):
+    """Plano crudo desde {id: contenido} en orden; numera los puntos 1..n."""
+    pl = {"puntos": [], "data": [], "fotos": {}, **(geometria or {})}
+    for nuevo, c in enumerate(puntos.values(), 1):
+        pl["puntos"].append(list(c["xy"]))
+        if c.get("fila"): pl["data"].append({**c["fila"], "Número": nuevo})
+        if c.get("foto"): pl["fotos"][str(nuevo)] = c["foto"]
+    if img: pl["img_base64"] = img
+    return pl
+
+
+# ── Fusión ────────────────────────────────────────────────────────────────────
+
+def ordenar_puntos(puntos, orden):
+    """Los puntos en el orden de la base y, después, los que no estaban en ella por id.
+    Depende solo del contenido, así que la numeración tampoco depende del orden en que
+    se apliquen los paquetes."""
+    pos = {pid: k for k, pid in enumerate(orden)}
+    return {pid: puntos[pid] for pid in sorted(puntos, key=lambda p: (pos.get(p, len(pos)), p))}
+
+
+def _rango(c):
+    # Conflicto: gana lo editado sobre lo borrado, lo medido sobre lo pendiente y,
+    # a igualdad, la huella mayor. Es simétrico, así que no depende del orden.
+    return (c is not None, bool(c and c.get("fila")), huella_punto(c) or "")
+
+
+def fusionar(actual, man):
+    """Aplica un paquete sobre el proyecto crudo del servidor (o None si no existe).
+    Devuelve (proyecto fusionado, informe con aplicados / conflictos)."""
+    base = man["base"]
+    informe = {"aplicados": 0, "conflictos": [], "sin_cambios": 0}
+    if actual is None:
+        actual = {"general": {}, "planos": {}}
+
+    general = dict(actual.get("general", {}))
+    for k, v in man["general"].items():
+        a, e, b = huella(general.get(k)), huella(v), base["general"].get(k)
+        if a == e: continue
+        if a == b or k not in general: general[k] = v; informe["aplicados"] += 1
+        else:
+            gana = v if e > a else general[k]
+            informe["conflictos"].append({"general": k, "ganador": "campo" if gana is v else "servidor"})
+            general[k] = gana
+
+    planos = {}
+    nombres = list(actual.get("planos", {})) + [p for p in man["planos"] if p not in actual.get("planos", {})]
+    for pln in nombres:
+        pl = actual.get("planos", {}).get(pln)
+        ent = man["planos"].get(pln)
+        if ent is None: planos[pln] = pl; continue
+        bpl = base["planos"].get(pln, {"img": None, "puntos": {}})
+        puntos = puntos_por_id(pl) if pl else {}
+        img = (pl or {}).get("img_base64")
+        if ent["img"] and (img is None or huella(img) == bpl["img"]): img = ent["img"]
+        cambios = dict(ent["puntos"])
+        cambios.update({pid: None for pid in ent["eliminados"]})
+        en_conflicto = []
+        for pid in sorted(cambios):
+            e_c = cambios[pid]; a_c = puntos.get(pid)
+            a, e, b = huella_punto(a_c), huella_punto(e_c), bpl["puntos"].get(pid)
+            if a == e: informe["sin_cambios"] += 1; continue
+            if a == b: gana = e_c; informe["aplicados"] += 1
+            else:
+                gana = max(a_c, e_c, key=_rango)
+                en_conflicto.append((pid, "campo" if gana is e_c else "servidor"))
+            if gana is None: puntos.pop(pid, None)
+            else: puntos[pid] = gana
+        puntos = ordenar_puntos(puntos, bpl.get("orden", []))
+        numero = {pid: n for n, pid in enumerate(puntos, 1)}
+        informe["conflictos"] += [{"plano": pln, "punto": numero.get(pid, "(eliminado)"), "ganador": g}
+                                  for pid, g in en_conflicto]
+        # la escala y el recinto se calibran en el servidor; el paquete solo los aporta
+        # a planos que allí no los tienen
+        geo = (geometria_plano(pl) if pl else None) or ent.get("geometria")
+        planos[pln] = _armar_plano(img, puntos, geo)
+
+    fusionado = {"general": general, "planos": planos}
+    if actual.get("campo"): fusionado["campo"] = actual["campo"]
+    return fusionado, informe
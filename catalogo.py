@@ -0,0 +1,147 @@
+"""
+catalogo.py  —  LuxOMeter PRO / RETILAP 2024
+Catálogo de proyectos de todos los dispositivos.
+Indexa los metadatos de cada proyecto (empresa, NIT, OT, ARL, fecha, conteos)
+y solo vuelve a leer un archivo de dispositivo cuando cambia su mtime.
+Los proyectos completos se cargan bajo demanda, uno a la vez.
+"""
+import glob
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime
+
+PATRON_DISPOSITIVO = "proyectos_*.json"
+INDICE_ARCHIVO = ".catalogo.json"
+
+
+# ── Archivos de dispositivo ───────────────────────────────────────────────────
+
+def listar_archivos_dispositivos(directorio):
+    """{device_id: (ruta, mtime)} de todos los proyectos_<id>.json del directorio."""
+    archivos = {}
+    for ruta in glob.glob(os.path.join(directorio, PATRON_DISPOSITIVO)):
+        m = re.match(r"proyectos_(.+)\.json$", os.path.basename(ruta))
+        if not m: continue
+        try: archivos[m.group(1)] = (ruta, os.path.getmtime(ruta))
+        except OSError: pass
+    return archivos
+
+
+def _plano(texto):
+    """Minúsculas sin tildes, para filtros de texto."""
+    t = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in t if not unicodedata.combining(c)).lower().strip()
+
+
+def _fecha_iso(fecha):
+    try: return datetime.strptime(fecha, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except (TypeError, ValueError): return ""
+
+
+def resumen_proyecto(device_id, nombre, p):
+    """Entrada de catálogo: solo metadatos livianos, sin imágenes ni mediciones."""
+    g = p.get("general", {})
+    planos = p.get("planos", {})
+    filas = [r for pi in planos.values() for r in pi.get("data", [])]
+    return {
+        "dispositivo":  device_id,
+        "nombre":       nombre,
+        "empresa":      g.get("nombre_empresa", ""),
+        "nit":          g.get("nit", ""),
+        "numero_orden": g.get("numero_orden", ""),
+        "arl":          g.get("arl", ""),
+        "sede":         g.get("sede", ""),
+        "fecha":        g.get("fecha", ""),
+        "fecha_iso":    _fecha_iso(g.get("fecha", "")),
+        "higienista":   g.get("responsable_higienista", ""),
+        "planos":       len(planos),
+        "puntos":       len(filas),
+        "conformes":    sum(1 for r in filas if "✅" in str(r.get("Resultado", ""))),
+    }
+
+
+# ── Catálogo ──────────────────────────────────────────────────────────────────
+
+class CatalogoProyectos:
+    """Índice de proyectos por dispositivo, persistido en <directorio>/.catalogo.json."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self.ruta_indice = os.path.join(directorio, INDICE_ARCHIVO)
+        self._lock = threading.Lock()
+        self._indice = self._leer_indice()   # device_id -> {"mtime", "proyectos": [...]}
+
+    def _leer_indice(self):
+        try:
+            with open(self.ruta_indice, "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError): return {}
+
+    def _escribir_indice(self):
+        try:
+            tmp = self.ruta_indice + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._indice, f, ensure_ascii=False)
+            os.replace(tmp, self.ruta_indice)
+        except OSError: pass
+
+    def refrescar(self):
+        """Re-indexa solo los archivos nuevos o modificados. Devuelve los device_id tocados."""
+        archivos = listar_archivos_dispositivos(self.directorio)
+        tocados = []
+        with self._lock:
+            for device_id in list(self._indice):
+                if device_id not in archivos:
+                    del self._indice[device_id]; tocados.append(device_id)
+            for device_id, (ruta, mtime) in archivos.items():
+                if self._indice.get(device_id, {}).get("mtime") == mtime: continue
+                try:
+                    with open(ruta, "r", encoding="utf-8") as f: data = json.load(f)
+                except (OSError, ValueError): continue
+                self._indice[device_id] = {
+                    "mtime": mtime,
+                    "proyectos": [resumen_proyecto(device_id, n, p) for n, p in data.items()],
+                }
+                tocados.append(device_id)
+            if tocados: self._escribir_indice()
+        return tocados
+
+    def entradas(self):
+        with self._lock:
+            return [e for d in self._indice.values() for e in d["proyectos"]]
+
+    def dispositivos(self):
+        with self._lock: return sorted(self._indice)
+
+    def buscar(self, texto="", empresa="", nit="", orden="", arls=None,
+               dispositivos=None, desde=None, hasta=None):
+        """Filtra el catálogo. Los textos no distinguen mayúsculas ni tildes;
+        desde/hasta son date o 'YYYY-MM-DD'."""
+        texto, empresa = _plano(texto), _plano(empresa)
+        nit, orden = _plano(nit), _plano(orden)
+        desde = str(desde) if desde else ""
+        hasta = str(hasta) if hasta else ""
+        res = []
+        for e in self.entradas():
+            if empresa and empresa not in _plano(e["empresa"]): continue
+            if nit and nit not in _plano(e["nit"]): continue
+            if orden and orden not in _plano(e["numero_orden"]): continue
+            if arls and e["arl"] not in arls: continue
+            if dispositivos and e["dispositivo"] not in dispositivos: continue
+            if desde and (not e["fecha_iso"] or e["fecha_iso"] < desde): continue
+            if hasta and (not e["fecha_iso"] or e["fecha_iso"] > hasta): continue
+            if texto and texto not in _plano(" ".join(
+                    str(e[k]) for k in ("nombre", "empresa", "nit", "numero_orden", "sede", "higienista"))):
+                continue
+            res.append(e)
+        res.sort(key=lambda e: (e["fecha_iso"], e["empresa"]), reverse=True)
+        return res
+
+    def cargar_proyecto(self, device_id, nombre):
+        """Datos crudos (tal como están en el JSON) de un único proyecto, o None."""
+        archivos = listar_archivos_dispositivos(self.directorio)
+        if device_id not in archivos: return None
+        with open(archivos[device_id][0], "r", encoding="utf-8") as f:
+            return json.load(f).get(nombre)
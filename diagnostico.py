@@ -0,0 +1,140 @@
+"""
+diagnostico.py  —  LuxOMeter PRO / RETILAP 2024
+Instrumentación por rerun: tiempo de cada etapa con nombre (carga, página,
+planos, gráficas, guardado, exportadores), un registro JSON por rerun en el
+logger "luxometer.diagnostico" y, a pedido, el perfil de un solo rerun.
+Se activa por sesión con ?diag=1 (o para todo el servidor con la variable
+LUXOMETER_DIAGNOSTICO=1); desactivado, etapa() solo consulta un thread-local.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    from pyinstrument import Profiler as _Muestreador      # perfil por muestreo, si está instalado
+except ImportError:
+    _Muestreador = None
+
+GLOBAL = os.environ.get("LUXOMETER_DIAGNOSTICO", "") not in ("", "0")
+HISTORIAL = 30          # reruns que se conservan por sesión
+LINEAS_PERFIL = 40      # funciones del informe de cProfile
+
+log = logging.getLogger("luxometer.diagnostico")
+if not log.handlers:
+    _h = logging.StreamHandler(); _h.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_h); log.setLevel(logging.INFO); log.propagate = False
+
+_local = threading.local()
+_NADA = nullcontext()
+
+
+# ── Registro de un rerun ──────────────────────────────────────────────────────
+
+class Rerun:
+    """Etapas de un rerun: {nombre: [llamadas, segundos, profundidad]} en orden de aparición."""
+
+    def __init__(self, pagina, dispositivo=""):
+        self.pagina = pagina; self.dispositivo = dispositivo
+        self.inicio = time.time(); self._t0 = time.perf_counter()
+        self.total = None; self.etapas = {}; self.profundidad = 0
+        self.perfil = None; self._perfilador = None
+
+    def registro(self):
+        return {"evento": "rerun", "dispositivo": self.dispositivo, "pagina": self.pagina,
+                "inicio": round(self.inicio, 3), "total_ms": round((self.total or 0) * 1000, 1),
+                "etapas": {n: {"llamadas": e[0], "ms": round(e[1] * 1000, 1)} for n, e in self.etapas.items()}}
+
+
+class _Etapa:
+    __slots__ = ("r", "nombre", "t")
+
+    def __init__(self, r, nombre):
+        self.r = r; self.nombre = nombre
+
+    def __enter__(self):
+        r = self.r
+        if self.nombre not in r.etapas: r.etapas[self.nombre] = [0, 0.0, r.profundidad]
+        r.profundidad += 1; self.t = time.perf_counter()
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t; self.r.profundidad -= 1
+        e = self.r.etapas[self.nombre]; e[0] += 1; e[1] += dt
+
+
+class _EtapaSuelta:
+    """Etapa fuera de un rerun (p. ej. la descarga diferida de un exportador): se
+    registra sola en el log cuando el diagnóstico global está activo."""
+    __slots__ = ("nombre", "t")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+
+    def __exit__(self, *exc):
+        log.info(json.dumps({"evento": "etapa", "etapa": self.nombre, "inicio": round(time.time(), 3),
+                             "ms": round((time.perf_counter() - self.t) * 1000, 1)}, ensure_ascii=False))
+
+
+def etapa(nombre):
+    """Context manager que cronometra 'nombre' dentro del rerun activo (o nada)."""
+    r = getattr(_local, "rerun", None)
+    if r is not None: return _Etapa(r, nombre)
+    return _EtapaSuelta(nombre) if GLOBAL else _NADA
+
+
+def medido(nombre):
+    """Decorador: cada llamada a la función es una etapa del rerun."""
+    def deco(f):
+        @functools.wraps(f)
+        def envoltura(*a, **k):
+            with etapa(nombre): return f(*a, **k)
+        return envoltura
+    return deco
+
+
+# ── Ciclo del rerun ───────────────────────────────────────────────────────────
+
+def iniciar(pagina, dispositivo="", perfilar=False):
+    """Abre el registro del rerun en el hilo del script; con perfilar, arranca el perfilador."""
+    r = Rerun(pagina, dispositivo); _local.rerun = r
+    if perfilar:
+        r._perfilador = _Muestreador(interval=0.001) if _Muestreador else cProfile.Profile()
+        r._perfilador.start() if _Muestreador else r._perfilador.enable()
+    return r
+
+
+def terminar(historial=None):
+    """Cierra el rerun activo, lo escribe en el log y lo agrega a historial (lista de la sesión)."""
+    r = getattr(_local, "rerun", None); _local.rerun = None
+    if r is None: return None
+    r.total = time.perf_counter() - r._t0
+    if r._perfilador is not None:
+        r.perfil = _informe_perfil(r._perfilador); r._perfilador = None
+    log.info(json.dumps(r.registro(), ensure_ascii=False))
+    if historial is not None:
+        historial.append(r); del historial[:-HISTORIAL]
+    return r
+
+
+def _informe_perfil(p):
+    if _Muestreador and isinstance(p, _Muestreador):
+        p.stop(); return p.output_text(unicode=True, color=False)
+    p.disable(); s = io.StringIO()
+    pstats.Stats(p, stream=s).sort_stats("cumulative").print_stats(LINEAS_PERFIL)
+    return s.getvalue()
+
+
+def filas(r):
+    """Etapas de un rerun para mostrar en tabla, con sangría por anidamiento."""
+    total = r.total or 1e-9
+    return [{"Etapa": "· " * e[2] + n, "Llamadas": e[0], "ms": round(e[1] * 1000, 1),
+             "% del rerun": round(e[1] / total * 100, 1)} for n, e in r.etapas.items()]
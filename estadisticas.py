@@ -0,0 +1,149 @@
+"""
+estadisticas.py  —  LuxOMeter PRO / RETILAP 2024
+Estadísticas de iluminancia por plano y por tipo de área RETILAP: promedio,
+mínimo, máximo, percentiles, cumplimiento de Uo, déficit y luminarias
+adicionales estimadas por el método de los lúmenes (solo con planos calibrados
+y el flujo de la luminaria). Se calculan vectorizadas sobre todos los puntos y
+se guardan por versión de los datos del plano.
+"""
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from geometria import areas_filas
+
+TODAS = "Todas las áreas"
+PERCENTILES = (10, 50, 90)
+
+# Método de los lúmenes por tipo de área: N = (Em − Ē)·A / (Φ·CU·MF), con Ē la
+# iluminancia media medida (los puntos en 0 lx cuentan como 0), A los m² del
+# recinto que cubren sus puntos (geometria) y Φ el flujo de la luminaria que se
+# agregaría. Sin área o sin Φ no se estima: la columna se omite.
+CU = 0.6                # coeficiente de utilización típico
+MANTENIMIENTO = 0.8     # factor de mantenimiento
+
+
+class FilaEstadistica(NamedTuple):
+    area: str
+    puntos: int
+    conformes: int
+    promedio: float
+    minimo: float
+    maximo: float
+    p10: float
+    p50: float
+    p90: float
+    uo_cumple: float        # % de puntos con Uo >= Uo mínima
+    deficit: float          # lx que faltan en promedio a los puntos deficientes
+    luminarias: object      # luminarias adicionales estimadas (int), o None sin área o flujo
+
+
+# Encabezados para tablas (interfaz, PDF y Word), en el orden de los campos
+COLUMNAS = ("Área", "Puntos", "Adecuados", "Promedio (lx)", "Mín (lx)", "Máx (lx)",
+            "P10 (lx)", "P50 (lx)", "P90 (lx)", "% Uo cumple", "Déficit medio (lx)",
+            "Luminarias adicionales")
+
+
+class Estadisticas(NamedTuple):
+    total: FilaEstadistica
+    areas: tuple            # FilaEstadistica por tipo de área, la más deficiente primero
+
+    def columnas(self):
+        """COLUMNAS, sin la de luminarias si no se pudo estimar."""
+        return COLUMNAS if self.total.luminarias is not None else COLUMNAS[:-1]
+
+    def tabla(self):
+        """Valores de columnas() de cada área y del total al final."""
+        n = len(self.columnas())
+        return [tuple(f)[:n] for f in (*self.areas, self.total)]
+
+    def filas(self):
+        """Filas para st.dataframe."""
+        return [dict(zip(self.columnas(), f)) for f in self.tabla()]
+
+
+# ── Entrada ───────────────────────────────────────────────────────────────────
+
+def _num(v):
+    try: return float(v)
+    except (TypeError, ValueError): return math.nan
+
+
+def firma(data, areas=None):
+    """Versión de los datos de un plano para la caché: solo lo que entra al cálculo.
+    areas: m² de cada fila (NaN si no se conoce)."""
+    areas = areas or [math.nan] * len(data)
+    return tuple((d.get("TipoArea", ""), _num(d.get("Promedio")), _num(d.get("EMin")),
+                  _num(d.get("EMax")), _num(d.get("Em_req")), _num(d.get("Uo_calc")),
+                  _num(d.get("Uo_min")), a) for d, a in zip(data, areas))
+
+
+# ── Cálculo ───────────────────────────────────────────────────────────────────
+
+def luminarias_adicionales(prom, em, area, flujo):
+    """Método de los lúmenes sobre un tipo de área, o None sin área conocida o sin flujo."""
+    if not flujo or not len(prom) or np.isnan(area).any(): return None
+    falta = max(0.0, float(em.mean()) - float(prom.mean()))
+    return math.ceil(round(falta * float(area.sum()) / (flujo * CU * MANTENIMIENTO), 6))
+
+
+def _fila(area, prom, emin, emax, em, uo_ok, luminarias):
+    n = len(prom)
+    conf = prom >= em
+    p = np.percentile(prom, PERCENTILES) if n else (math.nan,) * len(PERCENTILES)
+    falta = (em - prom)[~conf]
+    return FilaEstadistica(
+        area, n, int(conf.sum()),
+        round(float(prom.mean()), 1), round(float(np.nanmin(emin)), 1), round(float(np.nanmax(emax)), 1),
+        *(round(float(v), 1) for v in p),
+        round(float(uo_ok.mean()) * 100, 1),
+        round(float(falta.mean()), 1) if len(falta) else 0.0,
+        luminarias)
+
+
+@lru_cache(maxsize=256)
+def _calcular(filas, flujo):
+    m = np.array([f[1:] for f in filas], dtype="float64").reshape(-1, 7)
+    prom, emin, emax, em, uo, uo_min, area = m.T
+    emin = np.where(np.isnan(emin), prom, emin); emax = np.where(np.isnan(emax), prom, emax)
+    uo_ok = uo >= uo_min
+
+    tipos, cod = np.unique(np.array([f[0] for f in filas], dtype=object), return_inverse=True)
+    orden = np.argsort(cod, kind="stable"); cortes = np.cumsum(np.bincount(cod, minlength=len(tipos)))[:-1]
+    por_area = []
+    for a, i in zip(tipos, np.split(orden, cortes)):
+        n_lum = luminarias_adicionales(prom[i], em[i], area[i], flujo)
+        por_area.append(_fila(str(a), prom[i], emin[i], emax[i], em[i], uo_ok[i], n_lum))
+    # el total suma las de cada tipo de área: cada uno tiene su propia Em
+    lum = [f.luminarias for f in por_area]
+    total = _fila(TODAS, prom, emin, emax, em, uo_ok, None if None in lum else sum(lum))
+    por_area.sort(key=lambda f: (f.conformes / f.puntos, -f.puntos))
+    return Estadisticas(total, tuple(por_area))
+
+
+def estadisticas(data, areas=None, flujo=None):
+    """Estadísticas de las filas de resultados de un plano (o de varios), o None sin filas.
+    areas (m² de cada fila) y flujo (lm por luminaria) habilitan las luminarias adicionales."""
+    filas = firma(data, areas)
+    return _calcular(filas, float(flujo or 0)) if filas else None
+
+
+def estadisticas_planos(planos, flujo=None):
+    """Estadísticas de las filas de varios planos en memoria, con el área de cada punto
+    de los planos calibrados (NaN en los demás)."""
+    data, areas = [], []
+    for pi in planos:
+        d = pi.get("data", [])
+        data += d; areas += areas_filas(pi) or [math.nan] * len(d)
+    return estadisticas(data, areas, flujo)
+
+
+def estadisticas_proyecto(proyecto):
+    """{plano: Estadisticas} y las del proyecto completo (clave None)."""
+    flujo = proyecto.get("general", {}).get("flujo_luminaria")
+    res = {pln: estadisticas_planos([pi], flujo) for pln, pi in proyecto.get("planos", {}).items()
+           if pi.get("data")}
+    res[None] = estadisticas_planos(proyecto.get("planos", {}).values(), flujo)
+    return res
@@ -0,0 +1,147 @@
+"""
+exportar.py  —  LuxOMeter PRO / RETILAP 2024
+Exportación tabular de mediciones (CSV y XLSX) en flujo.
+Las filas se generan una a una y se escriben directo al destino, sin armar
+listas ni DataFrames intermedios, así la memoria no crece con el número de filas.
+"""
+import csv
+import io
+import os
+import tempfile
+
+# ── Proyecto grande: a partir de aquí se exporta a archivo temporal ──────────
+UMBRAL_FILAS_ARCHIVO = 5000
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _limpiar(v):
+    """Quita saltos de línea y ';' internos para no romper columnas en Excel."""
+    return str(v).replace("\n","  ").replace("\r","").replace(";","").strip() if v else ""
+
+
+def _resultado(r):
+    return "ADECUADO" if "✅" in str(r.get("Resultado","")) else "DEFICIENTE"
+
+
+# ── Columnas ──────────────────────────────────────────────────────────────────
+# (encabezado, campo, limpiar). Los campos que empiezan por "_" no salen de la
+# fila de medición sino del contexto (proyecto, plano) o de un cálculo.
+
+COLUMNAS_EXPORT = [
+    ("Proyecto",                          "_proyecto",          True),
+    ("Plano",                             "_plano",             True),
+    ("N Med",                             "Número",             False),
+    ("Puesto de trabajo / Area evaluada", "PuestoEvaluado",     True),
+    ("Tipo Area RETILAP",                 "TipoArea",           True),
+    ("Ubicacion",                         "UbicacionLuminaria", True),
+    ("Tipo Iluminacion",                  "TipoIluminacion",    True),
+    ("Tipo Lampara",                      "TipoLampara",        True),
+    ("Control Luz Natural",               "ControlLuzNatural",  True),
+    ("Altura Luminaria (m)",              "AlturaLuminaria",    True),
+    ("Lux 1",                             "Med1",               False),
+    ("Lux 2",                             "Med2",               False),
+    ("Lux 3",                             "Med3",               False),
+    ("Lux 4",                             "Med4",               False),
+    ("E Min (lx)",                        "EMin",               False),
+    ("E Max (lx)",                        "EMax",               False),
+    ("E Medio (lx)",                      "EMedio",             False),
+    ("Promedio (lx)",                     "Promedio",           False),
+    ("Uo Calculado",                      "Uo_calc",            False),
+    ("Interpretacion Uo",                 "InterpretacionUo",   True),
+    ("Em Requerida (lx)",                 "Em_req",             False),
+    ("Resultado",                         "_resultado",         False),
+    ("Observaciones",                     "Nota",               True),
+    ("Recomendaciones",                   "Recomendacion",      True),
+]
+ENCABEZADOS_EXPORT = [c[0] for c in COLUMNAS_EXPORT]
+
+
+def _seleccionar(columnas):
+    """Devuelve la especificación de columnas pedida (por encabezado), en ese orden."""
+    if not columnas: return COLUMNAS_EXPORT
+    por_nombre = {c[0]: c for c in COLUMNAS_EXPORT}
+    faltan = [c for c in columnas if c not in por_nombre]
+    if faltan: raise ValueError(f"Columnas desconocidas: {', '.join(faltan)}")
+    return [por_nombre[c] for c in columnas]
+
+
+# ── Generadores de filas ──────────────────────────────────────────────────────
+
+def iter_filas(proyecto_data, proyecto_nombre, columnas=None):
+    """Genera una lista de valores por medición del proyecto, plano por plano."""
+    spec = _seleccionar(columnas)
+    proyecto = _limpiar(proyecto_nombre)
+    for pln, pi in proyecto_data.get("planos", {}).items():
+        plano = _limpiar(pln)
+        for r in pi.get("data", []):
+            fila = []
+            for _, campo, limpiar in spec:
+                if   campo == "_proyecto":  v = proyecto
+                elif campo == "_plano":     v = plano
+                elif campo == "_resultado": v = _resultado(r)
+                else:
+                    v = r.get(campo, "")
+                    if limpiar: v = _limpiar(v)
+                fila.append(v)
+            yield fila
+
+
+def iter_filas_proyectos(proyectos, columnas=None):
+    """Consolidado: encadena las filas de todos los proyectos."""
+    for pnombre, pdata in proyectos.items():
+        yield from iter_filas(pdata, pnombre, columnas)
+
+
+def contar_filas(proyectos):
+    return sum(len(pi.get("data", [])) for p in proyectos.values()
+               for pi in p.get("planos", {}).values())
+
+
+# ── Escritores ────────────────────────────────────────────────────────────────
+
+def escribir_csv(destino, filas, columnas=None):
+    """Escribe encabezado + filas en un archivo de texto ya abierto (sep=';')."""
+    w = csv.writer(destino, delimiter=";", lineterminator="\n")
+    w.writerow([c[0] for c in _seleccionar(columnas)])
+    for fila in filas:
+        w.writerow(fila)
+
+
+def escribir_xlsx(ruta, filas, columnas=None, hoja="RETILAP"):
+    """XLSX en modo write-only de openpyxl: cada fila va a disco al agregarla."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(hoja)
+    ws.append([c[0] for c in _seleccionar(columnas)])
+    for fila in filas:
+        ws.append(fila)
+    wb.save(ruta)
+
+
+def _temporal(sufijo):
+    fd, ruta = tempfile.mkstemp(prefix="retilap_", suffix=sufijo)
+    os.close(fd)
+    return ruta
+
+
+def exportar_csv(proyectos, columnas=None, ruta=None):
+    """CSV consolidado a disco (UTF-8 con BOM para Excel). Devuelve la ruta."""
+    ruta = ruta or _temporal(".csv")
+    with open(ruta, "w", encoding="utf-8-sig", newline="") as f:
+        escribir_csv(f, iter_filas_proyectos(proyectos, columnas), columnas)
+    return ruta
+
+
+def exportar_xlsx(proyectos, columnas=None, ruta=None):
+    """XLSX consolidado a disco. Devuelve la ruta."""
+    ruta = ruta or _temporal(".xlsx")
+    escribir_xlsx(ruta, iter_filas_proyectos(proyectos, columnas), columnas)
+    return ruta
+
+
+def csv_bytes(proyecto_data, proyecto_nombre, columnas=None):
+    """CSV de un proyecto en memoria, para proyectos pequeños."""
+    buf = io.StringIO()
+    escribir_csv(buf, iter_filas(proyecto_data, proyecto_nombre, columnas), columnas)
+    return buf.getvalue().encode("utf-8-sig")
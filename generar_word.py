@@ -3,16 +3,20 @@ generar_word.py  —  LuxOMeter PRO / RETILAP 2024
 Genera el informe Word usando la plantilla de la ARL seleccionada.
 Reemplaza campos amarillos, tabla de equipo, Tabla 2, Tabla 4 y Gráfica 1.
 """
+import copy
 import io
 import os
 from datetime import datetime
 from docx import Document
-from docx.shared import Pt, Cm, RGBColor
+from docx.shared import Pt, Cm, Emu, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_ALIGN_VERTICAL, WD_TABLE_ALIGNMENT
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 
+from recursos import compartido
+from modelo_informe import grafica_conteos
+
 # ── Rutas de plantillas ───────────────────────────────────────────────────────
 PLANTILLA_PATH = "INFORME_PREFORMA.docx"
 
@@ -61,8 +65,10 @@ def _is_yellow(run):
     except: return False
 
 
-def _img_buf(pil_img):
-    buf = io.BytesIO(); pil_img.save(buf, format="PNG"); buf.seek(0); return buf
+def _img_buf(img):
+    """Imagen PIL o bytes ya codificados (planos preparados) -> buffer para add_picture."""
+    if isinstance(img, (bytes, bytearray)): return io.BytesIO(img)
+    buf = io.BytesIO(); img.save(buf, format="PNG"); buf.seek(0); return buf
 
 
 def _mes_texto(fecha_str):
@@ -98,43 +104,10 @@ def _reemplazar_en_parrafo(para, viejo, nuevo):
 # ── Grafica de barras ─────────────────────────────────────────────────────────
 
 def _generar_grafica_bytes(mediciones):
-    try:
-        import matplotlib; matplotlib.use('Agg')
-        import matplotlib.pyplot as plt
-
-        total      = len(mediciones)
-        conformes  = sum(1 for m in mediciones if "✅" in str(m.get("resultado","")))
-        deficientes = total - conformes
-        if total == 0: return None
-
-        pct_conf = round(conformes/total*100, 1)
-        pct_def  = round(deficientes/total*100, 1)
-
-        fig, ax = plt.subplots(figsize=(7, 3), facecolor='#f8fafc')
-        ax.set_facecolor('#f8fafc')
-        bars = ax.barh([1,0], [pct_conf, pct_def],
-                       color=['#27ae60','#e74c3c'], height=0.5,
-                       edgecolor='white', linewidth=1.5)
-        for bar, val, n in zip(bars, [pct_conf,pct_def], [conformes,deficientes]):
-            ax.text(val/2, bar.get_y()+bar.get_height()/2,
-                    f"{val}%  ({n} pts)",
-                    ha='center', va='center', fontsize=11, fontweight='bold', color='white')
-        ax.set_yticks([1,0])
-        ax.set_yticklabels(['Adecuados','Deficientes'], fontsize=11,
-                           fontweight='bold', color='#1a3a5c')
-        ax.set_xlim(0, 115)
-        ax.set_xlabel('Porcentaje (%)', fontsize=9, color='#475569')
-        ax.set_title(f'Conformidad Lumínica — {total} puntos evaluados',
-                     fontsize=11, fontweight='bold', color='#1a3a5c', pad=10)
-        ax.spines['top'].set_visible(False); ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_visible(False)
-        ax.tick_params(axis='x', colors='#94a3b8'); ax.tick_params(axis='y', left=False)
-        ax.xaxis.grid(True, linestyle='--', alpha=0.4, color='#cbd5e1'); ax.set_axisbelow(True)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='PNG', bbox_inches='tight', dpi=140, facecolor='#f8fafc')
-        plt.close(fig); buf.seek(0); return buf.getvalue()
-    except: return None
+    total     = len(mediciones)
+    conformes = sum(1 for m in mediciones if "✅" in str(m.get("resultado","")))
+    if total == 0: return None
+    return grafica_conteos(conformes, total)
 
 
 # ── Tabla de resultados ───────────────────────────────────────────────────────
@@ -194,6 +167,45 @@ def _insertar_tabla_resultados(doc, para_ref, mediciones):
     para_ref._p.addnext(tbl._tbl)
 
 
+# ── Estadísticas por área ─────────────────────────────────────────────────────
+
+def _ancho_util(doc, despues_de=None):
+    """cm entre márgenes de la sección en la que cae lo que se inserte tras el elemento
+    despues_de del cuerpo (sin él, la última sección)."""
+    i = len(doc.sections) - 1
+    if despues_de is not None:
+        i = 0
+        for el in doc.element.body.iterchildren():
+            fin = el.find(f"{qn('w:pPr')}/{qn('w:sectPr')}") is not None
+            if el is despues_de: i += fin; break
+            i += fin
+    sec = doc.sections[min(i, len(doc.sections)-1)]
+    return Emu(sec.page_width - sec.left_margin - sec.right_margin).cm
+
+
+def _tabla_estadisticas(doc, est, ancho):
+    """Tabla de Estadisticas (estadisticas.py) de ancho cm al final del documento; la
+    devuelve para que el llamador la mueva donde corresponda."""
+    columnas = est.columnas()
+    n   = len(columnas) + 2                        # el área ocupa tres columnas numéricas
+    CW  = [ancho*3/n] + [ancho/n]*(len(columnas)-1)
+    tbl = doc.add_table(rows=1, cols=len(CW))
+    tbl.alignment = WD_TABLE_ALIGNMENT.CENTER; _borders(tbl)
+    for ci,(h,cw) in enumerate(zip(columnas,CW)):
+        cell=tbl.rows[0].cells[ci]; cell.width=Cm(cw)
+        _bg(cell,AZ_OSC); _txt(cell,h,bold=True,color=BLANCO,sz=7)
+    filas = est.tabla()
+    for ri,f in enumerate(filas):
+        total = ri == len(filas)-1
+        dr = tbl.add_row()
+        for ci,(val,cw) in enumerate(zip(f,CW)):
+            cell=dr.cells[ci]; cell.width=Cm(cw)
+            _bg(cell,AZ_CLA if total else (GRIS if ri%2==0 else BLANCO))
+            _txt(cell,str(val),bold=total,sz=7,
+                 align=WD_ALIGN_PARAGRAPH.LEFT if ci==0 else WD_ALIGN_PARAGRAPH.CENTER)
+    return tbl
+
+
 # ── Tabla 2 RETILAP con áreas reales ─────────────────────────────────────────
 
 def _actualizar_tabla2_retilap(tabla, mediciones):
@@ -404,14 +416,32 @@ def _rellenar_plantilla(doc, arl, general, mediciones, equipo):
                     run.font.highlight_color = None
 
 
+# ── PLANTILLAS ────────────────────────────────────────────────────────────────
+
+@compartido("plantilla_word", etiqueta=lambda ruta, mtime: os.path.basename(ruta))
+def _plantilla(ruta, mtime):
+    # Interpretada una vez por proceso (y de nuevo si el archivo cambia)
+    return Document(ruta)
+
+
+def _copia_plantilla(ruta):
+    """Documento nuevo a partir de la plantilla ya interpretada: copiar el árbol XML
+    cuesta la mitad que volver a abrir el .docx y el original queda intacto."""
+    ruta = os.path.abspath(ruta)
+    return copy.deepcopy(_plantilla(ruta, os.path.getmtime(ruta)))
+
+
 # ── FUNCIÓN PRINCIPAL ─────────────────────────────────────────────────────────
 
 def generar_informe_word(general: dict, mediciones: list,
                          plano_imgs: dict = None,
                          arl: str = "Positiva",
-                         plantillas_arl: dict = None) -> bytes:
+                         plantillas_arl: dict = None,
+                         estadisticas=None) -> bytes:
     """
     Genera informe Word usando la plantilla de la ARL seleccionada.
+    estadisticas (estadisticas.Estadisticas) agrega la tabla por tipo de área
+    después de la gráfica de conformidad.
     """
     if plantillas_arl is None:
         plantillas_arl = {
@@ -427,11 +457,11 @@ def generar_informe_word(general: dict, mediciones: list,
 
     # ── Cargar plantilla ────────────────────────────────────────────────────
     if os.path.exists(plantilla):
-        doc = Document(plantilla)
+        doc = _copia_plantilla(plantilla)
     elif os.path.exists(PLANTILLA_PATH):
-        doc = Document(PLANTILLA_PATH)
+        doc = _copia_plantilla(PLANTILLA_PATH)
     else:
-        return _generar_sin_plantilla(general, mediciones, plano_imgs, arl)
+        return _generar_sin_plantilla(general, mediciones, plano_imgs, arl, estadisticas)
 
     # ── 1. Rellenar campos amarillos según ARL ──────────────────────────────
     _rellenar_plantilla(doc, arl, general, mediciones, equipo)
@@ -458,13 +488,17 @@ def generar_informe_word(general: dict, mediciones: list,
     for para in paras:
         if para.text.strip().startswith('Grafica 1') or para.text.strip().startswith('Gráfica 1'):
             graf_bytes = _generar_grafica_bytes(mediciones)
+            ancla = para
             if graf_bytes:
                 try:
                     p_graf = doc.add_paragraph()
                     p_graf.alignment = WD_ALIGN_PARAGRAPH.CENTER
                     p_graf.add_run().add_picture(io.BytesIO(graf_bytes), width=Cm(14))
-                    para._p.addnext(p_graf._p)
+                    para._p.addnext(p_graf._p); ancla = p_graf
                 except: pass
+            if estadisticas:
+                ancho = _ancho_util(doc, ancla._p)
+                ancla._p.addnext(_tabla_estadisticas(doc, estadisticas, ancho)._tbl)
             break
 
     # ── 6. Planos ────────────────────────────────────────────────────────────
@@ -483,9 +517,17 @@ def generar_informe_word(general: dict, mediciones: list,
     buf = io.BytesIO(); doc.save(buf); buf.seek(0); return buf.getvalue()
 
 
+def informe_word(modelo, plantillas_arl: dict = None) -> bytes:
+    """Informe Word a partir del modelo común (modelo_informe): mismas filas, gráfica y
+    planos preparados que el PDF del mismo proyecto."""
+    imgs = {pln: prep.datos for pln, prep in modelo.imagenes().items()}
+    return generar_informe_word(modelo.general, modelo.mediciones, imgs, arl=modelo.arl,
+                                plantillas_arl=plantillas_arl, estadisticas=modelo.estadisticas())
+
+
 # ── FALLBACK sin plantilla ────────────────────────────────────────────────────
 
-def _generar_sin_plantilla(general, mediciones, plano_imgs, arl=""):
+def _generar_sin_plantilla(general, mediciones, plano_imgs, arl="", estadisticas=None):
     doc = Document()
     sec = doc.sections[0]
     sec.page_width=Cm(29.7); sec.page_height=Cm(21.0)
@@ -581,6 +623,8 @@ def _generar_sin_plantilla(general, mediciones, plano_imgs, arl=""):
     if graf_bytes:
         p_g=doc.add_paragraph(); p_g.alignment=WD_ALIGN_PARAGRAPH.CENTER
         p_g.add_run().add_picture(io.BytesIO(graf_bytes),width=Cm(14))
+    if estadisticas:
+        _norm("Estadísticas por tipo de área",bold=True,sz=10); _tabla_estadisticas(doc,estadisticas,_ancho_util(doc))
     doc.add_page_break()
 
     # Planos
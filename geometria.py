@@ -0,0 +1,177 @@
+"""
+geometria.py  —  LuxOMeter PRO / RETILAP 2024
+Escala real de los planos y cálculos en metros sobre los puntos de medición:
+calibración con dos puntos y una distancia conocida, contorno del recinto,
+separación de la malla, área que cubre cada punto y malla recomendada según
+la separación máxima p = 0.2·5^log10(d). Los puntos siguen guardados como
+fracciones (xn, yn) de la imagen; la escala se guarda aparte en cada plano.
+"""
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+CAMPOS_PLANO = ("escala", "recinto")    # claves del plano que se persisten con el proyecto
+CELDAS_COBERTURA = 2_000_000            # celdas × puntos por cálculo de cobertura
+P_MAXIMA = 10.0                         # m, tope de la separación recomendada
+RECINTO_COMPLETO = ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))
+
+
+class ResumenGeometria(NamedTuple):
+    area: float             # m² del recinto
+    largo: float            # m, lado mayor del rectángulo que lo contiene
+    ancho: float
+    puntos: int             # puntos dentro del recinto
+    p_maxima: float         # m, separación máxima recomendada
+    separacion_media: float # m, distancia media al vecino más cercano
+    separacion_max: float   # m, la mayor distancia al vecino más cercano
+    cobertura_media: float  # m² por punto
+    cobertura_max: float
+    recomendados: int       # puntos de la malla recomendada
+
+    @property
+    def cumple(self):
+        return self.puntos >= self.recomendados and self.separacion_max <= self.p_maxima
+
+
+# ── Escala ────────────────────────────────────────────────────────────────────
+
+def calibracion(p1, p2, metros):
+    """Escala de un plano: dos puntos normalizados y la distancia real entre ellos."""
+    return {"p1": [float(p1[0]), float(p1[1])], "p2": [float(p2[0]), float(p2[1])], "metros": float(metros)}
+
+
+def metros_por_px(escala, ancho_px, alto_px):
+    """Metros por píxel de la imagen, o None si el plano no está calibrado."""
+    if not escala: return None
+    (x1, y1), (x2, y2) = escala["p1"], escala["p2"]
+    px = math.hypot((x2 - x1) * ancho_px, (y2 - y1) * alto_px)
+    return escala["metros"] / px if px > 0 and escala.get("metros", 0) > 0 else None
+
+
+def a_metros(normalizados, ancho_px, alto_px, m_px):
+    """(n, 2) metros de puntos (xn, yn) normalizados."""
+    return np.asarray(normalizados, dtype="float64").reshape(-1, 2) * (ancho_px * m_px, alto_px * m_px)
+
+
+# ── Polígonos ─────────────────────────────────────────────────────────────────
+
+def area_poligono(pol):
+    x, y = pol[:, 0], pol[:, 1]
+    return abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2
+
+
+def dentro(xy, pol):
+    """(n,) bool: qué puntos caen dentro del polígono (cruce de rayos, vectorizado)."""
+    x, y = xy[:, :1], xy[:, 1:]
+    x1, y1 = pol[:, 0], pol[:, 1]; x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cruza = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+    return cruza.sum(axis=1) % 2 == 1
+
+
+# ── Malla ─────────────────────────────────────────────────────────────────────
+
+def separacion_maxima(d):
+    """Separación máxima entre puntos de la malla para un recinto de lado mayor d (m):
+    p = 0.2·5^log10(d)."""
+    return min(P_MAXIMA, 0.2 * 5 ** math.log10(max(d, 1e-3)))
+
+
+def vecino_mas_cercano(xy, bloque=512):
+    """(n,) distancia de cada punto a su vecino más cercano, por bloques de filas."""
+    n = len(xy)
+    if n < 2: return np.full(n, np.nan)
+    res = np.empty(n)
+    for i in range(0, n, bloque):
+        d2 = ((xy[i:i + bloque, None, :] - xy[None, :, :]) ** 2).sum(axis=2)
+        d2[np.arange(len(d2)), np.arange(i, i + len(d2))] = np.inf
+        res[i:i + bloque] = np.sqrt(d2.min(axis=1))
+    return res
+
+
+def cobertura(xy, pol):
+    """(n,) m² del recinto más cercanos a cada punto (Voronoi sobre una retícula)."""
+    n = len(xy)
+    if not n: return np.zeros(0)
+    (x0, y0), (x1, y1) = pol.min(axis=0), pol.max(axis=0)
+    celdas = max(2000, min(40000, CELDAS_COBERTURA // n))
+    lado = math.sqrt(max((x1 - x0) * (y1 - y0), 1e-9) / celdas)
+    gx = np.arange(x0 + lado / 2, x1, lado); gy = np.arange(y0 + lado / 2, y1, lado)
+    c = np.stack(np.meshgrid(gx, gy), axis=-1).reshape(-1, 2)
+    c = c[dentro(c, pol)]
+    # |c − x|² = |c|² − 2·c·x + |x|²; |c|² no cambia el más cercano de cada celda
+    cerca = ((xy ** 2).sum(axis=1)[None, :] - 2 * c @ xy.T).argmin(axis=1)
+    return np.bincount(cerca, minlength=n) * lado * lado
+
+
+def malla_recomendada(pol):
+    """(k, 2) metros de los centros de la malla recomendada dentro del recinto."""
+    (x0, y0), (x1, y1) = pol.min(axis=0), pol.max(axis=0)
+    L, W = x1 - x0, y1 - y0
+    p = separacion_maxima(max(L, W))
+    nx, ny = max(1, math.ceil(L / p)), max(1, math.ceil(W / p))
+    gx = x0 + (np.arange(nx) + 0.5) * L / nx; gy = y0 + (np.arange(ny) + 0.5) * W / ny
+    c = np.stack(np.meshgrid(gx, gy), axis=-1).reshape(-1, 2)
+    return c[dentro(c, pol)]
+
+
+# ── Plano ─────────────────────────────────────────────────────────────────────
+
+def _recinto(pl):
+    """Vértices normalizados del recinto: el dibujado en el plano o la imagen completa."""
+    r = pl.get("recinto") or []
+    return tuple(tuple(map(float, v)) for v in r) if len(r) >= 3 else RECINTO_COMPLETO
+
+
+@lru_cache(maxsize=128)
+def _resumen(puntos, recinto, ancho_px, alto_px, m_px):
+    pol = a_metros(recinto, ancho_px, alto_px, m_px)
+    xy = a_metros(puntos, ancho_px, alto_px, m_px) if puntos else np.zeros((0, 2))
+    xy = xy[dentro(xy, pol)] if len(xy) else xy
+    L, W = pol.max(axis=0) - pol.min(axis=0)
+    vec = vecino_mas_cercano(xy); cob = cobertura(xy, pol)
+    largo, ancho = max(L, W), min(L, W)
+    return ResumenGeometria(
+        round(area_poligono(pol), 2), round(float(largo), 2), round(float(ancho), 2), len(xy),
+        round(separacion_maxima(largo), 2),
+        round(float(np.nanmean(vec)), 2) if len(xy) > 1 else 0.0,
+        round(float(np.nanmax(vec)), 2) if len(xy) > 1 else 0.0,
+        round(float(cob.mean()), 2) if len(cob) else 0.0,
+        round(float(cob.max()), 2) if len(cob) else 0.0,
+        len(malla_recomendada(pol)))
+
+
+def resumen(pl, ancho_px, alto_px):
+    """ResumenGeometria de un plano calibrado, o None si no tiene escala."""
+    m_px = metros_por_px(pl.get("escala"), ancho_px, alto_px)
+    if m_px is None: return None
+    return _resumen(tuple(tuple(map(float, p)) for p in pl.get("puntos", [])), _recinto(pl),
+                    ancho_px, alto_px, m_px)
+
+
+def malla_plano(pl, ancho_px, alto_px):
+    """[(xn, yn)] de la malla recomendada para el recinto del plano ([] sin escala)."""
+    m_px = metros_por_px(pl.get("escala"), ancho_px, alto_px)
+    if m_px is None: return []
+    c = malla_recomendada(a_metros(_recinto(pl), ancho_px, alto_px, m_px)) / (ancho_px * m_px, alto_px * m_px)
+    return [(round(float(x), 6), round(float(y), 6)) for x, y in c]
+
+
+@lru_cache(maxsize=128)
+def _cobertura_puntos(puntos, recinto, ancho_px, alto_px, m_px):
+    pol = a_metros(recinto, ancho_px, alto_px, m_px)
+    return tuple(float(v) for v in cobertura(a_metros(puntos, ancho_px, alto_px, m_px), pol)) if puntos else ()
+
+
+def areas_filas(pl):
+    """m² del recinto que representa cada fila de pl["data"] (la cobertura de su punto),
+    o None si el plano no tiene imagen o no está calibrado."""
+    img = pl.get("img")
+    if img is None: return None
+    m_px = metros_por_px(pl.get("escala"), img.width, img.height)
+    if m_px is None: return None
+    cob = _cobertura_puntos(tuple(tuple(map(float, p)) for p in pl.get("puntos", [])), _recinto(pl),
+                            img.width, img.height, m_px)
+    return [cob[d["Número"] - 1] if 0 < d.get("Número", 0) <= len(cob) else 0.0 for d in pl.get("data", [])]
@@ -0,0 +1,138 @@
+"""
+imagenes_informe.py  —  LuxOMeter PRO / RETILAP 2024
+Preparación de los planos anotados para los informes PDF y Word.
+Cada plano se dibuja, se reduce al tamaño en que se muestra (sin pasar de
+DPI_MAXIMO) y se codifica en PNG o JPEG según su contenido, una sola vez por
+lote de exportación; los planos de un proyecto se procesan en paralelo
+(Pillow libera el GIL al redimensionar y codificar).
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from memoria_sesion import MemoriaSesion
+from recursos import compartido
+
+DPI_MAXIMO = 150                # más resolución no se aprecia impresa ni en pantalla
+ANCHO_PDF_CM = 25.5             # pw del PDF: carta horizontal menos márgenes de 1.2 cm
+ANCHO_WORD_CM = 22.0            # Cm(22) de los planos en el informe Word
+COLORES_PLANO = 4096            # más colores distintos que esto = escaneo o foto -> JPEG
+CALIDAD_JPEG = 82
+HILOS = min(8, os.cpu_count() or 2)
+RUTA_FUENTE = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+MAX_CACHE_MB = 128              # caché propia si no se comparte la MemoriaSesion de la app
+
+
+def ancho_px(ancho_cm, dpi=DPI_MAXIMO):
+    """Píxeles necesarios para mostrar una imagen a ancho_cm sin pasar de dpi."""
+    return int(round(ancho_cm / 2.54 * dpi))
+
+
+ANCHO_IMPRESION = ancho_px(ANCHO_PDF_CM)
+
+
+@compartido("fuente_planos", medir=lambda f: os.path.getsize(RUTA_FUENTE) if hasattr(f, "path") else 0)
+def fuente(tam):
+    """Fuente de los números de punto, una por tamaño para todo el proceso."""
+    try: return ImageFont.truetype(RUTA_FUENTE, tam)
+    except OSError: return ImageFont.load_default()
+
+
+class PlanoPreparado(NamedTuple):
+    datos: bytes
+    ancho: int
+    alto: int
+    formato: str
+
+
+def dibujar_puntos(img, data_rows):
+    draw_img = img.copy()
+    if not data_rows: return draw_img
+    draw = ImageDraw.Draw(draw_img)
+    lado = min(draw_img.width, draw_img.height)
+    radio = max(10, min(22, int(lado*0.012)))
+    fsize = max(9, min(16, radio-1))
+    font = fuente(fsize)
+    for row in data_rows:
+        try:
+            raw = str(row["Coordenadas"]).strip("()").split(", ")
+            cx, cy = float(raw[0]), float(raw[1])
+            x = int(cx*draw_img.width) if cx <= 1.0 else int(cx)
+            y = int(cy*draw_img.height) if cy <= 1.0 else int(cy)
+            clr = row.get("Color", "gray")
+            draw.ellipse((x-radio-1, y-radio-1, x+radio+1, y+radio+1), fill="white")
+            draw.ellipse((x-radio, y-radio, x+radio, y+radio), fill=clr)
+            txt = str(row["Número"])
+            bb = font.getbbox(txt); tw, th = bb[2]-bb[0], bb[3]-bb[1]
+            tx, ty = x-tw//2, y-th//2-1
+            for dx, dy in [(-1,-1), (1,-1), (-1,1), (1,1)]: draw.text((tx+dx, ty+dy), txt, fill="black", font=font)
+            draw.text((tx, ty), txt, fill="white", font=font)
+        except: pass
+    return draw_img
+
+
+def firma_puntos(data_rows):
+    """Lo que se dibuja sobre el plano: número, posición y color de cada punto."""
+    return tuple((d.get("Número"), d.get("Coordenadas"), d.get("Color")) for d in data_rows)
+
+
+def codificar(img):
+    """Elige el formato por contenido: un plano dibujado (pocos colores) va en PNG de
+    paleta, sin artefactos en líneas y textos; un escaneo o foto va en JPEG."""
+    rgb = img.convert("RGB")
+    muestra = rgb.reduce(4) if min(rgb.size) >= 64 else rgb
+    buf = io.BytesIO()
+    if muestra.getcolors(COLORES_PLANO) is None:
+        rgb.save(buf, format="JPEG", quality=CALIDAD_JPEG, optimize=True); fmt = "JPEG"
+    else:
+        rgb.quantize(256, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG"); fmt = "PNG"
+    return buf.getvalue(), fmt
+
+
+def preparar_plano(img, data_rows, ancho=ANCHO_IMPRESION):
+    """Plano anotado, reducido a 'ancho' px como máximo y codificado según su contenido."""
+    an = dibujar_puntos(img, data_rows)
+    if an.width > ancho:
+        an = an.resize((ancho, int(an.height*ancho/an.width)), Image.LANCZOS)
+    datos, fmt = codificar(an)
+    return PlanoPreparado(datos, an.width, an.height, fmt)
+
+
+class PreparadorPlanos:
+    """Prepara los planos anotados de un proyecto en un pool de hilos y recuerda el
+    resultado por (imagen, marcadores, ancho), así el PDF y el Word del mismo
+    proyecto comparten cada plano y no se re-procesa mientras no cambie. Lo preparado
+    se guarda en la MemoriaSesion (tipo "preparado", costo = bytes codificados), así
+    cuenta contra el mismo presupuesto que las imágenes y fotos de la sesión."""
+
+    def __init__(self, memoria=None):
+        self._memoria = memoria or MemoriaSesion(None, MAX_CACHE_MB * 2**20)
+
+    def preparar(self, planos, ancho=ANCHO_IMPRESION, recordar=True):
+        """{nombre: plano_info} -> {nombre: PlanoPreparado} de los planos con imagen y mediciones,
+        en el mismo orden. Con recordar=False usa lo que ya haya en caché pero no guarda
+        lo nuevo (p. ej. un PDF a disco que no debe retener todos sus planos)."""
+        res, pendientes = {}, {}
+        for pln, pi in planos.items():
+            img, rows = pi.get("img"), pi.get("data")
+            if not img or not rows: continue
+            clave = (id(img), firma_puntos(rows), ancho)
+            previo = self._memoria.recordado("preparado", clave)   # (img, PlanoPreparado); img mantiene vivo el id
+            if previo and previo[0] is img: res[pln] = previo[1]
+            else: pendientes[pln] = (clave, img, rows)
+        if pendientes:
+            if len(pendientes) == 1:        # un solo plano (PDF a disco): sin pool
+                hechos = {pln: preparar_plano(img, rows, ancho) for pln, (_, img, rows) in pendientes.items()}
+            else:
+                with ThreadPoolExecutor(max_workers=min(HILOS, len(pendientes))) as ex:
+                    futuros = {pln: ex.submit(preparar_plano, img, rows, ancho)
+                               for pln, (_, img, rows) in pendientes.items()}
+                    hechos = {pln: f.result() for pln, f in futuros.items()}
+            res.update(hechos)
+            if recordar:
+                for pln, (clave, img, _) in pendientes.items():
+                    self._memoria.recordar("preparado", clave, (img, hechos[pln]), len(hechos[pln].datos))
+        return {pln: res[pln] for pln in planos if pln in res}
@@ -0,0 +1,159 @@
+"""
+importar_lecturas.py  —  LuxOMeter PRO / RETILAP 2024
+Importación masiva de lecturas desde archivos de registro de luxómetros
+(CSV / XLSX). Las lecturas se cargan como arreglos numpy (sin un objeto Python
+por muestra), se convierten a lux y se reparten en grupos de 4 por punto,
+por secuencia o por pausas en las marcas de tiempo.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+# Factores de conversión a lux
+UNIDADES = {"lx": 1.0, "klx": 1000.0, "fc": 10.7639}
+_ALIAS_UNIDAD = {"lux": "lx", "lx": "lx", "klux": "klx", "klx": "klx",
+                 "fc": "fc", "ftcd": "fc", "foot-candle": "fc", "footcandle": "fc"}
+
+RANGO_VALIDO = (0.0, 200000.0)   # lx; fuera de esto es error del equipo o de lectura
+Z_ATIPICO = 3.5                  # z robusto (mediana/MAD) dentro de las 4 lecturas
+DESVIO_MIN = 0.2                 # y además a más del 20 % de la mediana del punto
+MODOS = ["Secuencia (4 lecturas por punto)", "Marca de tiempo (pausas entre puntos)"]
+
+
+# ── Lectura del archivo ───────────────────────────────────────────────────────
+
+def _es_xlsx(nombre):
+    return str(nombre).lower().endswith((".xlsx", ".xlsm"))
+
+
+def _bytes(archivo):
+    if isinstance(archivo, (bytes, bytearray)): return bytes(archivo)
+    if hasattr(archivo, "getvalue"): return archivo.getvalue()
+    if hasattr(archivo, "read"):
+        archivo.seek(0); return archivo.read()
+    with open(archivo, "rb") as f: return f.read()
+
+
+def _separador(muestra):
+    linea = muestra.split(b"\n", 1)[0]
+    return max([b";", b",", b"\t"], key=linea.count).decode()
+
+
+def columnas_registro(archivo, nombre):
+    """Encabezados del archivo, para armar el mapeo de columnas en la UI."""
+    datos = _bytes(archivo)
+    if _es_xlsx(nombre):
+        from openpyxl import load_workbook
+        wb = load_workbook(io.BytesIO(datos), read_only=True, data_only=True)
+        try:
+            fila = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+            return [str(c) for c in fila if c is not None]
+        finally: wb.close()
+    return list(pd.read_csv(io.BytesIO(datos), sep=_separador(datos[:4096]),
+                            nrows=0, encoding_errors="replace").columns)
+
+
+def leer_registro(archivo, nombre, col_lux, col_tiempo=None, unidad="lx",
+                  col_unidad=None, decimal="."):
+    """Lecturas en lux (float64) y marcas de tiempo (datetime64[ns] o None).
+    unidad se usa cuando no hay columna de unidad o su valor no se reconoce."""
+    datos = _bytes(archivo)
+    cols = [c for c in (col_lux, col_tiempo, col_unidad) if c]
+    if _es_xlsx(nombre):
+        df = _leer_xlsx(datos, cols)
+    else:
+        df = pd.read_csv(io.BytesIO(datos), sep=_separador(datos[:4096]), usecols=cols,
+                         decimal=decimal, encoding_errors="replace", low_memory=False)
+    lux = pd.to_numeric(df[col_lux], errors="coerce").to_numpy(dtype="float64")
+    factor = np.full(len(lux), UNIDADES.get(unidad, 1.0))
+    if col_unidad:
+        u = df[col_unidad].astype("string").str.strip().str.lower().map(_ALIAS_UNIDAD)
+        for k, f in UNIDADES.items(): factor[(u == k).to_numpy(dtype=bool, na_value=False)] = f
+    lux = lux * factor
+    tiempos = None
+    if col_tiempo:
+        tiempos = pd.to_datetime(df[col_tiempo], errors="coerce", dayfirst=True).to_numpy()
+    return lux, tiempos
+
+
+def _leer_xlsx(datos, cols):
+    """Hoja en modo read-only; solo se materializan las columnas pedidas."""
+    from openpyxl import load_workbook
+    wb = load_workbook(io.BytesIO(datos), read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        enc = [str(c) if c is not None else "" for c in next(filas, ())]
+        idx = [enc.index(c) for c in cols]
+        valores = {c: [] for c in cols}
+        for fila in filas:
+            for c, i in zip(cols, idx):
+                valores[c].append(fila[i] if i < len(fila) else None)
+        return pd.DataFrame(valores)
+    finally: wb.close()
+
+
+# ── Asignación a puntos ───────────────────────────────────────────────────────
+
+def agrupar_por_secuencia(lux, n_puntos):
+    """Cada 4 lecturas válidas consecutivas forman un punto. Devuelve (n, 4)."""
+    validas = lux[~np.isnan(lux)]
+    n = min(n_puntos, len(validas) // 4)
+    return validas[:n*4].reshape(n, 4), np.full(n, 4)
+
+
+def agrupar_por_tiempo(lux, tiempos, pausa_s, n_puntos):
+    """Una pausa mayor que pausa_s entre muestras abre un punto nuevo. Cada ráfaga
+    se divide en 4 tramos consecutivos y se toma la mediana de cada tramo."""
+    ok = ~np.isnan(lux) & ~pd.isna(tiempos)
+    lux, t = lux[ok], tiempos[ok].astype("datetime64[ns]")
+    if not len(lux): return np.empty((0, 4)), np.empty(0, dtype=int)
+    orden = np.argsort(t, kind="stable"); lux, t = lux[orden], t[orden]
+    saltos = np.diff(t).astype("timedelta64[ms]").astype("int64") > pausa_s * 1000
+    inicios = np.concatenate(([0], np.flatnonzero(saltos) + 1))
+    fines = np.concatenate((inicios[1:], [len(lux)]))
+    inicios, fines = inicios[:n_puntos], fines[:n_puntos]
+    tam = fines - inicios
+    res = np.full((len(inicios), 4), np.nan)
+    # límites de los 4 tramos de cada ráfaga: ini + k*tam//4, k = 0..4
+    cortes = inicios[:, None] + (tam[:, None] * np.arange(5)) // 4
+    for j in np.flatnonzero(tam >= 4):
+        c = cortes[j]
+        res[j] = [np.median(lux[c[k]:c[k+1]]) for k in range(4)]
+    return res, tam
+
+
+def validar(lecturas):
+    """Alertas por punto: lecturas fuera de rango o atípicas frente a las otras 3."""
+    m = np.asarray(lecturas, dtype="float64")
+    fuera = (m < RANGO_VALIDO[0]) | (m > RANGO_VALIDO[1]) | np.isnan(m)
+    med = np.nanmedian(m, axis=1, keepdims=True) if len(m) else m
+    mad = np.nanmedian(np.abs(m - med), axis=1, keepdims=True) if len(m) else m
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.abs(m - med) / (1.4826 * mad)
+    atipico = (z > Z_ATIPICO) & (mad > 0) & (np.abs(m - med) > DESVIO_MIN * med) & ~fuera
+    alertas = []
+    for k in range(len(m)):
+        a = []
+        if fuera[k].any(): a.append("fuera de rango")
+        if atipico[k].any(): a.append("lectura atípica: " + ", ".join(f"Lux {i+1}" for i in np.flatnonzero(atipico[k])))
+        alertas.append("; ".join(a))
+    return alertas, fuera.any(axis=1)
+
+
+def asignar_lecturas(lux, tiempos, n_puntos, modo, desde=1, pausa_s=5.0):
+    """Tabla de vista previa: una fila por punto desde el N° 'desde'."""
+    n_disp = max(0, n_puntos - desde + 1)
+    if modo == MODOS[1]:
+        if tiempos is None: raise ValueError("El modo por tiempo requiere una columna de tiempo")
+        lect, muestras = agrupar_por_tiempo(lux, tiempos, pausa_s, n_disp)
+    else:
+        lect, muestras = agrupar_por_secuencia(lux, n_disp)
+    alertas, invalido = validar(lect)
+    incompleto = np.isnan(lect).any(axis=1) if len(lect) else np.zeros(0, dtype=bool)
+    df = pd.DataFrame(np.round(lect, 1), columns=["Lux 1", "Lux 2", "Lux 3", "Lux 4"])
+    df.insert(0, "Punto", np.arange(desde, desde + len(lect)))
+    df["Muestras"] = muestras
+    df["Alertas"] = [a or ("incompleto" if inc else "") for a, inc in zip(alertas, incompleto)]
+    df["Aplicar"] = ~(invalido | incompleto)
+    return df
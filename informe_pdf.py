@@ -0,0 +1,370 @@
+"""
+informe_pdf.py  —  LuxOMeter PRO / RETILAP 2024
+Motor de maquetación del informe PDF (ReportLab). Estilos de párrafo y de tabla
+armados una vez por proceso; plantilla de página apaisada con encabezado y pie;
+tabla de puntos con celdas de texto plano en las columnas numéricas, fondos por
+reglas (ROWBACKGROUNDS y tramos de la columna de interpretación) en lugar de
+cinco comandos por fila, y partida en bloques para que ReportLab no vuelva a
+medir todas las filas restantes en cada salto de página. Las secciones por
+plano se generan al llegar a ellas (Diferido), y el documento puede escribirse
+directo a un archivo en lugar de a memoria.
+"""
+import io
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm, inch
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.platypus import (BaseDocTemplate, Flowable, Frame, HRFlowable, Image as RLImage, PageBreak,
+                                PageTemplate, Paragraph, Spacer, Table, TableStyle)
+
+from diagnostico import etapa
+from recursos import compartido
+
+PAGINA = landscape(letter)
+MARGEN = 1.2 * cm
+ANCHO_UTIL = PAGINA[0] - 2 * MARGEN
+FILAS_POR_BLOQUE = 100      # par: la alternancia de fondos sigue igual de un bloque al siguiente
+
+
+# ── Estilos ───────────────────────────────────────────────────────────────────
+
+@compartido("estilos_pdf")
+def estilos_pdf():
+    """Estilos de párrafo y colores del PDF: se arman una vez por proceso y se
+    comparten, solo lectura, entre sesiones y trabajos en segundo plano."""
+    S = getSampleStyleSheet()
+    E = dict(
+        AZ_OSC=colors.HexColor('#1a3a5c'), AZ_CLA=colors.HexColor('#d6e4f0'), GR_CLA=colors.HexColor('#f0f4f8'),
+        VERDE=colors.HexColor('#27ae60'), ROJO=colors.HexColor('#e74c3c'), BLANCO=colors.white)
+    E.update(
+        eTi=ParagraphStyle('T', parent=S['Title'], fontSize=14,
+                           textColor=colors.HexColor('#1a3a5c'), alignment=TA_CENTER),
+        eSu=ParagraphStyle('S', parent=S['Normal'], fontSize=9,
+                           textColor=colors.HexColor('#2c6fad'), alignment=TA_CENTER),
+        eSe=ParagraphStyle('H', parent=S['Heading2'], fontSize=10,
+                           textColor=colors.HexColor('#1a3a5c'), spaceBefore=6, spaceAfter=3),
+        eNo=ParagraphStyle('N', parent=S['Normal'], fontSize=8, spaceAfter=3),
+        ePi=ParagraphStyle('P', parent=S['Normal'], fontSize=7,
+                           textColor=colors.grey, alignment=TA_CENTER),
+        eCe=ParagraphStyle('C', parent=S['Normal'], fontSize=6, alignment=TA_CENTER, leading=7.5),
+        eIz=ParagraphStyle('I', parent=S['Normal'], fontSize=6, alignment=TA_LEFT, leading=7.5),
+        eRE=ParagraphStyle('RE', parent=S['Heading1'], fontSize=12,
+                           textColor=E["AZ_OSC"], spaceBefore=6, spaceAfter=4, alignment=1))
+    for k, c in (("eCL_ok", E["VERDE"]), ("eCL_mal", E["ROJO"])):
+        E[k] = ParagraphStyle('CL', parent=S['Normal'], fontSize=8.5, textColor=c, spaceBefore=4, spaceAfter=4)
+    return E
+
+
+# Tabla de puntos: encabezado en texto plano (inmutable, se comparte entre hilos)
+ENCABEZADO_PUNTOS = (
+    "N°\nMed", "Puesto de trabajo\no Área evaluada", "Descripción", "E\nMIN\n(lx)", "E\nMAX\n(lx)",
+    "Promedio\nmedido\n(lx)", "Valor\nUo", "Interp.\nUo", "Tipo de Área\nRETILAP", "Em\nrec.\n(lx)",
+    "Interpretación\nNivel de\nIluminancia", "Observaciones /\nRecomendaciones")
+ANCHOS_PUNTOS = tuple(x * cm for x in (0.9, 3.2, 2.5, 1.1, 1.1, 1.3, 1.1, 1.1, 3.2, 1.1, 2.0, 3.5))
+COL_INTERPRETACION = 10
+
+
+@compartido("estilo_tabla_puntos")
+def estilo_tabla_puntos():
+    """Reglas fijas de la tabla de puntos; por bloque solo se agregan los tramos de color
+    de la columna de interpretación."""
+    E = estilos_pdf(); ci = COL_INTERPRETACION
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), E["AZ_OSC"]), ('TEXTCOLOR', (0, 0), (-1, 0), E["BLANCO"]),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 6), ('LEADING', (0, 0), (-1, -1), 7.5),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.3, E["AZ_CLA"]),
+        ('TOPPADDING', (0, 0), (-1, -1), 2), ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('LEFTPADDING', (0, 0), (-1, -1), 2), ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+        ('ALIGN', (2, 1), (2, -1), 'LEFT'), ('ALIGN', (11, 1), (11, -1), 'LEFT'),
+        ('ALIGN', (1, 1), (1, -1), 'LEFT'), ('ALIGN', (8, 1), (8, -1), 'LEFT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [E["BLANCO"], E["GR_CLA"]]),
+        ('TEXTCOLOR', (ci, 1), (ci, -1), E["BLANCO"]), ('FONTNAME', (ci, 1), (ci, -1), 'Helvetica-Bold'),
+    ])
+
+
+# ── Tabla de puntos ───────────────────────────────────────────────────────────
+
+class Celda(Paragraph):
+    """Paragraph de celda que recuerda su ajuste de línea: la Table lo mide al calcular
+    alturas, otra vez en cada salto de página y otra al dibujarlo, siempre con el mismo
+    ancho de columna."""
+
+    def wrap(self, availWidth, availHeight):
+        memo = getattr(self, "_memo", None)
+        if memo and memo[0] == availWidth: return memo[1]
+        r = super().wrap(availWidth, availHeight); self._memo = (availWidth, r)
+        return r
+
+
+def _texto(v):
+    return "" if v is None else str(v)
+
+
+def _ajustado(texto, col):
+    """Texto sin marcado partido en líneas al ancho de la columna: una celda de texto
+    plano, sin el parser ni el ajuste de Paragraph."""
+    return "\n".join(simpleSplit(texto, "Helvetica", 6, ANCHOS_PUNTOS[col] - 4))
+
+
+def fila_puntos(m, E):
+    """Celdas de una fila del modelo: texto plano salvo la descripción y las observaciones,
+    que llevan negrita."""
+    eIz = E["eIz"]
+    desc = Celda(
+        f"Tipo Ilum.: <b>{m['tipo_iluminacion']}</b><br/>"
+        f"Lámpara: <b>{m['tipo_lampara']}</b><br/>"
+        f"Ubic.: <b>{m['ubicacion_luminaria']}</b><br/>"
+        f"Ctrl. Luz Nat.: <b>{m['control_luz_natural']}</b><br/>"
+        f"Altura (m): <b>{m['altura_luminaria']}</b>", eIz)
+    obs = Celda(f"<b>Obs.:</b> {m['nota']}<br/><b>Rec.:</b> {m['recomendacion']}", eIz)
+    return [
+        _texto(m["num"]),
+        _ajustado(str(m["puesto_evaluado"]) or str(m["area"]), 1),
+        desc,
+        _texto(m["e_min"]),
+        _texto(m["e_max"]),
+        _texto(m["promedio"]),
+        _texto(m["uo_calc"]),
+        _texto(m["interpretacion_uo"]),
+        _ajustado(str(m["area"]), 8),
+        _texto(m["em_req"]),
+        "ADECUADO" if m["conforme"] else "DEFICIENTE",
+        obs,
+    ]
+
+
+def _tramos_interpretacion(conformes, E):
+    """BACKGROUND de la columna de interpretación por tramos de filas con el mismo resultado."""
+    ci = COL_INTERPRETACION; cmds = []; ini = 0
+    for i in range(1, len(conformes) + 1):
+        if i == len(conformes) or conformes[i] != conformes[ini]:
+            cmds.append(('BACKGROUND', (ci, ini + 1), (ci, i), E["VERDE"] if conformes[ini] else E["ROJO"]))
+            ini = i
+    return cmds
+
+
+def en_bloques(encabezado, filas, anchos, estilo, extra=None, bloque=FILAS_POR_BLOQUE):
+    """Una tabla larga como varias Table de 'bloque' filas, cada una con el encabezado
+    repetido en sus saltos de página. extra(i, j) da comandos de estilo propios del
+    bloque filas[i:j]."""
+    tablas = []
+    for i in range(0, len(filas), bloque):
+        j = min(i + bloque, len(filas))
+        t = Table([list(encabezado)] + filas[i:j], colWidths=anchos, repeatRows=1)
+        t.setStyle(estilo)
+        if extra: t.setStyle(TableStyle(extra(i, j)))
+        tablas.append(t)
+    return tablas
+
+
+def tabla_puntos(mediciones, bloque=FILAS_POR_BLOQUE):
+    """Flowables de la tabla RETILAP de un plano (filas del modelo del informe)."""
+    E = estilos_pdf()
+    conformes = [m["conforme"] for m in mediciones]
+    return en_bloques(ENCABEZADO_PUNTOS, [fila_puntos(m, E) for m in mediciones], ANCHOS_PUNTOS,
+                      estilo_tabla_puntos(), lambda i, j: _tramos_interpretacion(conformes[i:j], E), bloque)
+
+
+# ── Documento ─────────────────────────────────────────────────────────────────
+
+class Diferido(Flowable):
+    """Marcador en la historia que DocumentoInforme reemplaza por generar() justo antes
+    de maquetarlo: los flowables de cada plano (imagen incluida) existen solo mientras
+    se componen sus páginas, no durante todo el build."""
+
+    def __init__(self, generar):
+        super().__init__(); self.generar = generar
+
+    def wrap(self, availWidth, availHeight):
+        raise RuntimeError("Diferido fuera de DocumentoInforme")
+
+
+class DocumentoInforme(BaseDocTemplate):
+    """Hoja carta apaisada con encabezado (empresa y orden) y pie (fecha y página).
+    en_pagina(doc) se llama al empezar cada página, p. ej. para publicar el avance."""
+
+    def __init__(self, archivo, general=None, en_pagina=None, **kw):
+        super().__init__(archivo, pagesize=PAGINA, leftMargin=MARGEN, rightMargin=MARGEN,
+                         topMargin=MARGEN, bottomMargin=MARGEN, **kw)
+        g = general or {}
+        self._encabezado = " · ".join(x for x in (g.get("nombre_empresa", ""),
+                                                   f"OT {g['numero_orden']}" if g.get("numero_orden") else "") if x)
+        self._generado = datetime.now().strftime('%d/%m/%Y %H:%M')
+        self._en_pagina = en_pagina
+        marco = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id="cuerpo")
+        self.addPageTemplates([PageTemplate(id="apaisada", frames=[marco], onPage=self._decorar)])
+
+    def filterFlowables(self, flowables):
+        while flowables and isinstance(flowables[0], Diferido):
+            flowables[0:1] = list(flowables[0].generar())
+
+    def _decorar(self, canv, doc):
+        w, h = PAGINA
+        canv.saveState(); canv.setFont("Helvetica", 6.5); canv.setFillColor(colors.grey)
+        y_sup = h - MARGEN + 0.45 * cm; y_inf = MARGEN - 0.6 * cm
+        canv.drawString(MARGEN, y_sup, "LuxOMeter PRO · Estudio de luxometría RETILAP 2024")
+        if self._encabezado: canv.drawRightString(w - MARGEN, y_sup, self._encabezado)
+        canv.drawString(MARGEN, y_inf, f"Generado: {self._generado}")
+        canv.drawRightString(w - MARGEN, y_inf, f"Página {doc.page}")
+        canv.restoreState()
+        if self._en_pagina: self._en_pagina(doc)
+
+
+# ── Informe ───────────────────────────────────────────────────────────────────
+
+def _ficha(g, E):
+    eIz = E["eIz"]
+    def par(k, v): return [Paragraph(f"<b>{k}</b>", eIz), Paragraph(v, eIz)]
+    filas = [
+        par("Empresa:", g.get("nombre_empresa", "")) + par("NIT:", g.get("nit", "")) +
+        par("N° Orden:", g.get("numero_orden", "")),
+        par("Dirección:", g.get("direccion", "")) + par("Ciudad:", g.get("sede", "")) +
+        par("Fecha:", g.get("fecha", "")),
+        par("Higienista:", g.get("responsable_higienista", "")) + par("Lic. SST:", g.get("resolucion", "")) +
+        par("Responsable:", g.get("responsable_empresa", "")),
+    ]
+    t = Table(filas, colWidths=[2.2*cm, 5.8*cm] * 3)
+    t.setStyle(TableStyle([
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [E["GR_CLA"], E["BLANCO"]]),
+        ('GRID', (0, 0), (-1, -1), 0.3, E["AZ_CLA"]),
+        ('TOPPADDING', (0, 0), (-1, -1), 3), ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+    ]))
+    return t
+
+
+def _resumen(modelo, E):
+    """Resumen ejecutivo: totales, gráfica, puntos deficientes y conclusión."""
+    pw = ANCHO_UTIL; pct = modelo.pct; tot = modelo.total; conf = modelo.conformes
+    res = [Paragraph("RESUMEN EJECUTIVO", E["eRE"]),
+           HRFlowable(width="100%", thickness=1.5, color=E["AZ_OSC"]), Spacer(1, 0.06*inch)]
+
+    eCe = E["eCe"]
+    tR = Table([[Paragraph("<b>Total puntos</b>", eCe), Paragraph("<b>Adecuados</b>", eCe),
+                 Paragraph("<b>Deficientes</b>", eCe), Paragraph("<b>% Adecuados</b>", eCe)],
+                [str(tot), str(conf), str(tot - conf), f"{pct}%"]], colWidths=[pw/4]*4)
+    tR.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), E["AZ_OSC"]), ('TEXTCOLOR', (0, 0), (-1, 0), E["BLANCO"]),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'), ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'), ('GRID', (0, 0), (-1, -1), 0.4, E["AZ_CLA"]),
+        ('BACKGROUND', (0, 1), (-1, 1), E["GR_CLA"]),
+        ('TEXTCOLOR', (3, 1), (3, 1), E["VERDE"] if pct >= 80 else E["ROJO"]),
+        ('TOPPADDING', (0, 0), (-1, -1), 5), ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ]))
+    res += [tR, Spacer(1, 0.1*inch)]
+
+    graf = modelo.grafica()
+    if graf:
+        gw = pw*0.55; iw, ih = ImageReader(io.BytesIO(graf)).getSize()
+        res += [RLImage(io.BytesIO(graf), width=gw, height=gw*ih/iw), Spacer(1, 0.1*inch)]
+
+    est = modelo.estadisticas()
+    if est:
+        res += [Paragraph("<b>Estadísticas por tipo de área:</b>", E["eNo"]), Spacer(1, 0.04*inch)]
+        res += tabla_estadisticas(est, E) + [Spacer(1, 0.08*inch)]
+
+    deficientes = modelo.deficientes
+    if deficientes:
+        res += [Paragraph("<b>Puntos deficientes detectados:</b>", E["eNo"]), Spacer(1, 0.04*inch)]
+        filas = []
+        for m in deficientes:
+            prom = m["promedio"] or 0; em = m["em_req"] or 0
+            deficit = round(em - prom, 1) if em > prom else 0
+            filas.append([str(m["num"]), Paragraph(str(m["puesto_evaluado"] or m["area"]), E["eIz"]),
+                          f"{prom} lx", f"{em} lx", f"-{deficit} lx"])
+        res += en_bloques(("N°", "Puesto / Área", "Promedio medido", "Em requerida", "Déficit"), filas,
+                          [1.2*cm, pw*0.35, pw*0.18, pw*0.18, pw*0.15], TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), E["ROJO"]), ('TEXTCOLOR', (0, 0), (-1, 0), E["BLANCO"]),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7.5),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'), ('GRID', (0, 0), (-1, -1), 0.3, E["AZ_CLA"]),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.HexColor('#fff5f5'), E["BLANCO"]]),
+            ('TOPPADDING', (0, 0), (-1, -1), 3), ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+        ]))
+        res.append(Spacer(1, 0.06*inch))
+
+    estado = "SATISFACTORIO" if pct >= 80 else "REQUIERE MEJORAS"
+    res.append(Paragraph(
+        f"<b>Conclusión general:</b> El {pct}% de los puntos evaluados cumple con los "
+        f"niveles mínimos de iluminancia exigidos por la norma RETILAP 2024. "
+        f"Estado general: <b>{estado}</b>.", E["eCL_ok"] if pct >= 80 else E["eCL_mal"]))
+    return res
+
+
+def tabla_estadisticas(est, E):
+    """Tabla de Estadisticas (estadisticas.py): una fila por tipo de área y el total."""
+    pw = ANCHO_UTIL; eIz = E["eIz"]
+    columnas = est.columnas()
+    filas = [[Paragraph(f[0], eIz), *map(str, f[1:])] for f in est.tabla()]
+    n = len(columnas) - 1; anchos = [pw*0.28] + [pw*0.72/n]*n
+    encabezado = ["\n".join(simpleSplit(c, 'Helvetica-Bold', 6.5, w - 4)) for c, w in zip(columnas, anchos)]
+    return en_bloques(encabezado, filas, anchos, TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), E["AZ_OSC"]), ('TEXTCOLOR', (0, 0), (-1, 0), E["BLANCO"]),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 6.5),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('GRID', (0, 0), (-1, -1), 0.3, E["AZ_CLA"]),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [E["GR_CLA"], E["BLANCO"]]),
+        ('TOPPADDING', (0, 0), (-1, -1), 2), ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ]), lambda i, j: [('FONTNAME', (0, j - i), (-1, j - i), 'Helvetica-Bold')] if j == len(filas) else [])
+
+
+def escribir_pdf(modelo, destino=None, avance=None):
+    """Informe PDF del modelo: bytes, o con destino (ruta) lo escribe en ese archivo y
+    devuelve la ruta. avance(fracción, etapa) recibe el progreso.
+    Cada plano entra a la historia como Diferido. En memoria los planos se preparan
+    antes, todos en paralelo; hacia un archivo, uno a uno al llegar a cada sección y sin
+    guardarlos en la caché, para que la memoria no crezca con el número de planos."""
+    avance = avance or (lambda *a, **k: None)
+    E = estilos_pdf(); pw = ANCHO_UTIL; eNo = E["eNo"]
+
+    avance(0.05, "Resumen y gráfica")
+    story = [Paragraph("ESTUDIO DE LUXOMETRÍA – RETILAP 2024", E["eTi"]),
+             Paragraph("Auditoría de Iluminación en el Lugar de Trabajo", E["eSu"]),
+             Spacer(1, 0.1*inch), HRFlowable(width="100%", thickness=2, color=E["AZ_OSC"]),
+             Spacer(1, 0.07*inch), _ficha(modelo.general, E), Spacer(1, 0.08*inch)]
+    if modelo.total: story += _resumen(modelo, E)
+    story.append(PageBreak())
+
+    preparados = {}
+    if destino is None:
+        try:
+            avance(0.15, "Preparando planos")
+            with etapa("preparar_planos"): preparados = modelo.imagenes()
+        except Exception as e: story.append(Paragraph(f"(Error imagen: {e})", eNo))
+
+    def seccion(s):
+        avance(etapa=f"Plano: {s.nombre}")
+        sec = [Paragraph(f"Plano: {s.nombre}", E["eSe"]),
+               HRFlowable(width="100%", thickness=1, color=E["AZ_CLA"]), Spacer(1, 0.05*inch)]
+        prep = preparados.get(s.nombre)
+        if prep is None and destino is not None:
+            try:
+                with etapa("preparar_planos"): prep = modelo.imagen(s, recordar=False)
+            except Exception as e: sec.append(Paragraph(f"(Error imagen: {e})", eNo))
+        if prep:
+            sec += [RLImage(io.BytesIO(prep.datos), width=pw, height=min(pw*prep.alto/prep.ancho, 4*inch)),
+                    Spacer(1, 0.08*inch)]
+        if not s.mediciones: return sec + [Paragraph("Sin mediciones.", eNo), PageBreak()]
+        return sec + tabla_puntos(s.mediciones) + [Spacer(1, 0.1*inch), PageBreak()]
+
+    story += [Diferido(lambda s=s: seccion(s)) for s in modelo.secciones]
+    story += [HRFlowable(width="100%", thickness=1, color=colors.grey), Spacer(1, 0.05*inch),
+              Paragraph(f"RETILAP 2024 · Generado: {datetime.now().strftime('%d/%m/%Y %H:%M')}", E["ePi"])]
+
+    # ~25 filas por página más la del plano: solo para estimar el avance
+    paginas = 2 + sum(1 + len(s.mediciones)//25 for s in modelo.secciones)
+    ini = 0.3 if destino else 0.6; avance(ini, "Componiendo páginas")
+    buf = destino or io.BytesIO()
+    doc = DocumentoInforme(buf, modelo.general,
+                           en_pagina=lambda d: avance(min(0.98, ini + (0.98 - ini)*d.page/paginas)))
+    doc.build(story)
+    return destino or buf.getvalue()
@@ -0,0 +1,77 @@
+"""
+mediciones.py  —  LuxOMeter PRO / RETILAP 2024
+Cálculo de la fila de resultados de un punto (promedio, E min/max, Uo,
+conformidad) a partir de sus 4 lecturas, uno a uno o por lotes.
+"""
+import numpy as np
+
+from retilap import REFERENCIA as RETILAP_REFERENCIA
+
+# Opciones de los selectores del punto
+ILUM = ["Natural", "Artificial", "Mixta"]
+LAMP = ["LED", "Fluorescente", "Incandescente", "Halógeno", "Otro"]
+UBIC = ["Localizado", "Lateral", "Frontal", "Trasera", "Cenital", "SIA"]
+CONTROL_LUZ = ["N/A", "Persiana", "Cortina", "Black Out", "Solar Screen", "Polarizado"]
+
+# Campos descriptivos del punto (no dependen de las lecturas), con su valor por defecto
+DETALLE_DEFECTO = {
+    "TipoIluminacion": "Artificial", "TipoLampara": "LED", "PuestoEvaluado": "",
+    "UbicacionLuminaria": "Lateral", "ControlLuzNatural": "N/A", "AlturaLuminaria": "",
+    "Nota": "", "Recomendacion": "", "Foto": False,
+}
+
+
+def estado_punto(fila):
+    """⏳ sin resultado, ✅ conforme, ❌ no conforme."""
+    r = str((fila or {}).get("Resultado", ""))
+    return "✅" if "✅" in r else ("❌" if "❌" in r else "⏳")
+
+
+def _entrada(numero, xn, yn, tipo_area, meds, e_min, e_max, promedio, detalle):
+    em_req = RETILAP_REFERENCIA[tipo_area]["Em"]
+    uo_min = RETILAP_REFERENCIA[tipo_area]["Uo"]
+    e_medio = promedio
+    uo_calc = round(e_min/e_medio, 2) if e_medio > 0 else 0
+    conforme = promedio >= em_req
+    d = {**DETALLE_DEFECTO, **(detalle or {})}
+    return {
+        "Número": numero, "Coordenadas": f"({xn:.6f}, {yn:.6f})",
+        "TipoArea": tipo_area, "Em_req": em_req, "Uo_min": uo_min,
+        "Med1": meds[0], "Med2": meds[1], "Med3": meds[2], "Med4": meds[3],
+        "EMin": e_min, "EMax": e_max, "EMedio": e_medio,
+        "Promedio": promedio, "Uo_calc": uo_calc,
+        "InterpretacionUo": "U" if uo_calc >= uo_min else "NU",
+        "Resultado": "✅ Conforme" if conforme else "❌ No conforme",
+        "Color": "green" if conforme else "red",
+        "TipoIluminacion": d["TipoIluminacion"], "TipoLampara": d["TipoLampara"],
+        "PuestoEvaluado": d["PuestoEvaluado"], "UbicacionLuminaria": d["UbicacionLuminaria"],
+        "ControlLuzNatural": d["ControlLuzNatural"], "AlturaLuminaria": d["AlturaLuminaria"],
+        "Nota": str(d["Nota"]).strip(), "Recomendacion": str(d["Recomendacion"]).strip(),
+        "Foto": d["Foto"],
+    }
+
+
+def calcular_medicion(numero, xn, yn, tipo_area, meds, detalle=None):
+    """Fila de resultados de un punto, o None si falta alguna de las 4 lecturas."""
+    meds = [float(v) for v in meds]
+    if not all(v > 0 for v in meds): return None
+    promedio = round(sum(meds)/4, 1)
+    return _entrada(numero, xn, yn, tipo_area, meds,
+                    round(min(meds), 1), round(max(meds), 1), promedio, detalle)
+
+
+def calcular_mediciones(numeros, coords, tipos_area, lecturas, detalles=None):
+    """Versión por lotes: lecturas es un arreglo (n, 4). Las estadísticas se calculan
+    vectorizadas; devuelve una lista con la fila de cada punto o None si está incompleto."""
+    m = np.asarray(lecturas, dtype="float64").reshape(-1, 4)
+    validos = (m > 0).all(axis=1)
+    prom = m.sum(axis=1) / 4
+    e_min = m.min(axis=1); e_max = m.max(axis=1)
+    res = []
+    for k, num in enumerate(numeros):
+        if not validos[k]: res.append(None); continue
+        xn, yn = coords[k]
+        res.append(_entrada(int(num), xn, yn, tipos_area[k], m[k].tolist(),
+                            round(float(e_min[k]), 1), round(float(e_max[k]), 1),
+                            round(float(prom[k]), 1), detalles[k] if detalles else None))
+    return res
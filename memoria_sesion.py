@@ -0,0 +1,190 @@
+"""
+memoria_sesion.py  —  LuxOMeter PRO / RETILAP 2024
+Imágenes de plano y fotos fuera de st.session_state. Los proyectos en sesión
+guardan solo referencias (SHA-256 del archivo en el almacén de blobs) con los
+metadatos que usa la interfaz; las imágenes decodificadas y los bytes de las
+fotos viven en un LRU por sesión con presupuesto de bytes y se releen del
+almacén cuando se vuelven a pedir. Los planos anotados que se muestran y los
+preparados para informes comparten ese mismo presupuesto.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+SUBDIR = ".blobs"
+PRESUPUESTO_MB = float(os.environ.get("LUXOMETER_MEMORIA_SESION_MB", "96"))
+RETENCION_S = 30 * 24 * 3600    # blobs sin leer en este tiempo se borran al iniciar
+
+
+# ── Almacén ───────────────────────────────────────────────────────────────────
+
+class AlmacenBlobs:
+    """Archivos direccionados por contenido en <dir>/<2 hex>/<sha256>. Se deriva de los
+    JSON de proyecto (que siguen teniendo todo en base64), así que borrarlo con el
+    servidor detenido no pierde nada: se rehace al cargar cada proyecto."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._limpiar()
+
+    def _ruta(self, h):
+        return os.path.join(self.directorio, h[:2], h)
+
+    def guardar(self, datos):
+        h = hashlib.sha256(datos).hexdigest(); ruta = self._ruta(h)
+        if not os.path.exists(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            tmp = f"{ruta}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f: f.write(datos)
+            os.replace(tmp, ruta)
+        return h
+
+    def leer(self, h):
+        with self.abrir(h) as f: return f.read()
+
+    def abrir(self, h):
+        """El archivo binario del blob, para leerlo por bloques."""
+        ruta = self._ruta(h); f = open(ruta, "rb")
+        try: os.utime(ruta)         # en uso: que _limpiar no lo borre
+        except OSError: pass
+        return f
+
+    def _limpiar(self):
+        limite = time.time() - RETENCION_S
+        for raiz, _, archivos in os.walk(self.directorio):
+            for a in archivos:
+                ruta = os.path.join(raiz, a)
+                try:
+                    if os.path.getmtime(ruta) < limite: os.remove(ruta)
+                except OSError: pass
+
+
+# ── Referencias ───────────────────────────────────────────────────────────────
+
+class Blob:
+    """Foto (u otro binario) de un proyecto en sesión: solo la referencia y el tamaño."""
+    __slots__ = ("ref", "n", "_memoria")
+
+    def __init__(self, memoria, ref, n):
+        self._memoria = memoria; self.ref = ref; self.n = n
+
+    def datos(self):
+        return self._memoria.datos(self)
+
+    def abrir(self):
+        return self._memoria.almacen.abrir(self.ref)
+
+
+class ImagenPlano(Blob):
+    """Imagen de plano en sesión. Tiene width/height/mode sin decodificarla; cualquier
+    otro atributo (copy, save, convert...) se resuelve sobre la imagen PIL, que se
+    toma del LRU o se decodifica del PNG del almacén."""
+    __slots__ = ("width", "height", "mode")
+
+    def __init__(self, memoria, ref, n, size, mode):
+        super().__init__(memoria, ref, n); self.width, self.height = size; self.mode = mode
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def cargar(self):
+        return self._memoria.imagen_pil(self)
+
+    def __getattr__(self, nombre):
+        if nombre.startswith("_"): raise AttributeError(nombre)
+        return getattr(self.cargar(), nombre)
+
+
+def pil(img):
+    """La imagen PIL de un plano, sea ya PIL o una ImagenPlano."""
+    return img.cargar() if isinstance(img, ImagenPlano) else img
+
+
+# ── LRU por sesión ────────────────────────────────────────────────────────────
+
+class MemoriaSesion:
+    """LRU de imágenes decodificadas, bytes de fotos y planos anotados de una sesión,
+    con presupuesto."""
+
+    def __init__(self, almacen, presupuesto=int(PRESUPUESTO_MB * 2**20)):
+        self.almacen = almacen; self.presupuesto = presupuesto
+        self._lru = OrderedDict()      # (tipo, ref) -> (valor, bytes)
+        self._lock = threading.Lock()  # los trabajos en segundo plano comparten las referencias
+        self.usados = 0; self.aciertos = 0; self.fallos = 0; self.desalojos = 0
+
+    # ── creación de referencias ──
+    def imagen_png(self, datos):
+        """ImagenPlano a partir de los bytes de un PNG/JPEG (no lo decodifica)."""
+        h = self.almacen.guardar(datos)
+        with Image.open(io.BytesIO(datos)) as im: size, mode = im.size, im.mode
+        return ImagenPlano(self, h, len(datos), size, "RGB" if mode not in ("RGB", "L") else mode)
+
+    def imagen(self, img):
+        """ImagenPlano a partir de una imagen PIL nueva (se codifica una vez en PNG)."""
+        buf = io.BytesIO(); img.save(buf, format="PNG")
+        ref = self.imagen_png(buf.getvalue())
+        self._meter(("img", ref.ref), img, _costo(img))
+        return ref
+
+    def foto(self, datos):
+        return Blob(self, self.almacen.guardar(datos), len(datos))
+
+    # ── lectura ──
+    def imagen_pil(self, ref):
+        clave = ("img", ref.ref)
+        v = self._tomar(clave)
+        if v is None:
+            with Image.open(io.BytesIO(self.almacen.leer(ref.ref))) as im:
+                v = im.convert("RGB") if im.mode not in ("RGB", "L") else im.copy()
+            self._meter(clave, v, _costo(v))
+        return v
+
+    def datos(self, ref):
+        clave = ("foto", ref.ref)
+        v = self._tomar(clave)
+        if v is None:
+            v = self.almacen.leer(ref.ref); self._meter(clave, v, len(v))
+        return v
+
+    # ── derivados que se pueden rehacer (planos anotados, planos para informes) ──
+    def recordado(self, tipo, clave):
+        return self._tomar((tipo, clave))
+
+    def recordar(self, tipo, clave, valor, costo):
+        self._meter((tipo, clave), valor, costo)
+
+    def _tomar(self, clave):
+        with self._lock:
+            e = self._lru.get(clave)
+            if e is None: self.fallos += 1; return None
+            self._lru.move_to_end(clave); self.aciertos += 1
+            return e[0]
+
+    def _meter(self, clave, valor, costo):
+        with self._lock:
+            previo = self._lru.pop(clave, None)
+            if previo: self.usados -= previo[1]
+            self._lru[clave] = (valor, costo); self.usados += costo
+            while self.usados > self.presupuesto and len(self._lru) > 1:
+                _, (_, c) = self._lru.popitem(last=False); self.usados -= c; self.desalojos += 1
+
+    def uso(self):
+        with self._lock:
+            por_tipo = {}
+            for (t, _), (_, c) in self._lru.items(): por_tipo[t] = por_tipo.get(t, 0) + c
+            return {"imagenes_bytes": por_tipo.get("img", 0), "fotos_bytes": por_tipo.get("foto", 0),
+                    "anotados_bytes": por_tipo.get("anotado", 0), "preparados_bytes": por_tipo.get("preparado", 0),
+                    "usados": self.usados, "entradas": len(self._lru), "presupuesto": self.presupuesto,
+                    "aciertos": self.aciertos, "fallos": self.fallos, "desalojos": self.desalojos}
+
+
+def _costo(img):
+    """Bytes que ocupa una imagen PIL decodificada."""
+    return img.width * img.height * len(img.getbands())
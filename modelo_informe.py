@@ -0,0 +1,149 @@
+"""
+modelo_informe.py  —  LuxOMeter PRO / RETILAP 2024
+Modelo intermedio del informe, común al Word (generar_word) y al PDF
+(informe_pdf): filas de medición normalizadas una sola vez, resumen de
+conformidad, estadísticas por área, gráfica y planos anotados preparados a un único ancho. Así los
+dos formatos muestran los mismos valores y, exportados juntos, comparten todo
+el trabajo salvo la escritura de cada archivo.
+"""
+import io
+from functools import lru_cache
+from typing import NamedTuple
+
+from estadisticas import estadisticas_planos
+from imagenes_informe import ancho_px, ANCHO_PDF_CM, ANCHO_WORD_CM
+
+# Los planos se preparan una vez al ancho mayor de los dos formatos
+ANCHO_INFORME_CM = max(ANCHO_PDF_CM, ANCHO_WORD_CM)
+
+# La figura de 7" se muestra a Cm(14) (5.5"): 118 dpi dan ~150 dpi en el documento
+DPI_GRAFICA = 118
+
+
+# ── Filas ─────────────────────────────────────────────────────────────────────
+
+def medicion(d, plano=""):
+    """Fila de resultados de un punto (claves de mediciones.py) -> fila del informe."""
+    vals = [v for v in (d.get("Med1", 0) or 0, d.get("Med2", 0) or 0,
+                        d.get("Med3", 0) or 0, d.get("Med4", 0) or 0) if v > 0]
+    return {
+        "plano": plano, "num": d.get("Número", 0), "area": d.get("TipoArea", ""),
+        "puesto_evaluado": d.get("PuestoEvaluado", ""), "ubicacion": d.get("UbicacionLuminaria", ""),
+        "tipo_iluminacion": d.get("TipoIluminacion", ""), "tipo_lampara": d.get("TipoLampara", ""),
+        "ubicacion_luminaria": d.get("UbicacionLuminaria", ""),
+        "control_luz_natural": d.get("ControlLuzNatural", ""),
+        "altura_luminaria": d.get("AlturaLuminaria", ""),
+        "med1": d.get("Med1", 0), "med2": d.get("Med2", 0), "med3": d.get("Med3", 0), "med4": d.get("Med4", 0),
+        "e_min": d.get("EMin") or (round(min(vals), 1) if vals else ""),
+        "e_max": d.get("EMax") or (round(max(vals), 1) if vals else ""),
+        "e_medio": d.get("EMedio", ""), "promedio": d.get("Promedio", 0),
+        "uo_calc": d.get("Uo_calc", ""), "uo_min": d.get("Uo_min", ""),
+        "interpretacion_uo": d.get("InterpretacionUo", ""), "em_req": d.get("Em_req", 0),
+        "resultado": d.get("Resultado", ""), "conforme": "✅" in str(d.get("Resultado", "")),
+        "nota": d.get("Nota", ""), "recomendacion": d.get("Recomendacion", ""),
+    }
+
+
+def mediciones(proyecto):
+    """Filas del informe de todos los planos, en orden."""
+    return [medicion(d, pln) for pln, pi in proyecto.get("planos", {}).items() for d in pi.get("data", [])]
+
+
+# ── Gráfica ───────────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=64)
+def grafica_conteos(conformes, total):
+    """PNG de la gráfica de conformidad. Solo depende de los conteos: se dibuja una vez
+    y se reutiliza entre informes."""
+    try:
+        import matplotlib; matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        deficientes = total - conformes
+
+        pct_conf = round(conformes/total*100, 1)
+        pct_def  = round(deficientes/total*100, 1)
+
+        fig, ax = plt.subplots(figsize=(7, 3), facecolor='#f8fafc')
+        ax.set_facecolor('#f8fafc')
+        bars = ax.barh([1,0], [pct_conf, pct_def],
+                       color=['#27ae60','#e74c3c'], height=0.5,
+                       edgecolor='white', linewidth=1.5)
+        for bar, val, n in zip(bars, [pct_conf,pct_def], [conformes,deficientes]):
+            ax.text(val/2, bar.get_y()+bar.get_height()/2,
+                    f"{val}%  ({n} pts)",
+                    ha='center', va='center', fontsize=11, fontweight='bold', color='white')
+        ax.set_yticks([1,0])
+        ax.set_yticklabels(['Adecuados','Deficientes'], fontsize=11,
+                           fontweight='bold', color='#1a3a5c')
+        ax.set_xlim(0, 115)
+        ax.set_xlabel('Porcentaje (%)', fontsize=9, color='#475569')
+        ax.set_title(f'Conformidad Lumínica — {total} puntos evaluados',
+                     fontsize=11, fontweight='bold', color='#1a3a5c', pad=10)
+        ax.spines['top'].set_visible(False); ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_visible(False)
+        ax.tick_params(axis='x', colors='#94a3b8'); ax.tick_params(axis='y', left=False)
+        ax.xaxis.grid(True, linestyle='--', alpha=0.4, color='#cbd5e1'); ax.set_axisbelow(True)
+        plt.tight_layout()
+        buf = io.BytesIO()
+        plt.savefig(buf, format='PNG', bbox_inches='tight', dpi=DPI_GRAFICA, facecolor='#f8fafc')
+        plt.close(fig); buf.seek(0); return buf.getvalue()
+    except: return None
+
+
+# ── Modelo ────────────────────────────────────────────────────────────────────
+
+class SeccionPlano(NamedTuple):
+    nombre: str
+    mediciones: list
+    info: dict          # plano_info del proyecto: su imagen se prepara al pedirla
+
+
+class ModeloInforme(NamedTuple):
+    general: dict
+    secciones: list
+    mediciones: list
+    conformes: int
+    preparador: object  # PreparadorPlanos que guarda los planos anotados
+    ancho: int          # px de los planos preparados
+
+    @property
+    def total(self):
+        return len(self.mediciones)
+
+    @property
+    def pct(self):
+        return round(self.conformes/self.total*100, 1) if self.total else 0.0
+
+    @property
+    def deficientes(self):
+        return [m for m in self.mediciones if "❌" in str(m["resultado"])]
+
+    @property
+    def arl(self):
+        return self.general.get("arl", "Positiva")
+
+    def grafica(self):
+        return grafica_conteos(self.conformes, self.total) if self.total else None
+
+    def estadisticas(self):
+        """Estadísticas por tipo de área de todo el proyecto (estadisticas.py), o None.
+        Las luminarias adicionales usan el flujo de luminaria de los datos generales."""
+        return estadisticas_planos([s.info for s in self.secciones], self.general.get("flujo_luminaria"))
+
+    def imagen(self, seccion, recordar=True):
+        """PlanoPreparado de una sección (o None si no tiene imagen o mediciones)."""
+        return self.preparador.preparar({seccion.nombre: seccion.info}, self.ancho, recordar).get(seccion.nombre)
+
+    def imagenes(self):
+        """{plano: PlanoPreparado} de todas las secciones, preparadas en paralelo."""
+        return self.preparador.preparar({s.nombre: s.info for s in self.secciones}, self.ancho)
+
+
+def construir_modelo(proyecto, preparador):
+    """Modelo del informe de un proyecto (en memoria, como lo maneja app.py)."""
+    secciones = [SeccionPlano(pln, [medicion(d, pln) for d in pi.get("data", [])], pi)
+                 for pln, pi in proyecto.get("planos", {}).items()]
+    todas = [m for s in secciones for m in s.mediciones]
+    return ModeloInforme(proyecto.get("general", {}), secciones, todas,
+                         sum(1 for m in todas if m["conforme"]), preparador, ancho_px(ANCHO_INFORME_CM))
@@ -0,0 +1,57 @@
+"""
+precarga.py  —  LuxOMeter PRO / RETILAP 2024
+Calentamiento de los módulos pesados que app.py importa solo al usarlos
+(pandas, python-docx, matplotlib, reportlab, pdf2image...). Se hace una vez por
+proceso, en un hilo de fondo lanzado al final del primer rerun, para que el
+primer render no los espere y el primer clic en Word o en un plano ya los
+encuentre cargados. LUXOMETER_PRECARGA=0 lo desactiva.
+"""
+import importlib
+import os
+import threading
+import time
+
+HABILITADA = os.environ.get("LUXOMETER_PRECARGA", "1") != "0"
+
+# En orden de probabilidad de uso después de la página de inicio
+MODULOS = (
+    "pandas",
+    "matplotlib",
+    "informe_pdf",
+    "generar_word",
+    "streamlit_image_coordinates",
+    "importar_lecturas",
+    "analitica",
+    "pdf2image",
+)
+
+TIEMPOS = {}            # módulo -> segundos que tomó importarlo en la precarga
+_lock = threading.Lock()
+_hilo = None
+
+
+def _matplotlib():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+
+def _cargar():
+    for nombre in MODULOS:
+        t = time.perf_counter()
+        try:
+            if nombre == "matplotlib": _matplotlib()
+            else: importlib.import_module(nombre)
+        except Exception:
+            continue                    # se reportará al usarse, donde el error es visible
+        TIEMPOS[nombre] = time.perf_counter() - t
+
+
+def precargar():
+    """Lanza la precarga si no se ha hecho en este proceso; no bloquea."""
+    global _hilo
+    if not HABILITADA or _hilo is not None: return
+    with _lock:
+        if _hilo is not None: return
+        _hilo = threading.Thread(target=_cargar, name="luxometer-precarga", daemon=True)
+        _hilo.start()
@@ -0,0 +1,93 @@
+"""
+recursos.py  —  LuxOMeter PRO / RETILAP 2024
+Recursos inmutables compartidos por todas las sesiones del proceso: fuentes de
+los planos, plantillas Word ya interpretadas, estilos del PDF y tablas de
+referencia. Cada uno se construye una sola vez (aunque lo pidan varias sesiones
+a la vez) y queda en un inventario con su tamaño aproximado, para dimensionar
+los contenedores según el número de técnicos simultáneos.
+"""
+import functools
+import os
+import sys
+import threading
+import time
+
+_inventario = {}        # (nombre, args) -> {"valor", "bytes", "segundos", "usos"}
+_lock = threading.Lock()
+_construyendo = {}      # clave -> Lock, para no construir dos veces el mismo recurso
+
+
+# ── Medición ──────────────────────────────────────────────────────────────────
+
+def memoria_proceso():
+    """RSS actual del proceso en bytes (0 si el sistema no la expone)."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def tamano(obj, _vistos=None):
+    """Tamaño aproximado en bytes de un objeto Python y lo que contiene."""
+    vistos = _vistos if _vistos is not None else set()
+    if id(obj) in vistos: return 0
+    vistos.add(id(obj))
+    n = sys.getsizeof(obj, 0)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))): return n
+    if isinstance(obj, dict):
+        n += sum(tamano(k, vistos) + tamano(v, vistos) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        n += sum(tamano(v, vistos) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        n += tamano(vars(obj), vistos)
+    return n
+
+
+# ── Caché ─────────────────────────────────────────────────────────────────────
+
+def compartido(nombre, medir=None, etiqueta=None):
+    """Decorador: la función (sin argumentos o con argumentos hashables) construye un
+    recurso que se conserva para todo el proceso. El tamaño es medir(valor) o, si no
+    se indica, el mayor entre tamano(valor) y lo que creció el RSS al construirlo
+    (así se cuenta la memoria de extensiones en C como FreeType o lxml).
+    etiqueta(*args) da el texto con que aparece en el inventario."""
+    def deco(f):
+        @functools.wraps(f)
+        def envoltura(*args):
+            clave = (nombre, args)
+            e = _inventario.get(clave)
+            if e is None:
+                with _lock: candado = _construyendo.setdefault(clave, threading.Lock())
+                with candado:
+                    e = _inventario.get(clave)
+                    if e is None:
+                        rss = memoria_proceso(); t = time.perf_counter()
+                        valor = f(*args)
+                        seg = time.perf_counter() - t
+                        n = medir(valor) if medir else max(tamano(valor), memoria_proceso() - rss)
+                        e = {"valor": valor, "bytes": n, "segundos": seg, "usos": 0,
+                             "etiqueta": etiqueta(*args) if etiqueta else ", ".join(map(str, args))}
+                        with _lock: _inventario[clave] = e; _construyendo.pop(clave, None)
+            e["usos"] += 1
+            return e["valor"]
+        return envoltura
+    return deco
+
+
+def registrar(nombre, valor, bytes_=None):
+    """Agrega al inventario un recurso que ya existe (p. ej. una tabla de módulo)."""
+    with _lock:
+        _inventario[(nombre, ())] = {"valor": valor, "bytes": tamano(valor) if bytes_ is None else bytes_,
+                                     "segundos": 0.0, "usos": 0, "etiqueta": ""}
+
+
+def inventario():
+    """Filas del inventario, de mayor a menor tamaño."""
+    with _lock: items = list(_inventario.items())
+    filas = [{"Recurso": f"{n} {e['etiqueta']}".strip(), "KB": round(e["bytes"] / 1024, 1),
+              "Construcción (ms)": round(e["segundos"] * 1000, 1), "Usos": e["usos"]} for (n, _), e in items]
+    return sorted(filas, key=lambda r: -r["KB"])
+
+
+def total_bytes():
+    with _lock: return sum(e["bytes"] for e in _inventario.values())
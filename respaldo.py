@@ -0,0 +1,278 @@
+"""
+respaldo.py  —  LuxOMeter PRO / RETILAP 2024
+Respaldo de un proyecto en un único ZIP: manifiesto.json (datos generales,
+planos y SHA-256 de cada archivo), mediciones.jsonl (un punto por línea),
+imágenes de plano y fotos como archivos binarios.
+Se escribe y se lee por bloques: las imágenes y fotos de un proyecto en sesión
+salen del almacén de blobs sin pasar por base64, mediciones.jsonl se lee línea
+a línea y cada archivo se verifica contra su checksum al importar.
+"""
+import base64
+import hashlib
+import io
+import itertools
+import json
+import os
+import zipfile
+from datetime import datetime
+
+from campo import puntos_plano
+from geometria import CAMPOS_PLANO
+
+FORMATO = 1
+MANIFIESTO = "manifiesto.json"
+MEDICIONES = "mediciones.jsonl"
+BLOQUE = 1 << 20          # bytes por bloque de lectura / escritura
+_BLOQUE_B64 = BLOQUE // 3 * 4
+
+
+class RespaldoInvalido(ValueError):
+    pass
+
+
+# ── Exportación ───────────────────────────────────────────────────────────────
+
+class _Escritor:
+    """Escribe entradas del ZIP por bloques, acumulando su SHA-256."""
+
+    def __init__(self, z):
+        self.z = z; self.archivos = {}
+
+    def escribir(self, nombre, bloques, comprimir=True):
+        h = hashlib.sha256(); n = 0
+        tipo = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+        info = zipfile.ZipInfo(nombre, datetime.now().timetuple()[:6]); info.compress_type = tipo
+        with self.z.open(info, "w", force_zip64=True) as f:
+            for b in bloques:
+                f.write(b); h.update(b); n += len(b)
+        self.archivos[nombre] = {"sha256": h.hexdigest(), "bytes": n}
+
+
+def _b64_bloques(texto):
+    for i in range(0, len(texto), _BLOQUE_B64):
+        yield base64.b64decode(texto[i:i + _BLOQUE_B64])
+
+
+def _bloques(v):
+    """Bloques binarios de una imagen o foto: base64 (proyecto crudo), bytes, Blob del
+    almacén (se lee del archivo) o imagen PIL (se codifica en PNG)."""
+    if isinstance(v, str):
+        yield from _b64_bloques(v)
+    elif hasattr(v, "abrir"):
+        with v.abrir() as f:
+            while True:
+                b = f.read(BLOQUE)
+                if not b: break
+                yield b
+    elif isinstance(v, (bytes, bytearray)):
+        yield bytes(v)
+    else:
+        buf = io.BytesIO(); v.save(buf, format="PNG"); yield buf.getvalue()
+
+
+def _extension(cabecera):
+    """Extensión según los primeros bytes del archivo, no según su origen."""
+    if cabecera.startswith(b"\xff\xd8"): return "jpg"
+    if cabecera.startswith(b"\x89PNG"): return "png"
+    if cabecera.startswith(b"GIF8"): return "gif"
+    if cabecera[8:12] == b"WEBP": return "webp"
+    return "bin"
+
+
+def _lineas_mediciones(crudo):
+    for pln, pl in crudo.get("planos", {}).items():
+        for n, c in puntos_plano(pl).items():
+            yield (json.dumps({"plano": pln, "numero": n, "xy": c["xy"], "fila": c["fila"]},
+                              ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def exportar_proyecto(nombre, crudo, destino, dispositivo=""):
+    """Escribe el respaldo del proyecto en destino (ruta o archivo binario). El proyecto
+    puede ser crudo (img_base64, fotos en base64) o el de sesión (img, fotos como Blob)."""
+    man = {"formato": FORMATO, "proyecto": nombre, "dispositivo_origen": dispositivo,
+           "creado": datetime.now().isoformat(timespec="seconds"),
+           "general": crudo.get("general", {}), "planos": {}, "archivos": {}}
+    with zipfile.ZipFile(destino, "w", zipfile.ZIP_DEFLATED, allowZip64=True) as z:
+        w = _Escritor(z)
+        w.escribir(MEDICIONES, _lineas_mediciones(crudo))
+        for i, (pln, pl) in enumerate(crudo.get("planos", {}).items()):
+            ent = {"imagen": None, "fotos": {}}
+            img = pl.get("img_base64") or pl.get("img")
+            if img is not None and img != "":
+                ent["imagen"] = f"planos/{i}.png"
+                w.escribir(ent["imagen"], _bloques(img), comprimir=False)
+            for n, foto in pl.get("fotos", {}).items():
+                if foto is None or foto == "" or foto == b"": continue
+                bloques = _bloques(foto); primero = next(bloques, b"")
+                if not primero: continue
+                ent["fotos"][str(n)] = f"fotos/{i}/{n}.{_extension(primero)}"
+                w.escribir(ent["fotos"][str(n)], itertools.chain([primero], bloques), comprimir=False)
+            geo = {k: pl[k] for k in CAMPOS_PLANO if pl.get(k)}
+            if geo: ent["geometria"] = geo
+            man["planos"][pln] = ent
+        man["archivos"] = w.archivos
+        z.writestr(MANIFIESTO, json.dumps(man, ensure_ascii=False, indent=1))
+    return destino
+
+
+# ── Importación ───────────────────────────────────────────────────────────────
+
+def leer_manifiesto(origen):
+    with zipfile.ZipFile(origen) as z: return _manifiesto(z)
+
+
+def _manifiesto(z):
+    try: man = json.loads(z.read(MANIFIESTO).decode("utf-8"))
+    except KeyError: raise RespaldoInvalido("El archivo no es un respaldo de proyecto")
+    if man.get("formato") != FORMATO:
+        raise RespaldoInvalido(f"Formato de respaldo no soportado: {man.get('formato')}")
+    return man
+
+
+class _Verificado(io.RawIOBase):
+    """Entrada del ZIP que acumula tamaño y SHA-256 de lo que se va leyendo."""
+
+    def __init__(self, f):
+        self.f = f; self.h = hashlib.sha256(); self.n = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        k = self.f.readinto(b)
+        self.h.update(memoryview(b)[:k]); self.n += k
+        return k
+
+    def close(self):
+        self.f.close(); super().close()
+
+    def verificar(self, nombre, esperado):
+        if self.n != esperado["bytes"] or self.h.hexdigest() != esperado["sha256"]:
+            raise RespaldoInvalido(f"Checksum incorrecto en {nombre}")
+
+
+def _comprobar(z, archivos):
+    nombres = set(z.namelist())
+    for ruta in archivos:
+        if ruta not in nombres: raise RespaldoInvalido(f"Falta {ruta} en el respaldo")
+
+
+def _leer(z, nombre, esperado):
+    """Bloques de una entrada, verificando tamaño y SHA-256 al terminar."""
+    with _Verificado(z.open(nombre)) as f:
+        while True:
+            b = f.read(BLOQUE)
+            if not b: break
+            yield b
+        f.verificar(nombre, esperado)
+
+
+def _mediciones(z, man):
+    """{plano: {"puntos", "data"}} leyendo mediciones.jsonl línea a línea."""
+    planos = {pln: {"puntos": [], "data": []} for pln in man["planos"]}
+    f = _Verificado(z.open(MEDICIONES))
+    with io.TextIOWrapper(io.BufferedReader(f, BLOQUE), encoding="utf-8") as texto:
+        try:
+            for linea in texto:
+                if not linea.strip(): continue
+                r = json.loads(linea); pl = planos[r["plano"]]
+                pl["puntos"].append(r["xy"])
+                if r["fila"]: pl["data"].append(r["fila"])
+        except (ValueError, KeyError, TypeError):
+            raise RespaldoInvalido(f"{MEDICIONES} dañado")
+        f.verificar(MEDICIONES, man["archivos"][MEDICIONES])
+    return planos
+
+
+def _b64_partes(bloques):
+    # bloques de múltiplo de 3 bytes para que el base64 concatenado sea válido
+    resto = b""
+    for b in bloques:
+        b = resto + b; corte = len(b) - len(b) % 3
+        yield base64.b64encode(b[:corte]).decode(); resto = b[corte:]
+    yield base64.b64encode(resto).decode()
+
+
+def _b64(bloques):
+    return "".join(_b64_partes(bloques))
+
+
+def importar_proyecto(origen):
+    """(nombre, proyecto crudo, manifiesto) desde un respaldo, verificando checksums."""
+    with zipfile.ZipFile(origen) as z:
+        man = _manifiesto(z)
+        archivos = man["archivos"]
+        _comprobar(z, archivos)
+        planos = _mediciones(z, man)
+        for pln, ent in man["planos"].items():
+            planos[pln].update(ent.get("geometria", {}))
+            planos[pln]["fotos"] = {n: _b64(_leer(z, ruta, archivos[ruta])) for n, ruta in ent["fotos"].items()}
+            if ent["imagen"]:
+                planos[pln]["img_base64"] = _b64(_leer(z, ent["imagen"], archivos[ent["imagen"]]))
+    return man["proyecto"], {"general": man["general"], "planos": planos}, man
+
+
+def nombre_libre(nombre, existentes):
+    if nombre not in existentes: return nombre
+    k = 2
+    while f"{nombre} ({k})" in existentes: k += 1
+    return f"{nombre} ({k})"
+
+
+def _json(v):
+    return json.dumps(v, ensure_ascii=False)
+
+
+def _escribir_b64(f, bloques):
+    f.write('"')
+    for parte in _b64_partes(bloques): f.write(parte)
+    f.write('"')
+
+
+def _escribir_proyecto(f, z, man, planos):
+    """Escribe el proyecto crudo del respaldo como JSON, pasando imágenes y fotos del
+    ZIP al archivo en base64 por bloques."""
+    archivos = man["archivos"]
+    f.write(f'{{"general": {_json(man["general"])}, "planos": {{')
+    for i, (pln, ent) in enumerate(man["planos"].items()):
+        pl = {**planos[pln], **ent.get("geometria", {})}
+        f.write(", " * bool(i) + _json(pln) + ": {")
+        f.write(", ".join(f"{_json(k)}: {_json(v)}" for k, v in pl.items()))
+        f.write(', "fotos": {')
+        for j, (n, ruta) in enumerate(ent["fotos"].items()):
+            f.write(", " * bool(j) + _json(n) + ": "); _escribir_b64(f, _leer(z, ruta, archivos[ruta]))
+        f.write("}")
+        if ent["imagen"]:
+            f.write(', "img_base64": '); _escribir_b64(f, _leer(z, ent["imagen"], archivos[ent["imagen"]]))
+        f.write("}")
+    f.write("}}")
+
+
+def importar_en_dispositivo(origen, directorio, device_id, reemplazar=False):
+    """Agrega el proyecto del respaldo al archivo proyectos_<device_id>.json.
+    Si el nombre existe y no se reemplaza, se importa como 'Nombre (2)'.
+    Los demás proyectos del dispositivo se cargan y reescriben (el archivo es un único
+    JSON); el importado se escribe directo desde el ZIP, sin armarlo en memoria."""
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"proyectos_{device_id}.json")
+    try:
+        with open(ruta, "r", encoding="utf-8") as f: data = json.load(f)
+    except FileNotFoundError: data = {}
+    tmp = ruta + ".tmp"
+    with zipfile.ZipFile(origen) as z:
+        man = _manifiesto(z); _comprobar(z, man["archivos"])
+        nombre = man["proyecto"] if reemplazar else nombre_libre(man["proyecto"], data)
+        data.pop(nombre, None)
+        planos = _mediciones(z, man)
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write("{")
+                for k, v in data.items():
+                    f.write(f"{_json(k)}: "); json.dump(v, f, ensure_ascii=False); f.write(", ")
+                f.write(f"{_json(nombre)}: "); _escribir_proyecto(f, z, man, planos)
+                f.write("}")
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+    os.replace(tmp, ruta)
+    return nombre
@@ -0,0 +1,94 @@
+"""
+retilap.py  —  LuxOMeter PRO / RETILAP 2024
+Tabla de referencia RETILAP (Em y Uo por tipo de área) leída de un archivo de
+datos, y un índice de búsqueda precalculado para el selector de áreas.
+"""
+import bisect
+import csv
+import os
+from collections import defaultdict
+
+from busqueda import tokenizar, distancia_prefijo, tope_edicion
+from recursos import registrar
+
+RETILAP_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retilap_referencia.csv")
+SEPARADOR = " – "
+
+
+def cargar_referencia(ruta=RETILAP_CSV):
+    """{"Categoría – Actividad": {"Em": lx, "Uo": mínima}} en el orden del archivo.
+    Columnas: categoria;actividad;Em;Uo (UTF-8, separador ';')."""
+    ref = {}
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as f:
+        for fila in csv.DictReader(f, delimiter=";"):
+            em = float(fila["Em"])
+            ref[f"{fila['categoria'].strip()}{SEPARADOR}{fila['actividad'].strip()}"] = {
+                "Em": int(em) if em.is_integer() else em,
+                "Uo": float(fila["Uo"]),
+            }
+    return ref
+
+
+class IndiceRetilap:
+    """Índice sobre los tipos de área: tokens normalizados (sin tildes), prefijo y
+    aproximado. Se arma una vez y lo comparten todos los selectores de punto."""
+
+    PESO_EXACTO, PESO_PREFIJO, PESO_APROX = 3.0, 2.0, 1.0
+    BONO_CATEGORIA = 1.5
+
+    def __init__(self, referencia):
+        self.tipos = list(referencia)
+        self._orden = {t: i for i, t in enumerate(self.tipos)}
+        self._post = defaultdict(set)       # token -> {tipo}
+        self._cat = defaultdict(set)        # token de categoría -> {tipo}
+        for t in self.tipos:
+            cat, _, act = t.partition(SEPARADOR)
+            for tok in tokenizar(cat): self._post[tok].add(t); self._cat[tok].add(t)
+            for tok in tokenizar(act): self._post[tok].add(t)
+        self._vocab = sorted(self._post)
+        self._cache = {}
+
+    def _candidatos(self, qt):
+        """{tipo: peso} para un término de la consulta."""
+        res = defaultdict(float)
+        def _sumar(tok, peso):
+            for t in self._post[tok]:
+                p = peso + (self.BONO_CATEGORIA if t in self._cat[tok] else 0)
+                if p > res[t]: res[t] = p
+        if qt in self._post: _sumar(qt, self.PESO_EXACTO)
+        i = bisect.bisect_left(self._vocab, qt)
+        while i < len(self._vocab) and self._vocab[i].startswith(qt):
+            if self._vocab[i] != qt: _sumar(self._vocab[i], self.PESO_PREFIJO)
+            i += 1
+        tope = tope_edicion(qt)
+        if tope:
+            for tok in self._vocab:
+                # contra el prefijo del token: la consulta suele estar a medio escribir
+                if not tok.startswith(qt) and distancia_prefijo(qt, tok, tope) <= tope:
+                    _sumar(tok, self.PESO_APROX)
+        return res
+
+    def buscar(self, consulta):
+        """Tipos de área que contienen todos los términos, de mejor a peor."""
+        qts = tokenizar(consulta)
+        if not qts: return list(self.tipos)
+        # El índice es compartido por todas las sesiones: se trabaja sobre el resultado en
+        # una variable local para que un clear() de otro hilo no lo deje sin la clave.
+        clave = tuple(qts)
+        res = self._cache.get(clave)
+        if res is None:
+            puntaje = None
+            for qt in qts:
+                c = self._candidatos(qt)
+                puntaje = c if puntaje is None else {t: s + c[t] for t, s in puntaje.items() if t in c}
+                if not puntaje: break
+            res = sorted(puntaje or {}, key=lambda t: (-puntaje[t], self._orden[t]))
+            if len(self._cache) > 2048: self._cache.clear()
+            self._cache[clave] = res
+        return list(res)
+
+
+# Se arman una sola vez por proceso (app.py se re-ejecuta en cada rerun, este módulo no)
+REFERENCIA = cargar_referencia()
+INDICE = IndiceRetilap(REFERENCIA)
+registrar("retilap", (REFERENCIA, INDICE))
@@ -0,0 +1,103 @@
+"""
+simulacion.py  —  LuxOMeter PRO / RETILAP 2024
+Simulador de reacondicionamiento: estima la iluminancia de cada punto al
+agregar luminarias sobre el plano con un modelo de fuente puntual vectorizado
+y propone el menor conjunto de luminarias que lleva los puntos deficientes a
+la Em requerida. La matriz de aportes se calcula una vez por plano y
+luminaria; cada configuración se evalúa con un producto matricial.
+"""
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+ALTURA_TRABAJO = 0.8        # m, plano de trabajo sobre el que se mide
+ALTURA_DEFECTO = 2.6        # m, montaje cuando el punto no trae AlturaLuminaria
+MANTENIMIENTO = 0.8         # factor de mantenimiento por defecto
+
+
+class Luminaria(NamedTuple):
+    flujo: float                    # lm
+    mantenimiento: float = MANTENIMIENTO
+    altura: float = 0.0             # m de montaje; 0 = la AlturaLuminaria de cada punto
+
+
+class Propuesta(NamedTuple):
+    luminarias: list        # índices de candidatos, en el orden en que se eligieron
+    iluminancia: object     # np.ndarray (n,) lx estimados con la propuesta
+    conformes: int
+    deficientes: int        # puntos que siguen por debajo de Em
+
+
+# ── Geometría ─────────────────────────────────────────────────────────────────
+
+def _num(v, defecto):
+    try:
+        x = float(str(v).replace(",", "."))
+        return x if x > 0 else defecto
+    except (TypeError, ValueError): return defecto
+
+
+def posiciones(data, ancho_m, ancho_px, alto_px):
+    """(n, 2) posiciones en metros de los puntos del plano. Las coordenadas son
+    normalizadas (0-1) o, en proyectos viejos, en píxeles."""
+    xy = np.empty((len(data), 2))
+    for k, d in enumerate(data):
+        cx, cy = (float(v) for v in str(d.get("Coordenadas", "(0, 0)")).strip("()").split(", "))
+        xy[k] = (cx if cx <= 1.0 else cx / ancho_px, cy if cy <= 1.0 else cy / alto_px)
+    return xy * (ancho_m, ancho_m * alto_px / ancho_px)
+
+
+def aportes(puntos, candidatos, alturas, luminaria):
+    """(n, m) lx que aporta una luminaria en cada candidato a cada punto: fuente
+    puntual con distribución coseno (I = Φ/π·cos θ), sobre el plano horizontal
+    E = I·cos θ / d² = Φ·MF·h² / (π·d⁴)."""
+    h = np.maximum(alturas - ALTURA_TRABAJO, 0.1)[None, :]
+    d2 = ((puntos[:, None, :] - candidatos[None, :, :]) ** 2).sum(axis=2) + h ** 2
+    return luminaria.flujo * luminaria.mantenimiento / math.pi * h ** 2 / d2 ** 2
+
+
+# ── Simulación ────────────────────────────────────────────────────────────────
+
+class Simulacion:
+    """Puntos de un plano con su iluminancia medida y la Em requerida. Los candidatos
+    son las posiciones de los propios puntos (una luminaria justo encima)."""
+
+    def __init__(self, data, ancho_m, ancho_px, alto_px, luminaria):
+        self.numeros = [d.get("Número") for d in data]
+        self.base = np.array([_num(d.get("Promedio"), 0.0) for d in data])
+        self.em = np.array([_num(d.get("Em_req"), 0.0) for d in data])
+        self.xy = posiciones(data, ancho_m, ancho_px, alto_px)
+        alturas = np.array([luminaria.altura or _num(d.get("AlturaLuminaria"), ALTURA_DEFECTO) for d in data])
+        self.aportes = aportes(self.xy, self.xy, alturas, luminaria)
+
+    def evaluar(self, configuraciones):
+        """configuraciones (k, m) de 0/1 (o cantidad de luminarias por candidato) ->
+        (k, n) lx estimados en cada punto."""
+        x = np.asarray(configuraciones, dtype="float64").reshape(-1, self.aportes.shape[1])
+        return self.base[None, :] + x @ self.aportes.T
+
+    def conformes(self, configuraciones):
+        """(k,) puntos que cumplen Em con cada configuración."""
+        return (self.evaluar(configuraciones) >= self.em[None, :]).sum(axis=1)
+
+    def proponer(self, maximo=None):
+        """Menor conjunto de luminarias (voraz + poda) para llevar todos los puntos a Em.
+        En cada paso elige el candidato que más déficit cubre; al final quita las que ya
+        no hacen falta."""
+        A = self.aportes; E = self.base.copy(); elegidas = []
+        maximo = A.shape[1] if maximo is None else maximo
+        usado = np.zeros(A.shape[1], dtype=bool)
+        while len(elegidas) < maximo:
+            falta = np.maximum(self.em - E, 0)
+            if not falta.any(): break
+            ganancia = np.minimum(A, falta[:, None]).sum(axis=0); ganancia[usado] = -1
+            j = int(ganancia.argmax())
+            if ganancia[j] <= 1e-9: break
+            elegidas.append(j); usado[j] = True; E += A[:, j]
+        for j in list(reversed(elegidas)):
+            sin = E - A[:, j]
+            if ((sin >= self.em) | (E < self.em)).all():
+                elegidas.remove(j); E = sin
+        ok = int((E >= self.em).sum())
+        return Propuesta(elegidas, E, ok, len(E) - ok)
@@ -0,0 +1,248 @@
+"""
+sincronizacion.py  —  LuxOMeter PRO / RETILAP 2024
+Sincronización incremental de proyectos entre dispositivos y un servidor central.
+Cada proyecto se ve como un conjunto de ítems (campos generales; imagen,
+escala y recinto, y orden de los puntos de cada plano; cada punto por su
+id_punto) con un "dot" (dispositivo, contador) de su última edición y un vector
+de versiones por proyecto. Solo viajan los ítems que el otro lado no ha visto
+y los blobs (imágenes y fotos, direccionados por SHA-256) que le faltan.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+
+from campo import huella, puntos_por_id, ordenar_puntos, geometria_plano, _armar_plano
+
+
+# ── Ítems ─────────────────────────────────────────────────────────────────────
+
+def _clave(*partes):
+    return json.dumps(partes, ensure_ascii=False)
+
+
+def hash_blob(datos):
+    return hashlib.sha256(datos).hexdigest()
+
+
+def extraer(crudo):
+    """Proyecto crudo -> ({clave: valor}, {hash: bytes}). Imágenes y fotos se
+    reemplazan por el hash de su contenido."""
+    items, blobs = {}, {}
+
+    def blob(b64):
+        if not b64: return None
+        datos = base64.b64decode(b64); h = hash_blob(datos); blobs[h] = datos
+        return h
+
+    for k, v in crudo.get("general", {}).items(): items[_clave("g", k)] = v
+    for pln, pl in crudo.get("planos", {}).items():
+        items[_clave("l", pln)] = True
+        items[_clave("i", pln)] = blob(pl.get("img_base64"))
+        items[_clave("c", pln)] = geometria_plano(pl) or None
+        # cada punto por su id: borrar uno no cambia los demás, solo el orden del plano
+        pts = puntos_por_id(pl)
+        items[_clave("o", pln)] = list(pts)
+        for pid, c in pts.items():
+            items[_clave("p", pln, pid)] = {"xy": c["xy"], "fila": c["fila"], "foto": blob(c["foto"])}
+    return items, blobs
+
+
+def reconstruir(items, blobs, meta=None):
+    """Inverso de extraer: {clave: valor} -> proyecto crudo (blobs en base64)."""
+    b64 = lambda h: base64.b64encode(blobs[h]).decode() if h else None
+    general, planos, imgs, orden, geo = {}, {}, {}, {}, {}
+    for clave, v in items.items():
+        tipo, pln, *resto = json.loads(clave)
+        if v is None: continue
+        if tipo == "g": general[pln] = v
+        elif tipo == "l": planos.setdefault(pln, {})
+        elif tipo == "i": imgs[pln] = b64(v)
+        elif tipo == "o": orden[pln] = v
+        elif tipo == "c": geo[pln] = v
+        elif tipo == "p" and isinstance(resto[0], str):    # los de formato viejo iban por número
+            planos.setdefault(pln, {})[resto[0]] = {**v, "foto": b64(v["foto"])}
+    # el orden es solo una guía: si un borrado y un alta concurrentes lo dejaron
+    # desactualizado, los puntos que no figuran van al final
+    crudo = {"general": general,
+             "planos": {pln: _armar_plano(imgs.get(pln), ordenar_puntos(pts, orden.get(pln, [])), geo.get(pln))
+                        for pln, pts in planos.items()}}
+    if meta: crudo["sync"] = meta
+    return crudo
+
+
+def _refs(entradas):
+    """Hashes de blob referenciados por {clave: {"v", ...}} (imágenes y fotos)."""
+    refs = set()
+    for clave, e in entradas.items():
+        v, tipo = e["v"], json.loads(clave)[0]
+        if tipo == "i" and v: refs.add(v)
+        elif tipo == "p" and v and v.get("foto"): refs.add(v["foto"])
+    return refs
+
+
+# ── Vectores de versiones ─────────────────────────────────────────────────────
+
+def cubierto(dot, vv):
+    """True si el evento dot ya está incluido en el vector vv."""
+    return dot[1] <= vv.get(dot[0], 0)
+
+
+def unir_vv(a, b):
+    return {d: max(a.get(d, 0), b.get(d, 0)) for d in set(a) | set(b)}
+
+
+def gana(x, y):
+    """Resolución determinista de ediciones concurrentes de un mismo ítem: lo existente
+    sobre lo borrado, lo medido sobre lo pendiente y, a igualdad, la huella mayor."""
+    def rango(e):
+        v = e["v"]
+        return (v is not None, bool(isinstance(v, dict) and v.get("fila")), e["h"] or "", tuple(e["dot"]))
+    return x if rango(x) >= rango(y) else y
+
+
+def sellar(crudo, dispositivo):
+    """Asigna un dot nuevo a los ítems que cambiaron desde la última sincronización.
+    Devuelve (items, blobs, meta) con meta = {"vv", "items": {clave: {"h", "dot"}}}."""
+    items, blobs = extraer(crudo)
+    meta = json.loads(json.dumps(crudo.get("sync") or {"vv": {}, "items": {}}))
+    cambiados = []
+    for clave in set(items) | set(meta["items"]):
+        h = huella(items.get(clave))
+        previo = meta["items"].get(clave)
+        if previo is None and clave not in items: continue
+        if previo is None or previo["h"] != h: cambiados.append((clave, h))
+    if cambiados:
+        c = meta["vv"].get(dispositivo, 0) + 1; meta["vv"][dispositivo] = c
+        for clave, h in cambiados: meta["items"][clave] = {"h": h, "dot": [dispositivo, c]}
+    return items, blobs, meta
+
+
+def pendientes(items, meta, vv_otro):
+    """Ítems cuyo dot el otro lado todavía no ha visto."""
+    return {clave: {"v": items.get(clave), **m} for clave, m in meta["items"].items()
+            if not cubierto(m["dot"], vv_otro)}
+
+
+def aplicar(items, meta, entrantes, vv_otro):
+    """Integra ítems remotos. Un ítem local no visto por el otro lado es concurrente
+    y se resuelve con gana(); devuelve la lista de claves en conflicto."""
+    conflictos = []
+    for clave, e in entrantes.items():
+        local = meta["items"].get(clave)
+        if local and not cubierto(local["dot"], vv_otro):
+            propio = {"v": items.get(clave), **local}
+            if propio["h"] == e["h"]: continue
+            conflictos.append(clave)
+            if gana(propio, e) is propio: continue
+        if e["v"] is None: items.pop(clave, None)
+        else: items[clave] = e["v"]
+        meta["items"][clave] = {"h": e["h"], "dot": e["dot"]}
+    meta["vv"] = unir_vv(meta["vv"], vv_otro)
+    return conflictos
+
+
+# ── Servidor de referencia ────────────────────────────────────────────────────
+
+class ServidorLocal:
+    """Servidor central sobre un directorio (carpeta compartida o disco local), con la
+    misma interfaz que expondría uno remoto: cada método es un mensaje del protocolo.
+    Proyectos en <dir>/proyectos/<hash>.json (solo ítems), blobs en <dir>/blobs/."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directorio, "proyectos"), exist_ok=True)
+        os.makedirs(os.path.join(directorio, "blobs"), exist_ok=True)
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, "proyectos", hash_blob(nombre.encode())[:32] + ".json")
+
+    def _leer(self, nombre):
+        try:
+            with open(self._ruta(nombre), "r", encoding="utf-8") as f: return json.load(f)
+        except (OSError, ValueError):
+            return {"nombre": nombre, "items": {}, "meta": {"vv": {}, "items": {}}}
+
+    def _escribir(self, nombre, estado):
+        ruta = self._ruta(nombre); tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(estado, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def _ruta_blob(self, h):
+        return os.path.join(self.directorio, "blobs", h)
+
+    # ── mensajes ──
+    def cambios_desde(self, nombre, vv):
+        """Ítems del servidor que no cubre vv, y el vector del servidor."""
+        with self._lock: e = self._leer(nombre)
+        return {"vv": e["meta"]["vv"], "items": pendientes(e["items"], e["meta"], vv)}
+
+    def blobs_faltantes(self, hashes):
+        return [h for h in hashes if not os.path.exists(self._ruta_blob(h))]
+
+    def subir_blobs(self, blobs):
+        for h, datos in blobs.items():
+            if hash_blob(datos) != h: raise ValueError(f"Blob corrupto: {h[:12]}")
+            ruta = self._ruta_blob(h)
+            if os.path.exists(ruta): continue
+            with open(ruta + ".tmp", "wb") as f: f.write(datos)
+            os.replace(ruta + ".tmp", ruta)
+
+    def bajar_blobs(self, hashes):
+        res = {}
+        for h in hashes:
+            with open(self._ruta_blob(h), "rb") as f: res[h] = f.read()
+        return res
+
+    def subir(self, nombre, items, vv):
+        """Integra los ítems de un cliente; los blobs referenciados deben existir ya."""
+        faltan = self.blobs_faltantes(_refs(items))
+        if faltan: raise ValueError(f"Faltan {len(faltan)} blob(s) en el servidor")
+        with self._lock:
+            e = self._leer(nombre)
+            conflictos = aplicar(e["items"], e["meta"], items, vv)
+            self._escribir(nombre, e)
+        return {"vv": e["meta"]["vv"], "conflictos": conflictos}
+
+
+# ── Cliente ───────────────────────────────────────────────────────────────────
+
+def _tam(obj):
+    return len(json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def sincronizar(nombre, crudo, dispositivo, servidor):
+    """Sincroniza un proyecto crudo con el servidor. Devuelve (proyecto crudo
+    actualizado, con su metadato 'sync', e informe de lo transferido)."""
+    items, blobs, meta = sellar(crudo, dispositivo)
+    resp = servidor.cambios_desde(nombre, meta["vv"])
+    informe = {"bajados": len(resp["items"]), "subidos": 0, "conflictos": [],
+               "bytes_bajados": _tam(resp), "bytes_subidos": _tam(meta["vv"]),
+               "blobs_bajados": 0, "blobs_subidos": 0}
+
+    # subida: lo que el servidor no ha visto, con solo los blobs que le faltan
+    salida = pendientes(items, meta, resp["vv"])
+    if salida:
+        faltan = servidor.blobs_faltantes(sorted(_refs(salida)))
+        servidor.subir_blobs({h: blobs[h] for h in faltan})
+        r = servidor.subir(nombre, salida, meta["vv"])
+        informe.update(subidos=len(salida), blobs_subidos=len(faltan))
+        informe["bytes_subidos"] += _tam(salida) + sum(len(blobs[h]) for h in faltan)
+        informe["conflictos"] = r["conflictos"]
+
+    # bajada: se integra después de subir para que ambos lados resuelvan igual
+    nuevos = servidor.bajar_blobs(sorted(_refs(resp["items"]) - set(blobs)))
+    blobs.update(nuevos)
+    informe["blobs_bajados"] = len(nuevos)
+    informe["bytes_bajados"] += sum(len(d) for d in nuevos.values())
+    # El vector queda en el de cambios_desde más los dots propios, no en el que devuelve
+    # subir(): ese puede contar ítems que otro dispositivo subió entre medio y que este
+    # cliente no tiene todavía; se bajan en la próxima sincronización.
+    informe["conflictos"] = sorted(set(informe["conflictos"]) | set(aplicar(items, meta, resp["items"], resp["vv"])))
+
+    res = reconstruir(items, blobs, meta)
+    for k in ("campo",):
+        if crudo.get(k): res[k] = crudo[k]
+    return res, informe
@@ -0,0 +1,123 @@
+"""
+test_campo.py  —  LuxOMeter PRO / RETILAP 2024
+Paquetes de campo: copia completa, paquete de cambios y fusión en el servidor.
+"""
+import base64
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from campo import crear_paquete, fusionar, leer_paquete, proyecto_desde_paquete
+
+
+def _proyecto(n=5):
+    pl = {"puntos": [[k / 10, 0.5] for k in range(1, n + 1)],
+          "data": [{"Número": k, "Promedio": 100 * k, "TipoArea": "Oficina"} for k in range(1, n + 1)],
+          "fotos": {str(k): base64.b64encode(f"foto {k}".encode()).decode() for k in range(1, n + 1)}}
+    return {"general": {"Empresa": "ACME"}, "planos": {"P1": pl}}
+
+
+def _borrar(crudo, n):
+    """Borra el punto n como lo hace el editor: renumera los siguientes y sus fotos."""
+    pl = crudo["planos"]["P1"]
+    pl["puntos"].pop(n - 1)
+    pl["data"] = [{**r, "Número": r["Número"] - (r["Número"] > n)} for r in pl["data"] if r["Número"] != n]
+    pl["fotos"] = {str(int(k) - (int(k) > n)): v for k, v in pl["fotos"].items() if int(k) != n}
+
+
+def _fila(crudo, x):
+    """Fila del punto en la coordenada x del plano P1, o None."""
+    pl = crudo["planos"]["P1"]
+    for k, xy in enumerate(pl["puntos"], 1):
+        if abs(xy[0] - x) < 1e-9:
+            return next(r for r in pl["data"] if r["Número"] == k)
+    return None
+
+
+def _a_campo(servidor, tmp_path):
+    """Copia de campo del proyecto del servidor (paquete completo)."""
+    crear_paquete("Proyecto", servidor, "servidor", str(tmp_path / "completo.zip"))
+    return proyecto_desde_paquete(leer_paquete(str(tmp_path / "completo.zip")))
+
+
+def _devolver(campo, tmp_path):
+    """Paquete de cambios de la copia de campo, ya leído."""
+    crear_paquete("Proyecto", campo, "campo", str(tmp_path / "cambios.zip"), base=campo["campo"]["base"])
+    return leer_paquete(str(tmp_path / "cambios.zip"))
+
+
+def test_mismo_paquete_dos_veces(tmp_path):
+    servidor = _proyecto()
+    campo = _a_campo(servidor, tmp_path)
+    campo["planos"]["P1"]["data"][1]["Promedio"] = 777
+    man = _devolver(campo, tmp_path)
+
+    una, inf1 = fusionar(servidor, man)
+    dos, inf2 = fusionar(una, man)
+    assert inf1["aplicados"] == 1 and inf1["conflictos"] == []
+    assert inf2["aplicados"] == 0 and inf2["conflictos"] == [] and inf2["sin_cambios"] == 1
+    assert dos == una and _fila(dos, 0.2)["Promedio"] == 777
+
+
+def test_edicion_del_mismo_punto_en_ambos_lados(tmp_path):
+    servidor = _proyecto()
+    campo = _a_campo(servidor, tmp_path)
+    servidor["planos"]["P1"]["data"][1]["Promedio"] = 111      # punto 2 en el servidor
+    campo["planos"]["P1"]["data"][1]["Promedio"] = 222         # y en campo
+    campo["planos"]["P1"]["data"][3]["Promedio"] = 444         # el 4 solo en campo
+    man = _devolver(campo, tmp_path)
+
+    fusionado, inf = fusionar(servidor, man)
+    assert inf["aplicados"] == 1
+    [c] = inf["conflictos"]
+    assert c["plano"] == "P1" and c["punto"] == 2
+    assert _fila(fusionado, 0.2)["Promedio"] == {"campo": 222, "servidor": 111}[c["ganador"]]
+    assert _fila(fusionado, 0.4)["Promedio"] == 444
+
+    # el resultado no depende de qué lado se edite primero
+    otro, _ = fusionar(fusionar(servidor, man)[0], man)
+    assert otro == fusionado
+
+
+def test_puntos_eliminados(tmp_path):
+    servidor = _proyecto()
+    campo = _a_campo(servidor, tmp_path)
+    _borrar(campo, 3)                                          # campo borra el 3
+    _borrar(campo, 1)                                          # y el 1, que el servidor editó
+    servidor["planos"]["P1"]["data"][0]["Promedio"] = 55
+    servidor["planos"]["P1"]["data"][4]["Promedio"] = 999      # el servidor edita el 5
+    man = _devolver(campo, tmp_path)
+    assert sorted(man["planos"]["P1"]["eliminados"]) == ["0.100000,0.500000", "0.300000,0.500000"]
+
+    fusionado, inf = fusionar(servidor, man)
+    pl = fusionado["planos"]["P1"]
+    assert [xy[0] for xy in pl["puntos"]] == [0.1, 0.2, 0.4, 0.5]
+    assert _fila(fusionado, 0.3) is None
+    assert inf["conflictos"] == [{"plano": "P1", "punto": 1, "ganador": "servidor"}]   # editado gana a borrado
+    assert _fila(fusionado, 0.1)["Promedio"] == 55
+    assert _fila(fusionado, 0.5) == {"Número": 4, "Promedio": 999, "TipoArea": "Oficina"}
+    assert base64.b64decode(pl["fotos"]["4"]) == b"foto 5"
+
+
+def test_calibracion_en_el_paquete(tmp_path):
+    escala = {"p1": [0.1, 0.1], "p2": [0.9, 0.1], "metros": 8.0}
+    recinto = [[0, 0], [1, 0], [1, 1], [0, 1]]
+    servidor = _proyecto()
+    servidor["planos"]["P1"].update(escala=escala, recinto=recinto)
+    campo = _a_campo(servidor, tmp_path)
+    assert campo["planos"]["P1"]["escala"] == escala and campo["planos"]["P1"]["recinto"] == recinto
+
+    # un plano calibrado en campo lleva la calibración a un servidor que no la tiene
+    sin_calibrar = copy.deepcopy(servidor)
+    for k in ("escala", "recinto"): sin_calibrar["planos"]["P1"].pop(k)
+    campo["planos"]["P1"]["escala"] = {**escala, "metros": 9.5}
+    man = _devolver(campo, tmp_path)
+    fusionado, _ = fusionar(sin_calibrar, man)
+    assert fusionado["planos"]["P1"]["escala"]["metros"] == 9.5
+    assert fusionado["planos"]["P1"]["recinto"] == recinto
+
+    # la calibración del servidor no la pisa el paquete
+    fusionado, _ = fusionar(servidor, man)
+    assert fusionado["planos"]["P1"]["escala"] == escala
@@ -0,0 +1,38 @@
+"""
+test_estadisticas.py  —  LuxOMeter PRO / RETILAP 2024
+Luminarias adicionales por el método de los lúmenes.
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from estadisticas import COLUMNAS, estadisticas_planos
+
+
+def _plano(promedios, escala=True):
+    # 20 × 10 m, dos puntos que se reparten el recinto
+    data = [{"Número": k, "TipoArea": "Oficina", "Promedio": p, "EMin": p, "EMax": p,
+             "Em_req": 500, "Uo_calc": 0.7, "Uo_min": 0.6} for k, p in enumerate(promedios, 1)]
+    pl = {"img": SimpleNamespace(width=1000, height=500), "puntos": [[0.25, 0.5], [0.75, 0.5]], "data": data}
+    if escala: pl["escala"] = {"p1": [0, 0], "p2": [1, 0], "metros": 20.0}
+    return pl
+
+
+def test_metodo_de_los_lumenes_con_punto_en_cero():
+    est = estadisticas_planos([_plano([5, 0])], flujo=4000)
+    # (500 − 2.5) lx · 200 m² / (4000 lm · 0.6 · 0.8) = 51.8
+    assert est.total.luminarias == 52 and est.areas[0].luminarias == 52
+    assert est.columnas() == COLUMNAS
+
+
+def test_sin_flujo_o_sin_escala_se_omite_la_columna():
+    for est in (estadisticas_planos([_plano([5, 0])]),
+                estadisticas_planos([_plano([5, 0], escala=False)], flujo=4000)):
+        assert est.total.luminarias is None
+        assert "Luminarias adicionales" not in est.filas()[0]
+
+
+def test_conforme_no_agrega():
+    assert estadisticas_planos([_plano([600, 550])], flujo=4000).total.luminarias == 0
@@ -0,0 +1,35 @@
+"""
+test_memoria_sesion.py  —  LuxOMeter PRO / RETILAP 2024
+Planos preparados para informes dentro del presupuesto de la MemoriaSesion.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from imagenes_informe import PreparadorPlanos
+from memoria_sesion import MemoriaSesion
+
+
+def _planos(n):
+    fila = {"Número": 1, "Coordenadas": (10, 10), "Color": "green"}
+    return {f"P{k}": {"img": Image.new("RGB", (400, 300), "white"), "data": [fila]} for k in range(n)}
+
+
+def test_preparados_cuentan_en_el_presupuesto():
+    mem = MemoriaSesion(None, presupuesto=10**9)
+    prep = PreparadorPlanos(mem); planos = _planos(3)
+    hechos = prep.preparar(planos)
+    u = mem.uso()
+    assert u["preparados_bytes"] == u["usados"] == sum(len(p.datos) for p in hechos.values())
+
+    aciertos = mem.aciertos
+    assert prep.preparar(planos) == hechos and mem.aciertos == aciertos + 3
+
+
+def test_preparados_se_desalojan():
+    mem = MemoriaSesion(None, presupuesto=1)
+    PreparadorPlanos(mem).preparar(_planos(3))
+    assert mem.uso()["entradas"] == 1 and mem.desalojos == 2
@@ -0,0 +1,44 @@
+"""
+test_respaldo.py  —  LuxOMeter PRO / RETILAP 2024
+Respaldo de un proyecto en sesión e importación al archivo de un dispositivo.
+"""
+import base64
+import io
+import json
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from memoria_sesion import AlmacenBlobs, MemoriaSesion
+from respaldo import exportar_proyecto, importar_en_dispositivo, importar_proyecto
+
+
+def _imagen(formato):
+    buf = io.BytesIO(); Image.new("RGB", (40, 30), "red").save(buf, format=formato)
+    return buf.getvalue()
+
+
+def test_respaldo_desde_sesion_e_importacion(tmp_path):
+    mem = MemoriaSesion(AlmacenBlobs(str(tmp_path / "blobs")))
+    png, jpg = _imagen("PNG"), _imagen("JPEG")
+    sesion = {"general": {"Empresa": "ACME"},
+              "planos": {"P1": {"puntos": [[0.1, 0.2], [0.3, 0.4]],
+                                "data": [{"Número": 1, "Promedio": 120}],
+                                "fotos": {1: mem.foto(jpg), 2: mem.foto(png)},
+                                "img": mem.imagen_png(png), "escala": {"metros": 4.0}}}}
+    exportar_proyecto("Proyecto", sesion, str(tmp_path / "r.zip"))
+    assert {"fotos/0/1.jpg", "fotos/0/2.png"} <= set(zipfile.ZipFile(tmp_path / "r.zip").namelist())
+
+    _, crudo, _ = importar_proyecto(str(tmp_path / "r.zip"))
+    pl = crudo["planos"]["P1"]
+    assert base64.b64decode(pl["img_base64"]) == png and base64.b64decode(pl["fotos"]["1"]) == jpg
+    assert pl["escala"] == {"metros": 4.0} and pl["data"] == [{"Número": 1, "Promedio": 120}]
+
+    (tmp_path / "proyectos_d.json").write_text(json.dumps({"Proyecto": {"general": {}, "planos": {}}}))
+    assert importar_en_dispositivo(str(tmp_path / "r.zip"), str(tmp_path), "d") == "Proyecto (2)"
+    data = json.loads((tmp_path / "proyectos_d.json").read_text(encoding="utf-8"))
+    assert data["Proyecto"] == {"general": {}, "planos": {}} and data["Proyecto (2)"] == crudo
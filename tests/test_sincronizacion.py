@@ -0,0 +1,99 @@
+"""
+test_sincronizacion.py  —  LuxOMeter PRO / RETILAP 2024
+Sincronización entre dos dispositivos contra un ServidorLocal temporal.
+"""
+import base64
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sincronizacion import ServidorLocal, sincronizar
+
+
+def _proyecto(n=5):
+    pl = {"puntos": [[k / 10, 0.5] for k in range(1, n + 1)],
+          "data": [{"Número": k, "Promedio": 100 * k, "TipoArea": "Oficina"} for k in range(1, n + 1)],
+          "fotos": {str(k): base64.b64encode(f"foto {k}".encode()).decode() for k in range(1, n + 1)}}
+    return {"general": {"Empresa": "ACME"}, "planos": {"P1": pl}}
+
+
+def _borrar(crudo, n):
+    """Borra el punto n como lo hace el editor: renumera los siguientes y sus fotos."""
+    pl = crudo["planos"]["P1"]
+    pl["puntos"].pop(n - 1)
+    pl["data"] = [{**r, "Número": r["Número"] - (r["Número"] > n)} for r in pl["data"] if r["Número"] != n]
+    pl["fotos"] = {str(int(k) - (int(k) > n)): v for k, v in pl["fotos"].items() if int(k) != n}
+
+
+def _fila(crudo, x):
+    """(fila, foto) del punto en la coordenada x del plano P1, o None."""
+    pl = crudo["planos"]["P1"]
+    for k, xy in enumerate(pl["puntos"], 1):
+        if abs(xy[0] - x) < 1e-9:
+            return next(r for r in pl["data"] if r["Número"] == k), pl["fotos"].get(str(k))
+    return None
+
+
+def test_borrado_y_edicion_concurrente(tmp_path):
+    srv = ServidorLocal(str(tmp_path))
+    a, _ = sincronizar("Proyecto", _proyecto(), "A", srv)
+    b, _ = sincronizar("Proyecto", {"general": {}, "planos": {}}, "B", srv)
+    assert len(b["planos"]["P1"]["puntos"]) == 5
+
+    _borrar(a, 3)                                         # A borra el punto 3
+    b["planos"]["P1"]["data"][4]["Promedio"] = 999        # B edita el 5 sin saberlo
+    a, _ = sincronizar("Proyecto", a, "A", srv)
+    b, inf = sincronizar("Proyecto", b, "B", srv)
+    a, _ = sincronizar("Proyecto", a, "A", srv)
+    assert inf["conflictos"] == []
+
+    for crudo in (a, b):
+        pl = crudo["planos"]["P1"]
+        assert [xy[0] for xy in pl["puntos"]] == [0.1, 0.2, 0.4, 0.5]
+        assert [r["Número"] for r in pl["data"]] == [1, 2, 3, 4]
+        assert _fila(crudo, 0.3) is None
+        fila, foto = _fila(crudo, 0.5)
+        assert fila["Promedio"] == 999 and fila["Número"] == 4
+        assert base64.b64decode(foto) == b"foto 5"
+
+
+def test_sin_cambios_no_resube(tmp_path):
+    srv = ServidorLocal(str(tmp_path))
+    a, _ = sincronizar("Proyecto", _proyecto(), "A", srv)
+    _borrar(a, 1)
+    a, inf = sincronizar("Proyecto", a, "A", srv)
+    assert inf["subidos"] == 2                            # el punto borrado y el orden
+    a, inf = sincronizar("Proyecto", a, "A", srv)
+    assert inf["subidos"] == 0 and inf["bajados"] == 0
+
+
+def test_subida_de_otro_entre_medio(tmp_path):
+    srv = ServidorLocal(str(tmp_path))
+    a, _ = sincronizar("Proyecto", _proyecto(), "A", srv)
+    b, _ = sincronizar("Proyecto", {"general": {}, "planos": {}}, "B", srv)
+
+    class Intermedio:
+        """Servidor en el que B sube justo después del cambios_desde de A."""
+        def __getattr__(self, nombre): return getattr(srv, nombre)
+        def subir(self, *args):
+            b["general"]["Empresa"] = "Editada en B"
+            sincronizar("Proyecto", b, "B", srv)
+            return srv.subir(*args)
+
+    a["planos"]["P1"]["data"][0]["Promedio"] = 7
+    a, _ = sincronizar("Proyecto", a, "A", Intermedio())
+    assert a["general"]["Empresa"] == "ACME"
+    a, _ = sincronizar("Proyecto", a, "A", srv)
+    assert a["general"]["Empresa"] == "Editada en B"
+
+
+def test_escala_y_recinto(tmp_path):
+    srv = ServidorLocal(str(tmp_path))
+    crudo = _proyecto()
+    crudo["planos"]["P1"].update(escala={"p1": [0.1, 0.1], "p2": [0.9, 0.1], "metros": 8.0},
+                                 recinto=[[0, 0], [1, 0], [1, 1], [0, 1]])
+    a, _ = sincronizar("Proyecto", crudo, "A", srv)
+    b, _ = sincronizar("Proyecto", {"general": {}, "planos": {}}, "B", srv)
+    for pl in (a["planos"]["P1"], b["planos"]["P1"]):
+        assert pl["escala"]["metros"] == 8.0 and len(pl["recinto"]) == 4
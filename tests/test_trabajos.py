@@ -0,0 +1,66 @@
+"""
+test_trabajos.py  —  LuxOMeter PRO / RETILAP 2024
+Cancelar, eliminar y purgar trabajos del GestorTrabajos.
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trabajos
+from trabajos import GestorTrabajos, CANCELADO, LISTO
+
+
+def _esperar(condicion, tope=5.0):
+    fin = time.monotonic() + tope
+    while not condicion():
+        assert time.monotonic() < fin, "tiempo agotado"
+        time.sleep(0.01)
+
+
+def _bloqueante(evento):
+    def funcion(avance):
+        while not evento.wait(0.01): avance(0.5)
+        return b"ok"
+    return funcion
+
+
+def test_cancelar_y_eliminar_en_cola(tmp_path):
+    g = GestorTrabajos(str(tmp_path), hilos=1)
+    suelta = threading.Event()
+    corriendo = g.enviar(_bloqueante(suelta), "1", "pdf")
+    en_cola = g.enviar(lambda avance: b"x", "2", "pdf")
+    try:
+        g.cancelar(en_cola)
+        assert g.estado(en_cola)["estado"] == CANCELADO
+        assert en_cola not in g._futuros and en_cola not in g._cancelar
+        assert g.eliminar(en_cola) is True
+        assert not os.path.exists(tmp_path / en_cola)
+    finally:
+        suelta.set()
+    _esperar(lambda: corriendo not in g._futuros)
+    assert g.estado(corriendo)["estado"] == LISTO
+
+
+def test_eliminar_en_ejecucion(tmp_path):
+    g = GestorTrabajos(str(tmp_path), hilos=1)
+    tid = g.enviar(_bloqueante(threading.Event()), "1", "pdf")
+    _esperar(lambda: g.estado(tid)["estado"] == "ejecutando")
+
+    assert g.eliminar(tid) is False                        # se cancela y se borra al salir
+    assert g.listar() == []
+    _esperar(lambda: not os.path.exists(tmp_path / tid))
+    assert g.estado(tid) is None and not g._eliminar
+
+
+def test_purgar_vencidos(tmp_path):
+    g = GestorTrabajos(str(tmp_path), hilos=1)
+    viejo = g.enviar(lambda avance: b"x", "viejo", "pdf")
+    _esperar(lambda: viejo not in g._futuros)
+    g._estados[viejo]["creado"] -= trabajos.RETENCION_S + 1
+
+    nuevo = g.enviar(lambda avance: b"y", "nuevo", "pdf")
+    assert [e["id"] for e in g.listar()] == [nuevo]
+    assert not os.path.exists(tmp_path / viejo)
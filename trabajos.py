@@ -0,0 +1,193 @@
+"""
+trabajos.py  —  LuxOMeter PRO / RETILAP 2024
+Cola local de trabajos en segundo plano (informes PDF y Word, ZIP de respaldo
+y de campo, rasterizado de planos en PDF) sobre un pool de hilos, sin broker.
+Cada trabajo guarda su estado en <dir>/<id>/estado.json y su archivo en
+<dir>/<id>/resultado: la interfaz los consulta en cada rerun, el usuario sigue
+editando mientras tanto, y tras un reinicio del servidor los trabajos que
+quedaron a medias aparecen como interrumpidos.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SUBDIR = ".trabajos"
+HILOS = 2
+RETENCION_S = 24 * 3600         # los trabajos terminados se borran al día siguiente
+ESCRITURA_MIN_S = 0.25          # frecuencia máxima de escritura del progreso a disco
+
+PENDIENTE, EJECUTANDO, LISTO, ERROR, CANCELADO = "pendiente", "ejecutando", "listo", "error", "cancelado"
+ACTIVOS = (PENDIENTE, EJECUTANDO)
+
+
+class Cancelado(Exception):
+    pass
+
+
+class Avance:
+    """Se pasa a la función del trabajo: avance(fraccion, etapa) publica el progreso
+    y lanza Cancelado si el usuario canceló el trabajo."""
+
+    def __init__(self, gestor, tid):
+        self.gestor = gestor; self.tid = tid; self._escrito = 0.0
+
+    def __call__(self, fraccion=None, etapa=None):
+        if self.gestor.cancelado(self.tid): raise Cancelado()
+        cambios = {}
+        if fraccion is not None: cambios["progreso"] = round(max(0.0, min(1.0, fraccion)), 3)
+        if etapa is not None: cambios["etapa"] = etapa
+        if not cambios: return
+        ahora = time.monotonic()
+        persistir = etapa is not None or ahora - self._escrito >= ESCRITURA_MIN_S
+        if persistir: self._escrito = ahora
+        self.gestor._actualizar(self.tid, persistir=persistir, **cambios)
+
+
+class GestorTrabajos:
+    """Un gestor por proceso (st.cache_resource), compartido por todas las sesiones."""
+
+    def __init__(self, directorio, hilos=HILOS):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="luxometer-trabajo")
+        self._lock = threading.Lock()
+        self._estados = {}; self._futuros = {}; self._cancelar = set(); self._eliminar = set()
+        self._recuperar()
+
+    # ── disco ──
+    def _ruta(self, tid, archivo=""):
+        return os.path.join(self.directorio, tid, archivo)
+
+    def _escribir(self, e):
+        ruta = self._ruta(e["id"], "estado.json"); tmp = ruta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(e, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def _recuperar(self):
+        limite = time.time() - RETENCION_S
+        for tid in os.listdir(self.directorio):
+            try:
+                with open(self._ruta(tid, "estado.json"), "r", encoding="utf-8") as f: e = json.load(f)
+            except (OSError, ValueError):
+                shutil.rmtree(self._ruta(tid), ignore_errors=True); continue
+            if e["creado"] < limite:
+                shutil.rmtree(self._ruta(tid), ignore_errors=True); continue
+            if e["estado"] in ACTIVOS:
+                e.update(estado=ERROR, error="Interrumpido por un reinicio del servidor", terminado=time.time())
+                self._escribir(e)
+            self._estados[tid] = e
+
+    def _purgar(self):
+        """Borra los trabajos terminados con más de RETENCION_S; el proceso puede llevar
+        días corriendo, así que no basta con hacerlo al arrancar."""
+        limite = time.time() - RETENCION_S
+        with self._lock:
+            viejos = [tid for tid, e in self._estados.items() if e["creado"] < limite and tid not in self._futuros]
+            for tid in viejos: del self._estados[tid]
+        for tid in viejos: shutil.rmtree(self._ruta(tid), ignore_errors=True)
+
+    def _actualizar(self, tid, persistir=True, **cambios):
+        with self._lock:
+            e = self._estados.get(tid)
+            if e is None: return
+            e.update(cambios); copia = dict(e)
+        if persistir: self._escribir(copia)
+
+    # ── API ──
+    def enviar(self, funcion, titulo, tipo, dueno="", nombre_archivo="", mime="application/octet-stream", datos=None):
+        """Encola funcion(avance) -> bytes | ruta de archivo | archivo binario. Devuelve el id."""
+        self._purgar()
+        tid = uuid.uuid4().hex[:12]
+        e = {"id": tid, "tipo": tipo, "titulo": titulo, "dueno": dueno, "estado": PENDIENTE,
+             "progreso": 0.0, "etapa": "En cola", "creado": time.time(), "terminado": None,
+             "nombre_archivo": nombre_archivo, "mime": mime, "bytes": 0, "error": "", "datos": datos or {}}
+        os.makedirs(self._ruta(tid), exist_ok=True); self._escribir(e)
+        with self._lock:
+            self._estados[tid] = e
+            self._futuros[tid] = fut = self._pool.submit(self._ejecutar, tid, funcion)
+        # también corre si se cancela antes de empezar (y entonces _ejecutar nunca corre);
+        # fuera del lock porque si el futuro ya terminó se llama en este mismo hilo
+        fut.add_done_callback(lambda _f: self._terminar(tid))
+        return tid
+
+    def _ejecutar(self, tid, funcion):
+        if self.cancelado(tid):
+            self._actualizar(tid, estado=CANCELADO, etapa="Cancelado", terminado=time.time()); return
+        self._actualizar(tid, estado=EJECUTANDO, etapa="Iniciando")
+        try:
+            res = funcion(Avance(self, tid))
+            n = self._guardar_resultado(tid, res)
+            self._actualizar(tid, estado=LISTO, progreso=1.0, etapa="Listo", bytes=n, terminado=time.time())
+        except Cancelado:
+            self._actualizar(tid, estado=CANCELADO, etapa="Cancelado", terminado=time.time())
+        except Exception as ex:
+            self._actualizar(tid, estado=ERROR, error=str(ex) or type(ex).__name__, terminado=time.time())
+
+    def _terminar(self, tid):
+        """El trabajo dejó el pool (terminó o se canceló en cola): se olvida su futuro y,
+        si se pidió borrarlo mientras tanto, se borra."""
+        with self._lock:
+            self._futuros.pop(tid, None); self._cancelar.discard(tid)
+            borrar = tid in self._eliminar; self._eliminar.discard(tid)
+            if borrar: self._estados.pop(tid, None)
+        if borrar: shutil.rmtree(self._ruta(tid), ignore_errors=True)
+
+    def _guardar_resultado(self, tid, res):
+        destino = self._ruta(tid, "resultado")
+        if res is None: raise RuntimeError("El trabajo no produjo ningún archivo")
+        if isinstance(res, (bytes, bytearray)):
+            with open(destino, "wb") as f: f.write(res)
+        elif isinstance(res, str):
+            shutil.move(res, destino)
+        else:
+            with res, open(destino, "wb") as f: shutil.copyfileobj(res, f, 1 << 20)
+        return os.path.getsize(destino)
+
+    def cancelar(self, tid):
+        with self._lock:
+            self._cancelar.add(tid); fut = self._futuros.get(tid)
+        if fut is not None and fut.cancel():
+            self._actualizar(tid, estado=CANCELADO, etapa="Cancelado", terminado=time.time())
+
+    def cancelado(self, tid):
+        return tid in self._cancelar
+
+    def eliminar(self, tid):
+        """Cancela y borra el trabajo. Si todavía está corriendo devuelve False: deja de
+        listarse ya y su carpeta se borra cuando termine (_terminar)."""
+        self.cancelar(tid)
+        with self._lock:
+            if tid in self._futuros:
+                self._eliminar.add(tid); return False
+            self._estados.pop(tid, None)
+        shutil.rmtree(self._ruta(tid), ignore_errors=True)
+        return True
+
+    def marcar(self, tid, **datos):
+        """Agrega datos al trabajo (p. ej. que su resultado ya se aplicó al proyecto)."""
+        with self._lock:
+            e = self._estados.get(tid)
+            if e is None: return
+            e["datos"] = {**e["datos"], **datos}; copia = dict(e)
+        self._escribir(copia)
+
+    def estado(self, tid):
+        with self._lock:
+            e = self._estados.get(tid)
+            return dict(e) if e else None
+
+    def listar(self, dueno=None):
+        """Trabajos (copias del estado), el más reciente primero."""
+        self._purgar()
+        with self._lock:
+            res = [dict(e) for tid, e in self._estados.items()
+                   if tid not in self._eliminar and (dueno is None or e["dueno"] == dueno)]
+        return sorted(res, key=lambda e: e["creado"], reverse=True)
+
+    def ruta_resultado(self, tid):
+        e = self.estado(tid)
+        return self._ruta(tid, "resultado") if e and e["estado"] == LISTO else None